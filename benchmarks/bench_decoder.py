@@ -0,0 +1,70 @@
+"""Compares the streamer JSON decoders on the recorded sample messages.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_decoder
+"""
+import json
+import timeit
+
+from helpers.sample_data import read_recorded_messages
+from tos.decoder import available_backends
+from tos.decoder import get_decoder
+
+SAMPLE_PATH = 'sample_data/timesales_futures.txt'
+NUMBER = 20000
+
+
+async def legacy_parse_json_message(message: str) -> dict:
+    # The parser the streamer used before tos.decoder, kept for comparison.
+    try:
+        message_decoded = json.loads(message)
+    except:
+        message = message.encode('utf-8').replace(b'\xef\xbf\xbd', bytes('"None"','utf-8')).decode('utf-8')
+        message_decoded = json.loads(message)
+    return message_decoded
+
+
+def run_legacy(message: str) -> dict:
+    coroutine = legacy_parse_json_message(message)
+    try:
+        coroutine.send(None)
+    except StopIteration as result:
+        return result.value
+
+
+def build_messages() -> dict:
+    recorded = read_recorded_messages(SAMPLE_PATH)
+    messages = {'recorded': [json.dumps(m) for m in recorded]}
+
+    # One busy message with every recorded trade repeated, like the open.
+    content = [c for m in recorded for d in m['data'] for c in d['content']] * 10
+    busy = {'data': [dict(recorded[0]['data'][0], content=content)]}
+    messages['busy'] = [json.dumps(busy)]
+
+    # A message carrying the replacement character TD sometimes sends.
+    broken = json.dumps(recorded[0]).replace('4640.0', '\ufffd', 1)
+    messages['replacement'] = [json.dumps(recorded[0]), broken]
+    return messages
+
+
+def main() -> None:
+    messages = build_messages()
+    decoders = {'legacy': run_legacy}
+    for backend in available_backends():
+        decoders[backend] = get_decoder(backend)
+
+    for name, batch in messages.items():
+        expected = [run_legacy(m) for m in batch]
+        print('{} ({} messages, {} bytes)'.format(name, len(batch), sum(len(m) for m in batch)))
+        baseline = None
+        for decoder_name, decode in decoders.items():
+            assert [decode(m) for m in batch] == expected, decoder_name
+            seconds = timeit.timeit(lambda: [decode(m) for m in batch], number=NUMBER)
+            per_message = seconds / (NUMBER * len(batch)) * 1e6
+            baseline = baseline or per_message
+            print('    {:<8} {:8.2f} us/message  {:5.2f}x'.format(decoder_name, per_message, baseline / per_message))
+
+
+if __name__ == '__main__':
+    main()
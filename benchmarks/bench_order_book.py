@@ -0,0 +1,88 @@
+"""Measures how fast the order book applies level 2 updates.
+
+Book messages are generated like the mock streamer does: a random walk of the
+price with a few levels changing size between messages. Full book messages
+go through `OrderBook.apply`, single level changes through `set_level`.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_order_book
+"""
+import random
+import time
+
+from data_models.order_book import ASK
+from data_models.order_book import BID
+from data_models.order_book import OrderBook
+
+DEPTH = 20
+MESSAGES = 20000
+LEVEL_UPDATES = 500000
+TICK_SIZE = 0.01
+
+
+def build_messages(seed: int = 7) -> list:
+    rng = random.Random(seed)
+    price = 400.0
+    sizes = {}
+    messages = []
+    for n in range(MESSAGES):
+        price = round(price + rng.choice((-1, 0, 0, 0, 1)) * TICK_SIZE, 2)
+        content = {'key': 'SPY', '1': n}
+        for side, field in ((-1, '2'), (1, '3')):
+            levels = []
+            for i in range(DEPTH):
+                level_price = round(price + side * (i + 1) * TICK_SIZE, 2)
+                # Most levels keep their size from one message to the next.
+                if level_price not in sizes or rng.random() < 0.2:
+                    sizes[level_price] = rng.randint(1, 50) * 100
+                levels.append({'0': level_price, '1': sizes[level_price], '2': 1, '3': []})
+            content[field] = levels
+        messages.append(content)
+    return messages
+
+
+def build_level_updates(seed: int = 11) -> list:
+    rng = random.Random(seed)
+    updates = []
+    for _ in range(LEVEL_UPDATES):
+        side = BID if rng.random() < 0.5 else ASK
+        offset = rng.randint(1, DEPTH * 2) * TICK_SIZE
+        level_price = round(400.0 - offset if side == BID else 400.0 + offset, 2)
+        size = 0 if rng.random() < 0.1 else rng.randint(1, 50) * 100
+        updates.append((side, level_price, size))
+    return updates
+
+
+def main() -> None:
+    messages = build_messages()
+    book = OrderBook('SPY')
+    start = time.perf_counter()
+    for content in messages:
+        book.apply(content)
+    elapsed = time.perf_counter() - start
+    print('full book messages: {:,.0f} messages/s, {:,.0f} changed levels/s ({} levels per side)'.format(
+        len(messages) / elapsed, book.level_changes / elapsed, DEPTH))
+
+    updates = build_level_updates()
+    book = OrderBook('SPY')
+    start = time.perf_counter()
+    for side, price, size in updates:
+        book.set_level(side, price, size)
+    elapsed = time.perf_counter() - start
+    print('single level updates: {:,.0f} updates/s'.format(len(updates) / elapsed))
+
+    queries = 200000
+    start = time.perf_counter()
+    for i in range(queries):
+        book.depth_at(BID, 400.0 - (i % DEPTH + 1) * TICK_SIZE)
+        book.imbalance(5)
+        book.top(5)
+    elapsed = time.perf_counter() - start
+    print('queries (depth_at + imbalance + top 5): {:,.0f} /s'.format(queries / elapsed))
+    print('book: best bid {} best ask {} spread {:.2f} imbalance {:.3f}'.format(
+        book.best_bid(), book.best_ask(), book.spread(), book.imbalance()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Measures end-to-end streaming throughput against the local mock streamer.
+
+The mock server runs in its own process and the client is driven through
+`TDStreamerClient.stream`, the same entry point a live session uses, so the
+numbers include the socket, the message queue, the JSON decode on the
+dispatch thread, the bar updates and the event handlers. The offered message
+rate is ramped up until the client can't keep up.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_stream_end_to_end --symbols 50 --ticks 5
+    python benchmarks/bench_stream_end_to_end.py --queue-size 1000 --overflow coalesce
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tos.mock_server import MockStreamerServer
+from tos.mock_server import mock_streaming_session
+
+WARMUP_SECONDS = 1.0
+
+
+class CountingServer(MockStreamerServer):
+
+    """Publishes the number of messages sent to the benchmark process as they go out.
+    A server that has fallen behind sends without yielding, so a polling task would
+    stall with it."""
+
+    def __init__(self, sent, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.sent = sent
+
+    async def _send(self, websocket, message: dict) -> None:
+        await super()._send(websocket, message)
+        self.sent.value += 1
+
+
+def run_server(port: int, rate: float, ticks: int, ready, sent) -> None:
+    server = CountingServer(sent, port=port, message_rate=rate, ticks_per_message=ticks, seed=1)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(server.start())
+    ready.set()
+    loop.run_forever()
+
+
+def consume(port: int, symbols: list, seconds: float, queue_size: int, overflow: str, sent) -> dict:
+    """Streams for `seconds` after a warm-up and returns the rates and latencies."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    client = mock_streaming_session('ws://localhost:{}'.format(port))
+    client.timesale(service='TIMESALE_EQUITY', symbols=symbols, fields=[0, 1, 2, 3, 4])
+
+    ticks = [0]
+
+    def on_tick(symbol, times, prices, sizes) -> None:
+        ticks[0] += len(times)
+
+    client.events.on_tick(on_tick)
+
+    def counts() -> tuple:
+        # Every message carries one TIMESALE section, stamped by the server.
+        return time.perf_counter(), sent.value, client.latency.histogram('server_to_recv').count, ticks[0]
+
+    marks = []
+
+    def finish() -> None:
+        marks.append(counts())
+        asyncio.ensure_future(client.close_stream())
+
+    loop.call_later(WARMUP_SECONDS, lambda: marks.append(counts()))
+    loop.call_later(WARMUP_SECONDS + seconds, finish)
+
+    # The client reports its connection and closing on stdout.
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.stream(print_to_console=False, queue_size=queue_size, overflow=overflow, reconnect=False)
+
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    if client._dispatch_executor is not None:
+        client._dispatch_executor.shutdown(wait=True)
+    loop.close()
+
+    (start, start_sent, start_messages, start_ticks), (end, end_sent, end_messages, end_ticks) = marks
+    elapsed = end - start
+    queue = client.queue
+    return {
+        'sent': (end_sent - start_sent) / elapsed,
+        'messages': (end_messages - start_messages) / elapsed,
+        'ticks': (end_ticks - start_ticks) / elapsed,
+        'dispatch_p99_us': client.latency.histogram('parsed_to_bar').percentile(99),
+        'server_to_recv_p99_us': client.latency.histogram('server_to_recv').percentile(99),
+        'dropped': queue.dropped + queue.coalesced,
+        'queue_full': queue.max_depth >= queue.maxsize,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--ticks', type=int, default=5, help='Trades per symbol per message.')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Measurement time per rate.')
+    parser.add_argument('--rates', type=str, default='50,100,200,500,1000,2000,5000')
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--overflow', default='block', help="One of 'block', 'drop-oldest' or 'coalesce'.")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    symbols = ['SYM{:04d}'.format(i) for i in range(args.symbols)]
+    print('{} symbols, {} trades per symbol per message, queue of {} ({})'.format(
+        args.symbols, args.ticks, args.queue_size, args.overflow))
+    for rate in [float(r) for r in args.rates.split(',')]:
+        ready = multiprocessing.Event()
+        sent = multiprocessing.Value('q', 0)
+        server = multiprocessing.Process(target=run_server, args=(args.port, rate, args.ticks, ready, sent), daemon=True)
+        server.start()
+        ready.wait()
+        try:
+            result = consume(args.port, symbols, args.seconds, args.queue_size, args.overflow, sent)
+        finally:
+            server.terminate()
+            server.join()
+
+        received = result['messages']
+        # A client that falls behind fills its queue. If it didn't, and the mock server
+        # couldn't produce the offered rate, the client isn't the limit.
+        if received >= 0.95 * rate and not result['dropped']:
+            status = 'ok'
+        elif result['dropped']:
+            status = 'OVERFLOW ({:,} dropped or coalesced)'.format(result['dropped'])
+        elif not result['queue_full'] and result['sent'] < 0.95 * rate:
+            status = 'server-limited'
+        else:
+            status = 'SATURATED'
+        print('    offered {:6.0f} msg/s  sent {:6.0f} msg/s  received {:6.0f} msg/s  {:9,.0f} ticks/s  '
+              'dispatch p99 {:6} us  server to recv p99 {:8} us  {}'.format(
+                  rate, result['sent'], received, result['ticks'], result['dispatch_p99_us'],
+                  result['server_to_recv_p99_us'], status))
+        if status != 'ok':
+            break
+
+
+if __name__ == '__main__':
+    main()
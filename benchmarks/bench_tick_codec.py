@@ -0,0 +1,116 @@
+"""Measures the size and speed of the delta/varint trade encoding.
+
+The /ES trades of sample_data/timesales_futures.txt are encoded as one block
+and message by message with a `TickEncoder`, the way the shards publish them.
+A synthetic session of /ES-like trades (0.25 ticks, a few ms between trades,
+small sizes, consecutive sequence numbers) measures throughput, and is split
+into messages of a few trades for the per-message size. The target is under
+6 bytes per trade message by message on the sample data, against 32 for the
+raw records.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_tick_codec
+    python benchmarks/bench_tick_codec.py
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from helpers.sample_data import iter_recorded_messages
+from tos.tick_codec import TickEncoder
+from tos.tick_codec import decode_ticks
+from tos.tick_codec import encode_ticks
+from tos.tick_journal import TICK_DTYPE
+
+SAMPLE_PATH = os.path.join(ROOT, 'sample_data', 'timesales_futures.txt')
+TARGET_BYTES_PER_TRADE = 6
+SESSION_TRADES = 1000000
+# Trades split into messages for the synthetic per-message size.
+MESSAGE_TRADES = 100000
+ROUNDS = 5
+
+
+def trade_arrays(content: list) -> tuple:
+    return (
+        np.array([trade['1'] for trade in content], dtype=np.int64),
+        np.array([trade['2'] for trade in content], dtype=np.float64),
+        np.array([trade['3'] for trade in content], dtype=np.float64),
+        np.array([trade['4'] for trade in content], dtype=np.int64),
+    )
+
+
+def sample_messages() -> list:
+    """The trade contents of each sample /ES message."""
+    messages = []
+    for message in iter_recorded_messages(SAMPLE_PATH):
+        for data in message.get('data', []):
+            if data['service'] == 'TIMESALE_FUTURES':
+                messages.append(data['content'])
+    return messages
+
+
+def session_trades(count: int, seed: int = 7) -> tuple:
+    rng = np.random.default_rng(seed)
+    times = 1640136547219 + np.cumsum(rng.geometric(0.05, count) - 1)
+    prices = 4640.0 + np.cumsum(rng.choice((-1, 0, 0, 0, 1), count)) * 0.25
+    sizes = rng.geometric(0.4, count).astype(np.float64)
+    sequences = 24152284 + np.arange(count)
+    return times, prices, sizes, sequences
+
+
+def main() -> None:
+    messages = sample_messages()
+    times, prices, sizes, sequences = trade_arrays([trade for content in messages for trade in content])
+    count = len(times)
+    block = encode_ticks(times, prices, sizes, sequences)
+    decoded, _ = decode_ticks(block)
+    assert all(np.array_equal(a, b) for a, b in zip((times, prices, sizes, sequences), decoded))
+
+    encoder = TickEncoder()
+    for content in messages:
+        encoder.encode('/ES', *trade_arrays(content))
+
+    json_bytes = sum(len(json.dumps(trade)) for content in messages for trade in content)
+    print('sample /ES, {} trades in {} messages'.format(count, len(messages)))
+    print('  raw records   {:6.2f} bytes/trade'.format(TICK_DTYPE.itemsize))
+    print('  json content  {:6.2f} bytes/trade'.format(json_bytes / count))
+    print('  one block     {:6.2f} bytes/trade'.format(len(block) / count))
+    print('  per message   {:6.2f} bytes/trade'.format(encoder.bytes_per_trade))
+    # The shards publish message by message, so that is what the target is judged on.
+    print('  target        {:6.2f} bytes/trade per message: {}'.format(
+        TARGET_BYTES_PER_TRADE, 'met' if encoder.bytes_per_trade < TARGET_BYTES_PER_TRADE else 'missed'))
+
+    trades = session_trades(SESSION_TRADES)
+    rng = np.random.default_rng(11)
+    ends = np.cumsum(rng.geometric(0.35, MESSAGE_TRADES))
+    ends = ends[ends < MESSAGE_TRADES]
+    encoder = TickEncoder()
+    for message in zip(*(np.split(array[:MESSAGE_TRADES], ends) for array in trades)):
+        encoder.encode('/ES', *message)
+    encode_times = []
+    decode_times = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        block = encode_ticks(*trades)
+        encode_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        decode_ticks(block)
+        decode_times.append(time.perf_counter() - start)
+
+    print('synthetic /ES session, {:,} trades'.format(SESSION_TRADES))
+    print('  encoded       {:6.2f} bytes/trade'.format(len(block) / SESSION_TRADES))
+    print('  per message   {:6.2f} bytes/trade, {:.1f} trades/message'.format(
+        encoder.bytes_per_trade, MESSAGE_TRADES / (len(ends) + 1)))
+    print('  encode        {:,.0f} trades/s'.format(SESSION_TRADES / min(encode_times)))
+    print('  decode        {:,.0f} trades/s'.format(SESSION_TRADES / min(decode_times)))
+
+
+if __name__ == '__main__':
+    main()
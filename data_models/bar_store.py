@@ -0,0 +1,442 @@
+import time
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+import numpy as np
+import pandas as pd
+from helpers.datetime_helper import ONE_MINUTE_MS
+from helpers.datetime_helper import local_timezone
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class BarDeltas(NamedTuple):
+    """Partial OHLCV bars built from a batch of trades, one row per bar."""
+    times: np.ndarray
+    opens: np.ndarray
+    highs: np.ndarray
+    lows: np.ndarray
+    closes: np.ndarray
+    volumes: np.ndarray
+
+
+def reduce_trades(times: np.ndarray, prices: np.ndarray, sizes: np.ndarray, period_ms: int = ONE_MINUTE_MS) -> BarDeltas:
+    """Reduces the trades of a single symbol to per-bar OHLCV deltas.
+
+    Arguments:
+    ----
+    times {np.ndarray} -- The trade times in epoch milliseconds, in arrival order.
+    prices {np.ndarray} -- The trade prices.
+    sizes {np.ndarray} -- The trade sizes.
+    period_ms {int} -- The bar length in milliseconds. (default: {60000})
+
+    Returns:
+    ----
+    BarDeltas -- The bars sorted by start time.
+    """
+    buckets = times - times % period_ms
+    if buckets[0] == buckets[-1] and (buckets == buckets[0]).all():
+        return BarDeltas(
+            buckets[:1],
+            prices[:1],
+            prices.max(keepdims=True),
+            prices.min(keepdims=True),
+            prices[-1:],
+            sizes.sum(keepdims=True),
+        )
+    if len(buckets) > 1 and (buckets[1:] < buckets[:-1]).any():
+        # Stable so the open and close stay the first and last trade to arrive.
+        order = np.argsort(buckets, kind='stable')
+        buckets, prices, sizes = buckets[order], prices[order], sizes[order]
+    starts = np.flatnonzero(np.diff(buckets)) + 1
+    starts = np.concatenate(([0], starts))
+    ends = np.append(starts[1:], len(buckets)) - 1
+    return BarDeltas(
+        buckets[starts],
+        prices[starts],
+        np.maximum.reduceat(prices, starts),
+        np.minimum.reduceat(prices, starts),
+        prices[ends],
+        np.add.reduceat(sizes, starts),
+    )
+
+
+def candle_arrays(candles: List[dict]) -> BarDeltas:
+    """The bar times and OHLCV columns of price history candles as arrays."""
+    count = len(candles)
+    return BarDeltas(
+        np.fromiter((c['datetime'] for c in candles), dtype=np.int64, count=count),
+        np.fromiter((c['open'] for c in candles), dtype=np.float64, count=count),
+        np.fromiter((c['high'] for c in candles), dtype=np.float64, count=count),
+        np.fromiter((c['low'] for c in candles), dtype=np.float64, count=count),
+        np.fromiter((c['close'] for c in candles), dtype=np.float64, count=count),
+        np.fromiter((c['volume'] for c in candles), dtype=np.float64, count=count),
+    )
+
+
+class BarSnapshot(NamedTuple):
+    """An immutable copy of the newest bars, published by the stream for readers
+    on other threads."""
+    version: int
+    times: np.ndarray
+    values: np.ndarray
+    published_ns: int
+
+    def to_data_frame(self, last: int = None) -> pd.DataFrame:
+        times, values = self.times, self.values
+        if last is not None:
+            times, values = times[-last:], values[:, -last:]
+        return pd.DataFrame(values.T, index=to_local_index(times), columns=BAR_COLUMNS, copy=False)
+
+
+def _freeze(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+EMPTY_SNAPSHOT = BarSnapshot(
+    0,
+    _freeze(np.zeros(0, dtype=np.int64)),
+    _freeze(np.zeros((len(BAR_COLUMNS), 0), dtype=np.float64)),
+    0,
+)
+
+
+class BarStore:
+    """Preallocated, NumPy-backed OHLCV bars.
+
+    Bars live in columnar arrays that are twice the capacity. New bars are
+    appended at the write cursor without reallocating, and when the cursor
+    reaches the end the newest `capacity` bars are moved back to the front,
+    so appends are amortized O(1) and the live bars are always one
+    contiguous slice that can be handed out as a view.
+
+    Arguments:
+    ----
+    capacity {int} -- The number of bars to keep, older bars are discarded. (default: {4096})
+    period_ms {int} -- The bar length in milliseconds used by `add_trade` and `add_trades`. (default: {60000})
+    snapshot_window {int} -- The number of bars copied into each published snapshot. (default: {240})
+    """
+
+    def __init__(self, capacity: int = 4096, period_ms: int = ONE_MINUTE_MS, snapshot_window: int = 240) -> None:
+        self.capacity = capacity
+        self.period_ms = period_ms
+        self.snapshot_window = snapshot_window
+        self.snapshot = EMPTY_SNAPSHOT
+        self._times = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((len(BAR_COLUMNS), 2 * capacity), dtype=np.float64)
+        self._open, self._high, self._low, self._close, self._volume = self._values
+        self._start = 0
+        self._end = 0
+        self._last_time = None
+
+    @classmethod
+    def from_arrays(cls, times, opens, highs, lows, closes, volumes, capacity: int = 4096,
+                    period_ms: int = ONE_MINUTE_MS) -> 'BarStore':
+        """Builds a store from complete bars in time order, keeping all of them."""
+        bars = cls(capacity=max(capacity, len(times)), period_ms=period_ms)
+        bars.extend(times, opens, highs, lows, closes, volumes)
+        bars.publish()
+        return bars
+
+    @classmethod
+    def from_data_frame(cls, df: pd.DataFrame, capacity: int = 4096, period_ms: int = ONE_MINUTE_MS) -> 'BarStore':
+        """Builds a store from a price history frame such as the ones returned
+        by `convert_price_history_to_data_frame`."""
+        return cls.from_arrays(
+            [int(d.timestamp() * 1000) for d in df.index.to_pydatetime()],
+            df['Open'].to_numpy(),
+            df['High'].to_numpy(),
+            df['Low'].to_numpy(),
+            df['Close'].to_numpy(),
+            df['Volume'].to_numpy(),
+            capacity=capacity,
+            period_ms=period_ms,
+        )
+
+    @classmethod
+    def from_candles(cls, candles: List[dict], capacity: int = 4096, period_ms: int = ONE_MINUTE_MS) -> 'BarStore':
+        """Builds a store from the `candles` of a price history response."""
+        return cls.from_arrays(*candle_arrays(candles), capacity=capacity, period_ms=period_ms)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def last_time(self) -> int:
+        """The start time of the newest bar in epoch milliseconds, or None."""
+        return self._last_time
+
+    def _next_slot(self) -> int:
+        if self._end == len(self._times):
+            keep = self.capacity - 1
+            src = slice(self._end - keep, self._end)
+            self._times[:keep] = self._times[src]
+            self._values[:, :keep] = self._values[:, src]
+            self._start = 0
+            self._end = keep
+        elif self._end - self._start == self.capacity:
+            self._start += 1
+        i = self._end
+        self._end += 1
+        return i
+
+    def append(self, bar_time: int, price: float, size: float) -> None:
+        """Starts a new bar from a single trade."""
+        i = self._next_slot()
+        self._times[i] = bar_time
+        self._open[i] = price
+        self._high[i] = price
+        self._low[i] = price
+        self._close[i] = price
+        self._volume[i] = size
+        self._last_time = bar_time
+
+    def update_last(self, price: float, size: float) -> None:
+        """Folds a trade into the newest bar in place."""
+        i = self._end - 1
+        if price > self._high[i]:
+            self._high[i] = price
+        if price < self._low[i]:
+            self._low[i] = price
+        self._close[i] = price
+        self._volume[i] += size
+
+    def add_trade(self, trade_time: int, price: float, size: float) -> bool:
+        """Adds a trade to the bar it falls into.
+
+        Arguments:
+        ----
+        trade_time {int} -- The trade time in epoch milliseconds.
+        price {float} -- The trade price.
+        size {float} -- The trade size.
+
+        Returns:
+        ----
+        bool -- True if the trade started a new bar.
+        """
+        bar_time = trade_time - trade_time % self.period_ms
+        if bar_time == self._last_time:
+            self.update_last(price, size)
+            return False
+        if self._last_time is None or bar_time > self._last_time:
+            self.append(bar_time, price, size)
+            return True
+
+        # A late trade for an older bar, only touch it if we still have it.
+        times = self._times[self._start:self._end]
+        i = int(np.searchsorted(times, bar_time))
+        if i < len(times) and times[i] == bar_time:
+            i += self._start
+            self._high[i] = max(self._high[i], price)
+            self._low[i] = min(self._low[i], price)
+            self._volume[i] += size
+        return False
+
+    def merge_last(self, high: float, low: float, close: float, volume: float) -> None:
+        """Folds a partial bar into the newest bar in place."""
+        i = self._end - 1
+        if high > self._high[i]:
+            self._high[i] = high
+        if low < self._low[i]:
+            self._low[i] = low
+        self._close[i] = close
+        self._volume[i] += volume
+
+    def _merge_bar(self, bar_time: int, high: float, low: float, close: float, volume: float) -> None:
+        if bar_time == self._last_time:
+            self.merge_last(high, low, close, volume)
+            return
+        times = self._times[self._start:self._end]
+        i = int(np.searchsorted(times, bar_time))
+        if i == len(times) or times[i] != bar_time:
+            return
+        i += self._start
+        if high > self._high[i]:
+            self._high[i] = high
+        if low < self._low[i]:
+            self._low[i] = low
+        self._volume[i] += volume
+
+    def add_bars(self, times, opens, highs, lows, closes, volumes) -> int:
+        """Applies partial bars, e.g. the per-minute deltas of one streamer message.
+
+        Deltas for the newest or an older bar are merged into it, anything newer
+        is appended.
+
+        Arguments:
+        ----
+        times {np.ndarray} -- The ascending bar start times in epoch milliseconds.
+
+        Returns:
+        ----
+        int -- The number of bars that were appended.
+        """
+        n = len(times)
+        i = 0
+        while i < n and self._last_time is not None and times[i] <= self._last_time:
+            self._merge_bar(int(times[i]), highs[i], lows[i], closes[i], volumes[i])
+            i += 1
+        if i == n:
+            return 0
+        if i:
+            times, opens, highs, lows, closes, volumes = (
+                c[i:] for c in (times, opens, highs, lows, closes, volumes)
+            )
+        self.extend(times, opens, highs, lows, closes, volumes)
+        return n - i
+
+    def add_trades(self, times: np.ndarray, prices: np.ndarray, sizes: np.ndarray) -> int:
+        """Adds a batch of trades, reducing them to bars first.
+
+        Returns:
+        ----
+        int -- The number of bars that were appended.
+        """
+        if len(times) == 0:
+            return 0
+        return self.add_bars(*reduce_trades(times, prices, sizes, self.period_ms))
+
+    def extend(self, times, opens, highs, lows, closes, volumes) -> None:
+        """Appends complete bars in bulk, e.g. from a price history response."""
+        times = np.asarray(times, dtype=np.int64)
+        n = len(times)
+        if n == 0:
+            return
+        if n > self.capacity:
+            skip = n - self.capacity
+            times = times[skip:]
+            opens, highs, lows, closes, volumes = (
+                np.asarray(c)[skip:] for c in (opens, highs, lows, closes, volumes)
+            )
+            n = self.capacity
+        if self._end + n > len(self._times):
+            keep = min(len(self), self.capacity - n)
+            src = slice(self._end - keep, self._end)
+            self._times[:keep] = self._times[src]
+            self._values[:, :keep] = self._values[:, src]
+            self._start = 0
+            self._end = keep
+        dst = slice(self._end, self._end + n)
+        self._times[dst] = times
+        self._open[dst] = opens
+        self._high[dst] = highs
+        self._low[dst] = lows
+        self._close[dst] = closes
+        self._volume[dst] = volumes
+        self._end += n
+        self._start = max(self._start, self._end - self.capacity)
+        self._last_time = int(self._times[self._end - 1])
+
+    def set_bar(self, bar_time: int, open_: float, high: float, low: float, close: float, volume: float) -> Optional[float]:
+        """Writes a complete bar, e.g. one streamed by the CHART services.
+
+        A bar with the same start time is overwritten in place, since the server
+        bar is authoritative, a newer one is appended and an older missing one
+        is inserted.
+
+        Returns:
+        ----
+        float -- The volume of the bar that was overwritten, or None if it is a new bar.
+        """
+        if self._last_time is None or bar_time > self._last_time:
+            i = self._next_slot()
+            self._times[i] = bar_time
+            self._values[:, i] = (open_, high, low, close, volume)
+            self._last_time = bar_time
+            return None
+
+        times = self._times[self._start:self._end]
+        i = int(np.searchsorted(times, bar_time))
+        if i == len(times) or times[i] != bar_time:
+            self.merge_history([bar_time], [open_], [high], [low], [close], [volume])
+            return None
+
+        i += self._start
+        replaced = float(self._volume[i])
+        self._values[:, i] = (open_, high, low, close, volume)
+        return replaced
+
+    def merge_history(self, times, opens, highs, lows, closes, volumes) -> int:
+        """Merges complete bars, e.g. a price history backfill after a reconnect.
+
+        Bars with the same start time are replaced, since the history is
+        authoritative for minutes the stream only saw part of, and missing
+        bars are inserted in time order. This copies the bars, so it is meant
+        for the rare backfill, not the hot path.
+
+        Returns:
+        ----
+        int -- The number of bars that were not in the store before.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        if len(times) == 0:
+            return 0
+        history = np.vstack([np.asarray(c, dtype=np.float64) for c in (opens, highs, lows, closes, volumes)])
+
+        current_times = self._times[self._start:self._end]
+        keep = ~np.isin(current_times, times)
+        merged_times = np.concatenate((current_times[keep], times))
+        merged_values = np.concatenate((self._values[:, self._start:self._end][:, keep], history), axis=1)
+        order = np.argsort(merged_times, kind='stable')
+        added = len(times) - int(np.isin(times, current_times).sum())
+
+        self._start = 0
+        self._end = 0
+        self._last_time = None
+        self.extend(merged_times[order], *merged_values[:, order])
+        return added
+
+    def times(self, last: int = None) -> np.ndarray:
+        """Read-only view of the bar start times in epoch milliseconds."""
+        start = self._start if last is None else max(self._start, self._end - last)
+        view = self._times[start:self._end]
+        view.flags.writeable = False
+        return view
+
+    def values(self, last: int = None) -> np.ndarray:
+        """Read-only (5, n) view of the Open, High, Low, Close and Volume columns."""
+        start = self._start if last is None else max(self._start, self._end - last)
+        view = self._values[:, start:self._end]
+        view.flags.writeable = False
+        return view
+
+    def publish(self) -> BarSnapshot:
+        """Publishes a snapshot of the newest `snapshot_window` bars.
+
+        The writer copies the window and swaps it into `snapshot` with a single
+        reference assignment, so readers on other threads always see a complete,
+        consistent window without taking a lock.
+        """
+        start = max(self._start, self._end - self.snapshot_window)
+        snapshot = BarSnapshot(
+            self.snapshot.version + 1,
+            _freeze(self._times[start:self._end].copy()),
+            _freeze(self._values[:, start:self._end].copy()),
+            time.perf_counter_ns(),
+        )
+        self.snapshot = snapshot
+        return snapshot
+
+    def to_data_frame(self, last: int = None) -> pd.DataFrame:
+        """Returns the bars as a read-only frame shaped like the price history frames.
+
+        The frame shares memory with the store, so it sees in-place updates to the
+        newest bar. It is only valid until the next bar is appended, readers on
+        another thread should use `snapshot` instead.
+
+        Arguments:
+        ----
+        last {int} -- Only include the newest `last` bars. (default: {None})
+        """
+        index = to_local_index(self.times(last))
+        return pd.DataFrame(self.values(last).T, index=index, columns=BAR_COLUMNS, copy=False)
+
+
+def to_local_index(times: np.ndarray) -> pd.DatetimeIndex:
+    """Converts epoch milliseconds to naive local datetimes, the same thing
+    `datetime.fromtimestamp` gives the price history frames. Each time gets
+    its own UTC offset, so bars on both sides of a DST change are right."""
+    index = pd.to_datetime(np.asarray(times), unit='ms', utc=True).tz_convert(local_timezone()).tz_localize(None)
+    index.name = 'Date'
+    return index
@@ -0,0 +1,220 @@
+import bisect
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+BID = 'bid'
+ASK = 'ask'
+
+# A level as it is queried: the price and the total size at it.
+Level = Tuple[float, float]
+
+
+class BookSide():
+
+    """One side of a book, kept as parallel lists sorted from the best price out.
+
+    Bid prices are stored negated so both sides sort ascending with the best
+    price first, which lets every lookup use `bisect`.
+    """
+
+    __slots__ = ('sign', 'keys', 'sizes', 'counts', 'entries')
+
+    def __init__(self, sign: int) -> None:
+        self.sign = sign
+        self.keys: List[float] = []
+        self.sizes: List[float] = []
+        self.counts: List[int] = []
+        self.entries: Dict[float, list] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _find(self, price: float) -> int:
+        key = self.sign * price
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return -1
+
+    def set_level(self, price: float, size: float, count: int = 0, entries: list = None) -> bool:
+        """Sets, adds or, with a size of 0, removes a level. Returns True if it changed."""
+        key = self.sign * price
+        keys = self.keys
+        index = bisect.bisect_left(keys, key)
+        found = index < len(keys) and keys[index] == key
+
+        if not size:
+            if not found:
+                return False
+            del keys[index], self.sizes[index], self.counts[index]
+            self.entries.pop(price, None)
+            return True
+
+        if entries is not None:
+            self.entries[price] = entries
+        if found:
+            if self.sizes[index] == size and self.counts[index] == count:
+                return False
+            self.sizes[index] = size
+            self.counts[index] = count
+            return True
+
+        keys.insert(index, key)
+        self.sizes.insert(index, size)
+        self.counts.insert(index, count)
+        return True
+
+    def replace(self, levels: List[dict]) -> int:
+        """Applies the full list of levels of a book message, touching only the
+        levels that changed. Returns the number of levels changed."""
+        changed = 0
+        seen = set()
+        for level in levels:
+            price = level['0']
+            seen.add(self.sign * price)
+            changed += self.set_level(price, level['1'], level.get('2', 0), level.get('3'))
+
+        if len(seen) != len(self.keys):
+            stale = [key for key in self.keys if key not in seen]
+            for key in stale:
+                changed += self.set_level(self.sign * key, 0)
+        return changed
+
+    def best(self) -> float:
+        return self.sign * self.keys[0] if self.keys else None
+
+    def size_at(self, price: float) -> float:
+        index = self._find(price)
+        return self.sizes[index] if index >= 0 else 0.0
+
+    def top(self, n: int) -> List[Level]:
+        sign = self.sign
+        return [(sign * key, size) for key, size in zip(self.keys[:n], self.sizes[:n])]
+
+    def size_through(self, price: float) -> float:
+        """The total size at this price and every better one."""
+        index = bisect.bisect_right(self.keys, self.sign * price)
+        return sum(self.sizes[:index])
+
+    def total(self, n: int = None) -> float:
+        return sum(self.sizes[:n])
+
+
+class OrderBook():
+
+    """The live level 2 book of one symbol.
+
+    Price levels are found with a binary search, so setting one level and
+    looking up the size at a price are O(log n) plus a list shift on insert.
+    Book messages carry the whole visible book, only the levels that differ
+    from the current book are applied.
+
+    Arguments:
+    ----
+    symbol {str} -- The symbol of the book.
+    """
+
+    def __init__(self, symbol: str) -> None:
+        self.symbol = symbol
+        self.bids = BookSide(-1)
+        self.asks = BookSide(1)
+        self.book_time: int = None
+        self.messages = 0
+        self.level_changes = 0
+
+    def side(self, side: str) -> BookSide:
+        return self.bids if side == BID else self.asks
+
+    def apply(self, content: dict) -> int:
+        """Applies the content of a book message for this symbol.
+
+        Returns:
+        ----
+        int -- The number of levels that changed.
+        """
+        changed = 0
+        if '2' in content:
+            changed += self.bids.replace(content['2'])
+        if '3' in content:
+            changed += self.asks.replace(content['3'])
+        if '1' in content:
+            self.book_time = content['1']
+        self.messages += 1
+        self.level_changes += changed
+        return changed
+
+    def set_level(self, side: str, price: float, size: float, count: int = 0) -> bool:
+        """Applies a single level update, a size of 0 removes the level."""
+        changed = self.side(side).set_level(price, size, count)
+        self.level_changes += changed
+        return changed
+
+    def best_bid(self) -> float:
+        return self.bids.best()
+
+    def best_ask(self) -> float:
+        return self.asks.best()
+
+    def spread(self) -> float:
+        if not self.bids.keys or not self.asks.keys:
+            return None
+        return self.best_ask() - self.best_bid()
+
+    def mid(self) -> float:
+        if not self.bids.keys or not self.asks.keys:
+            return None
+        return (self.best_ask() + self.best_bid()) / 2
+
+    def top(self, n: int = 5) -> Tuple[List[Level], List[Level]]:
+        """The best `n` bid and ask levels as (price, size) pairs."""
+        return self.bids.top(n), self.asks.top(n)
+
+    def depth_at(self, side: str, price: float) -> float:
+        """The size resting at a price, 0 if there is no level there."""
+        return self.side(side).size_at(price)
+
+    def depth_through(self, side: str, price: float) -> float:
+        """The size resting at a price or better, e.g. what a sweep to it would take."""
+        return self.side(side).size_through(price)
+
+    def imbalance(self, levels: int = 5) -> float:
+        """(bid size - ask size) / (bid size + ask size) over the top levels, from -1 to 1."""
+        bid = self.bids.total(levels)
+        ask = self.asks.total(levels)
+        if not bid and not ask:
+            return 0.0
+        return (bid - ask) / (bid + ask)
+
+    def market_makers(self, side: str, price: float) -> list:
+        """The per-MPID entries of a level as sent by TD, [{'0': mpid, '1': size, '2': time}]."""
+        return self.side(side).entries.get(price, [])
+
+
+class OrderBooks():
+
+    """The books of every symbol, per book service."""
+
+    def __init__(self) -> None:
+        self.books: Dict[Tuple[str, str], OrderBook] = {}
+        # The first book of each symbol, for lookups by symbol alone.
+        self.by_symbol: Dict[str, OrderBook] = {}
+
+    def get(self, symbol: str, service: str = 'NASDAQ_BOOK') -> OrderBook:
+        return self.books.get((service, symbol))
+
+    def __getitem__(self, symbol: str) -> OrderBook:
+        return self.by_symbol[symbol]
+
+    def apply_content(self, service: str, content: List[dict]) -> int:
+        """Applies the `content` list of a book message, returns the levels changed."""
+        changed = 0
+        for book_content in content:
+            key = (service, book_content['key'])
+            book = self.books.get(key)
+            if book is None:
+                book = self.books[key] = OrderBook(book_content['key'])
+                self.by_symbol.setdefault(book_content['key'], book)
+            changed += book.apply(book_content)
+        return changed
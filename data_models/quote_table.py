@@ -0,0 +1,168 @@
+from typing import Dict
+from typing import List
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from td.enums import STREAM_FIELD_IDS
+
+# The field numbering of each level one service.
+SERVICE_FIELD_IDS = {
+    'QUOTE': 'level_one_quote',
+    'OPTION': 'level_one_option',
+    'LEVELONE_FUTURES': 'level_one_futures',
+    'LEVELONE_FOREX': 'level_one_forex',
+    'LEVELONE_FUTURES_OPTIONS': 'level_one_futures_options',
+}
+
+Field = Union[str, int]
+
+
+class QuoteTable():
+
+    """The latest level one quote of every symbol of a service, one row per symbol.
+
+    TD only sends the fields that changed, so each message is merged into the
+    row of its symbol in place. Numeric fields live in a (symbols, fields) float
+    array whose column is the field id, so reading a field for every symbol is a
+    column view and things like the spread of all symbols are one vectorized
+    operation. Fields that aren't numbers (ids, names, flags) are kept per row in
+    `text`. Fields that were never received read as NaN.
+
+    Arguments:
+    ----
+    service {str} -- The level one service, e.g. 'QUOTE' or 'LEVELONE_FUTURES'. (default: {'QUOTE'})
+    capacity {int} -- The number of symbols to make room for, it grows as needed. (default: {64})
+
+    Usage:
+    ----
+        >>> quotes = td_stream_session.quote_table('QUOTE')
+        >>> quotes.symbols
+        >>> quotes.spread()
+        >>> quotes.get('SPY', 'bid-price')
+    """
+
+    def __init__(self, service: str = 'QUOTE', capacity: int = 64) -> None:
+        self.service = service
+        self.field_ids: Dict[str, str] = STREAM_FIELD_IDS[SERVICE_FIELD_IDS[service]]
+        self._names = {name: int(field_id) for field_id, name in self.field_ids.items()}
+        self._columns = {field_id: int(field_id) for field_id in self.field_ids}
+
+        self.symbols: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self.text: List[dict] = []
+        self.values = np.full((capacity, len(self.field_ids)), np.nan)
+        self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._rows
+
+    def column_of(self, field: Field) -> int:
+        """The column of a field given by id or by name, e.g. 1, '1' or 'bid-price'."""
+        if isinstance(field, int):
+            return field
+        column = self._columns.get(field)
+        if column is None:
+            column = self._names.get(field)
+        if column is None:
+            raise KeyError('Unknown {} field: {}'.format(self.service, field))
+        return column
+
+    def row_of(self, symbol: str) -> int:
+        """The row of a symbol, adding it if it is new."""
+        row = self._rows.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row == len(self.values):
+                grown = np.full((2 * len(self.values), self.values.shape[1]), np.nan)
+                grown[:row] = self.values
+                self.values = grown
+            self._rows[symbol] = row
+            self.symbols.append(symbol)
+            self.text.append({})
+        return row
+
+    def merge(self, content: List[dict]) -> None:
+        """Merges the `content` list of a level one message into the table."""
+        columns = self._columns
+        values = self.values
+        for fields in content:
+            row = self._rows.get(fields['key'])
+            if row is None:
+                row = self.row_of(fields['key'])
+                values = self.values
+            text = self.text[row]
+            for field_id, value in fields.items():
+                column = columns.get(field_id)
+                if column is None:
+                    continue
+                if type(value) is float or type(value) is int:
+                    values[row, column] = value
+                else:
+                    text[field_id] = value
+        self.updates += len(content)
+
+    def column(self, field: Field) -> np.ndarray:
+        """A read-only view of one field for every symbol, in the order of `symbols`."""
+        view = self.values[:len(self.symbols), self.column_of(field)]
+        view.flags.writeable = False
+        return view
+
+    def get(self, symbol: str, field: Field):
+        """The latest value of a field for a symbol, None if it wasn't received."""
+        row = self._rows.get(symbol)
+        if row is None:
+            return None
+        column = self.column_of(field)
+        value = self.values[row, column]
+        if np.isnan(value):
+            return self.text[row].get(str(column))
+        return float(value)
+
+    def quote(self, symbol: str) -> dict:
+        """Every received field of a symbol, keyed by field name."""
+        row = self._rows[symbol]
+        quote = {}
+        for field_id, name in self.field_ids.items():
+            value = self.values[row, int(field_id)]
+            if not np.isnan(value):
+                quote[name] = float(value)
+            elif field_id in self.text[row]:
+                quote[name] = self.text[row][field_id]
+        quote['symbol'] = symbol
+        return quote
+
+    def bid(self) -> np.ndarray:
+        return self.column('bid-price')
+
+    def ask(self) -> np.ndarray:
+        return self.column('ask-price')
+
+    def last(self) -> np.ndarray:
+        return self.column('last-price')
+
+    def spread(self) -> np.ndarray:
+        """The ask minus the bid of every symbol."""
+        return self.ask() - self.bid()
+
+    def mid(self) -> np.ndarray:
+        return (self.ask() + self.bid()) / 2
+
+    def spread_bps(self) -> np.ndarray:
+        """The spread of every symbol in basis points of the mid price."""
+        return self.spread() / self.mid() * 10000
+
+    def to_data_frame(self, fields: List[Field] = None) -> pd.DataFrame:
+        """The numeric fields as a frame indexed by symbol, columns named after the fields."""
+        if fields is None:
+            fields = [int(field_id) for field_id in self.field_ids if field_id != '0']
+        columns = [self.column_of(field) for field in fields]
+        return pd.DataFrame(
+            self.values[:len(self.symbols), columns],
+            index=pd.Index(self.symbols, name='symbol'),
+            columns=[self.field_ids[str(column)] for column in columns],
+        )
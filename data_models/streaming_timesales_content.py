@@ -1,16 +1,52 @@
 from datetime import datetime
-from helpers.datetime_helper import round_to_one_minute
+import time
+from helpers.datetime_helper import ONE_MINUTE_MS
+
+
 class StreamingTimeSaleContent:
-    def load_from_tos(self, content: dict):
+    __slots__ = ('symbol', 'trade_time_ms', 'last_price', 'last_size', 'last_sequence', 'received_time_ms')
+
+    def __init__(self) -> None:
+        self.symbol = None
+        self.trade_time_ms = None
+        self.last_price = None
+        self.last_size = None
+        self.last_sequence = None
+        self.received_time_ms = None
+
+    def load_from_tos(self, content: dict, received_time_ms: int = None):
         self.symbol = content["key"]
         if "1" in content:
-            self.trade_time = datetime.fromtimestamp(content['1']/1000)
-            self.one_minute_bucket_time = round_to_one_minute(self.trade_time)
+            self.trade_time_ms = content['1']
         if "2" in content:
             self.last_price = content["2"]
         if "3" in content:
             self.last_size = content["3"]
         if "4" in content:
             self.last_sequence = content["4"]
-            self.received_time = datetime.now()
-    
\ No newline at end of file
+            if received_time_ms is None:
+                received_time_ms = time.time_ns() // 1000000
+            self.received_time_ms = received_time_ms
+
+    @property
+    def minute_bucket(self) -> int:
+        return self.trade_time_ms // ONE_MINUTE_MS
+
+    @property
+    def one_minute_bucket_ms(self) -> int:
+        return self.minute_bucket * ONE_MINUTE_MS
+
+    # Datetimes are only built when someone asks for them, e.g. for display.
+    @property
+    def trade_time(self) -> datetime:
+        return datetime.fromtimestamp(self.trade_time_ms / 1000)
+
+    @property
+    def one_minute_bucket_time(self) -> datetime:
+        return datetime.fromtimestamp(self.one_minute_bucket_ms / 1000)
+
+    @property
+    def received_time(self) -> datetime:
+        if self.received_time_ms is None:
+            return None
+        return datetime.fromtimestamp(self.received_time_ms / 1000)
@@ -1,7 +1,28 @@
+import os
+import zoneinfo
 from datetime import datetime
+from datetime import tzinfo
+
+from dateutil.tz import tzlocal
+
+ONE_MINUTE_MS = 60000
 
 def round_to_one_minute(dt: datetime) -> datetime:
     return datetime(
         dt.year,dt.month,dt.day,dt.hour,dt.minute,0,
     )
-     
\ No newline at end of file
+
+def local_timezone() -> tzinfo:
+    """The local time zone. It is looked up by name when TZ or /etc/localtime
+    gives one, pandas converts named zones many times faster than `tzlocal`."""
+    name = os.environ.get('TZ', '').lstrip(':')
+    if not name and os.path.islink('/etc/localtime'):
+        target = os.path.realpath('/etc/localtime')
+        if 'zoneinfo' + os.sep in target:
+            name = target.split('zoneinfo' + os.sep, 1)[1]
+    if name:
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass
+    return tzlocal()
@@ -0,0 +1,37 @@
+import ast
+from typing import Iterator
+from typing import List
+
+MESSAGE_HEADER = 'Message Received:'
+
+
+def iter_recorded_messages(file_path: str) -> Iterator[dict]:
+    """Yields the messages of a console recording like sample_data/timesales_futures.txt.
+
+    Each message is the printed dict between two dashed lines after a
+    "Message Received:" header, and may span several lines.
+    """
+    with open(file_path) as f:
+        lines = None
+        expect_body = False
+        for line in f:
+            stripped = line.strip()
+            if lines is None:
+                if stripped == MESSAGE_HEADER:
+                    expect_body = True
+                elif expect_body and stripped and set(stripped) == {'-'}:
+                    lines = []
+                    expect_body = False
+            elif stripped and set(stripped) == {'-'}:
+                yield ast.literal_eval(''.join(lines))
+                lines = None
+            else:
+                lines.append(line)
+
+        # The last message of a recording that was cut off has no closing line.
+        if lines:
+            yield ast.literal_eval(''.join(lines))
+
+
+def read_recorded_messages(file_path: str) -> List[dict]:
+    return list(iter_recorded_messages(file_path))
@@ -4,6 +4,7 @@ from datetime import timedelta
 import mplfinance as mpf
 import pandas as pd
 from tos.helper import generate_sample_price_history
+from tos.latency import LatencyRecorder
 import asyncio
 from threading import Thread
 import matplotlib.animation as animation
@@ -15,12 +16,14 @@ symbol = 'SPY'
 TDSession = TDClient(
     credentials_path="C:\\AutoTrading\\tdameritrade_settings.json"
 )
-df = TDSession.get_price_history_for_day_trading(symbol)
+bars = TDSession.get_bars_for_day_trading(symbol)
+latency = LatencyRecorder()
 
 def start_streaming():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     client = TDSession.create_streaming_session()
+    client.latency = latency
     """client.timesale(
         service='TIMESALE_FUTURES',
         symbols=['/ES'],
@@ -28,7 +31,7 @@ def start_streaming():
     )
     """
     client.timesale(service='TIMESALE_EQUITY', symbols=[symbol], fields=[0, 1, 2, 3, 4])
-    client.stream(df)
+    client.stream(bars)
 
 
 thread = Thread(target=start_streaming)
@@ -37,8 +40,8 @@ thread.start()
 color = mpf.make_marketcolors(up='#3A7153',down='#AC2E2E',inherit=True)
 style = mpf.make_mpf_style(base_mpf_style='yahoo', marketcolors=color)
 kwargs = dict(type='candle', volume=True, style=style)
-partial_df = df.iloc[-60:]
-fig, axlist = mpf.plot(df, returnfig=True, **kwargs)
+partial_df = bars.snapshot.to_data_frame(last=60)
+fig, axlist = mpf.plot(bars.snapshot.to_data_frame(), returnfig=True, **kwargs)
 
 def onclick(event):
     print(event.__dict__)
@@ -58,12 +61,21 @@ cid3 = fig.canvas.mpl_connect('key_release_event', onKeyRelease)
 
 ax1 = axlist[0] # price
 ax2 = axlist[2] # volume
+last_version = 0
 def animate(i):
+    # The stream publishes a new snapshot after every update, skip the redraw if nothing changed.
+    global last_version
+    snapshot = bars.snapshot
+    if snapshot.version == last_version:
+        return
+    last_version = snapshot.version
     ax1.clear()
     ax2.clear()
     kwargs2 = dict(type='candle', style=style)
-    partial_df = df.iloc[-60:]
+    partial_df = snapshot.to_data_frame(last=60)
     mpf.plot(partial_df,ax=ax1, volume=ax2, **kwargs2)
+    latency.record_since('bar_to_render', snapshot.published_ns)
 
 ani = animation.FuncAnimation(fig, animate, interval=50)
 mpf.show()
+print(latency.report())
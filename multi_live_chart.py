@@ -4,6 +4,7 @@ from datetime import timedelta
 import mplfinance as mpf
 import pandas as pd
 from tos.helper import generate_sample_price_history
+from tos.aggregation import BarRegistry
 import asyncio
 from threading import Thread
 import matplotlib.animation as animation
@@ -11,11 +12,13 @@ from matplotlib import pyplot as plt
 plt.rcParams['keymap.save'].remove('s')
 plt.rcParams['keymap.fullscreen'].remove('f')
 
-symbol = 'SPY'
+symbols = ['SPY', 'QQQ']
 TDSession = TDClient(
     credentials_path="C:\\AutoTrading\\tdameritrade_settings.json"
 )
-df = TDSession.get_price_history_for_day_trading(symbol)
+registry = BarRegistry()
+for symbol in symbols:
+    registry.add(symbol, TDSession.get_bars_for_day_trading(symbol))
 
 def start_streaming():
     loop = asyncio.new_event_loop()
@@ -27,8 +30,8 @@ def start_streaming():
         fields=[0, 1, 2, 3, 4]
     )
     """
-    client.timesale(service='TIMESALE_EQUITY', symbols=[symbol], fields=[0, 1, 2, 3, 4])
-    client.stream(df)
+    client.timesale(service='TIMESALE_EQUITY', symbols=symbols, fields=[0, 1, 2, 3, 4])
+    client.stream(registry)
 
 
 thread = Thread(target=start_streaming)
@@ -37,18 +40,19 @@ thread.start()
 color = mpf.make_marketcolors(up='#3A7153',down='#AC2E2E',inherit=True)
 style = mpf.make_mpf_style(base_mpf_style='yahoo', marketcolors=color)
 kwargs = dict(type='candle', volume=True, style=style)
-partial_df = df.iloc[-60:]
+partial_df_1 = registry[symbols[0]].snapshot.to_data_frame(last=60)
+partial_df_2 = registry[symbols[1]].snapshot.to_data_frame(last=60)
 
 fig = mpf.figure(figsize=(12,9))
-#fig, axlist = mpf.plot(df, returnfig=True, **kwargs)
+#fig, axlist = mpf.plot(bars.to_data_frame(), returnfig=True, **kwargs)
 ax_stock_1_price = fig.add_subplot(2,2,1,style='blueskies')
 ax_stock_2_price = fig.add_subplot(2,2,2,style='yahoo')
 ax_stock_1_volume = fig.add_subplot(2,2,3,style='blueskies')
 ax_stock_2_volume = fig.add_subplot(2,2,4,style='yahoo')
 s   = mpf.make_mpf_style(base_mpl_style='fast',base_mpf_style='nightclouds')
 
-mpf.plot(partial_df,ax=ax_stock_1_price, volume=ax_stock_1_volume, axtitle='blueskies')
-mpf.plot(partial_df,type='candle',ax=ax_stock_2_price, volume=ax_stock_2_volume,axtitle='yahoo')
+mpf.plot(partial_df_1,ax=ax_stock_1_price, volume=ax_stock_1_volume, axtitle='blueskies')
+mpf.plot(partial_df_2,type='candle',ax=ax_stock_2_price, volume=ax_stock_2_volume,axtitle='yahoo')
 
 
 def onclick(event):
@@ -69,8 +73,8 @@ cid3 = fig.canvas.mpl_connect('key_release_event', onKeyRelease)
 def animate(i):
     ax_stock_1_price.clear()
     ax_stock_1_volume.clear()
-    partial_df = df.iloc[-60:]
-    mpf.plot(partial_df,ax=ax_stock_1_price, volume=ax_stock_1_volume,axtitle='blueskies',xrotation=15)
+    partial_df_1 = registry[symbols[0]].snapshot.to_data_frame(last=60)
+    mpf.plot(partial_df_1,ax=ax_stock_1_price, volume=ax_stock_1_volume,axtitle='blueskies',xrotation=15)
     #mpf.plot(partial_df,ax=ax1, volume=ax2, **kwargs2)
 
 ani = animation.FuncAnimation(fig, animate, interval=50)
@@ -3,8 +3,9 @@ import time
 from threading import Thread
 import asyncio
 import pandas as pd
+from data_models.bar_store import BarStore
 
-stock_data = []
+stock_data = BarStore()
 TDSession = TDClient(
     credentials_path="C:\\AutoTrading\\tdameritrade_settings.json"
 )
@@ -0,0 +1,65 @@
+import numpy as np
+
+from tos.aggregation import BarRegistry
+from tos.stream import TDStreamerClient
+
+MINUTE = 60000
+START = 1640136540000
+
+
+def equity_bar(symbol: str, bar_time: int, close: float, volume: float) -> dict:
+    return {'key': symbol, '1': close - 0.1, '2': close + 0.1, '3': close - 0.2, '4': close, '5': volume, '7': bar_time}
+
+
+def futures_bar(symbol: str, bar_time: int, close: float, volume: float) -> dict:
+    return {'key': symbol, '1': bar_time, '2': close - 0.1, '3': close + 0.1, '4': close - 0.2, '5': close, '6': volume}
+
+
+def test_chart_content_maps_the_fields_of_each_service():
+    registry = BarRegistry(symbols=['SPY', '/ES'])
+    registry.add_chart_content('CHART_EQUITY', [equity_bar('SPY', START, 470.0, 1000)])
+    registry.add_chart_content('CHART_FUTURES', [futures_bar('/ES', START, 4700.0, 50)])
+
+    for symbol, close, volume in [('SPY', 470.0, 1000), ('/ES', 4700.0, 50)]:
+        bars = registry[symbol]
+        assert bars.times().tolist() == [START]
+        np.testing.assert_allclose(bars.values()[:, 0], [close - 0.1, close + 0.1, close - 0.2, close, volume])
+
+
+def test_chart_content_reconciles_and_counts_appended_bars():
+    registry = BarRegistry(symbols=['SPY'])
+    # Ticks built the first minute before the server's bar arrived.
+    registry.add_trades('SPY', np.array([START + 1000, START + 2000]), np.array([470.0, 470.1]), np.array([300.0, 200.0]))
+
+    updated = registry.add_chart_content('CHART_EQUITY', [
+        equity_bar('SPY', START, 470.1, 600),
+        equity_bar('SPY', START + MINUTE, 470.3, 400),
+        equity_bar('SPY', START + 2 * MINUTE, 470.2, 100),
+        equity_bar('QQQ', START, 398.5, 900),
+    ])
+
+    assert updated == {'SPY': 2, 'QQQ': 1}
+    assert registry.chart_bars == 4
+    assert registry.chart_reconciled == 1
+    assert registry.chart_volume_drift == 100
+    assert registry['SPY'].times().tolist() == [START, START + MINUTE, START + 2 * MINUTE]
+
+    # A missing older minute is inserted, it doesn't close a bar.
+    registry.add_chart_content('CHART_EQUITY', [equity_bar('QQQ', START + 2 * MINUTE, 398.7, 100)])
+    assert registry.add_chart_content('CHART_EQUITY', [equity_bar('QQQ', START + MINUTE, 398.6, 100)]) == {'QQQ': 0}
+
+
+def test_chart_bars_close_bars():
+    streamer = TDStreamerClient(websocket_url='', user_principal_data={}, credentials={})
+    streamer.bars = BarRegistry(symbols=['SPY'])
+    closed = []
+    updates = []
+    streamer.events.on_bar_close(lambda symbol, bars, count: closed.append((symbol, count)))
+    streamer.events.on_bar_update(lambda symbol, bars: updates.append(symbol))
+
+    streamer._handle_chart_bars('CHART_EQUITY', [equity_bar('SPY', START, 470.0, 1000)])
+    streamer._handle_chart_bars('CHART_EQUITY', [equity_bar('SPY', START + MINUTE, 470.2, 500)])
+    streamer._handle_chart_bars('CHART_EQUITY', [equity_bar('SPY', START + MINUTE, 470.3, 600)])
+
+    assert closed == [('SPY', 1)]
+    assert updates == ['SPY', 'SPY', 'SPY']
@@ -0,0 +1,118 @@
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from data_models.bar_store import BarStore
+from data_models.bar_store import to_local_index
+from tos.helper import convert_price_history_to_bar_store
+from tos.helper import convert_price_history_to_data_frame
+
+
+# A zone name, and the same rules as a POSIX TZ string that has no zone file.
+@pytest.fixture(params=['America/New_York', 'EST5EDT4,M3.2.0,M11.1.0'])
+def new_york(request):
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = request.param
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = previous
+    time.tzset()
+
+
+def test_local_index_follows_dst(new_york):
+    # Hourly bars across the March 2022 and November 2022 DST changes.
+    times = np.concatenate([
+        1647147600000 + np.arange(6) * 3600000,
+        1667710800000 + np.arange(6) * 3600000,
+    ])
+
+    index = to_local_index(times)
+
+    expected = [datetime.fromtimestamp(t / 1000) for t in times]
+    assert list(index.to_pydatetime()) == expected
+    assert index.name == 'Date'
+
+
+START = 1640136540000
+MINUTE = 60000
+
+
+def test_append_wraps_around_keeping_the_newest_bars():
+    bars = BarStore(capacity=3)
+    for i in range(10):
+        bars.append(START + i * MINUTE, 100 + i, 1)
+        assert len(bars) == min(i + 1, 3)
+        assert bars.times()[-1] == START + i * MINUTE
+        # The live bars stay one contiguous slice inside the doubled arrays.
+        assert bars._end <= len(bars._times)
+
+    assert bars.times().tolist() == [START + i * MINUTE for i in (7, 8, 9)]
+    assert bars.values()[3].tolist() == [107, 108, 109]
+    assert bars.last_time == START + 9 * MINUTE
+
+    bars.extend([START + 10 * MINUTE, START + 11 * MINUTE], [1, 2], [1, 2], [1, 2], [1, 2], [1, 2])
+    assert bars.times().tolist() == [START + i * MINUTE for i in (9, 10, 11)]
+
+
+def test_add_trades_spanning_minutes():
+    bars = BarStore()
+    times = START + np.array([1000, 30000, 59999, 60000, 61000, 125000])
+    prices = np.array([10.0, 12.0, 9.0, 11.0, 13.0, 14.0])
+    sizes = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    assert bars.add_trades(times, prices, sizes) == 3
+
+    assert bars.times().tolist() == [START, START + MINUTE, START + 2 * MINUTE]
+    np.testing.assert_array_equal(bars.values(), [
+        [10, 11, 14],
+        [12, 13, 14],
+        [9, 11, 14],
+        [9, 13, 14],
+        [6, 9, 6],
+    ])
+
+    # A batch that continues the newest bar and starts another, with a late trade
+    # for the first one.
+    assert bars.add_trades(START + np.array([126000, 10000, 180000]), np.array([15.0, 8.0, 16.0]), np.ones(3)) == 1
+    assert bars.values(last=2).tolist() == [[14, 16], [15, 16], [14, 16], [15, 16], [7, 1]]
+    assert bars.values()[:, 0].tolist() == [10, 12, 8, 9, 7]
+
+
+def test_merge_history_inserts_and_replaces():
+    bars = BarStore()
+    for minute in (0, 1, 3):
+        bars.append(START + minute * MINUTE, 100 + minute, 10)
+
+    added = bars.merge_history(
+        [START + MINUTE, START + 2 * MINUTE, START + 4 * MINUTE],
+        [201, 202, 204], [211, 212, 214], [191, 192, 194], [205, 206, 208], [50, 60, 70],
+    )
+
+    assert added == 2
+    assert bars.times().tolist() == [START + minute * MINUTE for minute in range(5)]
+    assert bars.values()[0].tolist() == [100, 201, 202, 103, 204]
+    assert bars.values()[4].tolist() == [10, 50, 60, 10, 70]
+    assert bars.last_time == START + 4 * MINUTE
+
+    # A complete bar for an existing minute replaces it and returns what it had.
+    assert bars.set_bar(START + 3 * MINUTE, 1, 2, 0.5, 1.5, 99) == 10
+    assert bars.set_bar(START + 5 * MINUTE, 1, 2, 0.5, 1.5, 99) is None
+
+
+def test_from_candles_matches_from_data_frame():
+    candles = [
+        {'datetime': START + i * MINUTE, 'open': 10 + i, 'high': 11 + i, 'low': 9 + i, 'close': 10.5 + i, 'volume': 100 * i}
+        for i in range(5)
+    ]
+    bars = convert_price_history_to_bar_store({'candles': candles}, capacity=2)
+    from_frame = BarStore.from_data_frame(convert_price_history_to_data_frame({'candles': candles}))
+
+    assert len(bars) == 5
+    np.testing.assert_array_equal(bars.times(), from_frame.times())
+    np.testing.assert_array_equal(bars.values(), from_frame.values())
+    assert bars.snapshot.version == 1
@@ -0,0 +1,38 @@
+import pytest
+
+from tos.decoder import available_backends
+from tos.decoder import get_decoder
+
+BACKENDS = [backend for backend in ('json', 'orjson', 'msgspec') if backend in available_backends()]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_replacement_character_inside_string_is_kept(backend):
+    decode = get_decoder(backend)
+    message = '{"25":"Apple\ufffd Inc"}'
+
+    assert decode(message) == {'25': 'Apple\ufffd Inc'}
+    assert decode(message.encode('utf-8')) == {'25': 'Apple\ufffd Inc'}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_bare_replacement_character_becomes_none(backend):
+    decode = get_decoder(backend)
+    message = '{"1":\ufffd,"2":470.5}'
+
+    assert decode(message) == {'1': 'None', '2': 470.5}
+    assert decode(message.encode('utf-8')) == {'1': 'None', '2': 470.5}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_invalid_utf8_is_replaced(backend):
+    decode = get_decoder(backend)
+
+    assert decode(b'{"25":"Apple\xff Inc"}') == {'25': 'Apple\ufffd Inc'}
+    assert decode(b'{"1":\xff,"2":470.5}') == {'1': 'None', '2': 470.5}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_invalid_json_still_raises(backend):
+    with pytest.raises(ValueError):
+        get_decoder(backend)('{"1":470.5')
@@ -0,0 +1,35 @@
+import asyncio
+
+from tos.mock_server import MockStreamerServer
+from tos.mock_server import mock_streaming_session
+
+
+def test_ticks_subscribes_to_its_symbols():
+
+    async def run() -> None:
+        server = MockStreamerServer(port=0, message_rate=200, seed=1)
+        await server.start()
+        streamer = mock_streaming_session(server.url)
+        streamer.subscriptions.flush_interval = 0
+        try:
+            seen = set()
+            async for batch in streamer.ticks(symbols=['/ES', 'SPY']):
+                seen.add(batch.symbol)
+                if seen == {'/ES', 'SPY'}:
+                    break
+            assert streamer.subscriptions.symbols('TIMESALE_FUTURES') == ['/ES']
+            assert streamer.subscriptions.symbols('TIMESALE_EQUITY') == ['SPY']
+
+            async for update in streamer.quotes(symbols=['AAPL']):
+                assert update.symbol == 'AAPL'
+                break
+            await asyncio.sleep(0.05)
+
+            # Closing the iterators released their symbols.
+            assert streamer.subscriptions.symbols('TIMESALE_FUTURES') == []
+            assert streamer.subscriptions.symbols('QUOTE') == []
+            await streamer.stop()
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
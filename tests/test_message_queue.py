@@ -0,0 +1,69 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from tos.message_queue import StreamMessageQueue
+from tos.stream import TDStreamerClient
+
+MESSAGE_RATE = 1000
+HANDLER_SECONDS = 0.005
+
+
+class FloodingConnection():
+
+    """Sends a quote message every 1 / MESSAGE_RATE seconds."""
+
+    def __init__(self) -> None:
+        self.sent = 0
+
+    async def recv(self) -> str:
+        await asyncio.sleep(1 / MESSAGE_RATE)
+        self.sent += 1
+        return json.dumps({'data': [{
+            'service': 'QUOTE',
+            'timestamp': 1640136547000 + self.sent,
+            'command': 'SUBS',
+            'content': [{'key': 'SPY', '1': 470.0 + self.sent / 100}],
+        }]})
+
+
+async def flood(policy: str, seconds: float = 0.5) -> StreamMessageQueue:
+    streamer = TDStreamerClient(websocket_url='', user_principal_data={}, credentials={})
+    streamer.connection = FloodingConnection()
+    streamer.queue = StreamMessageQueue(maxsize=10, policy=policy, decoder=streamer.decoder)
+    streamer.events.on_quote(lambda symbol, fields: time.sleep(HANDLER_SECONDS))
+
+    tasks = [asyncio.ensure_future(streamer._read_messages()), asyncio.ensure_future(streamer._process_messages())]
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    streamer._dispatch_executor.shutdown(wait=True)
+    return streamer.queue
+
+
+@pytest.mark.parametrize('policy', ['drop-oldest', 'coalesce'])
+def test_slow_handler_engages_overflow_policy(policy):
+    queue = asyncio.run(flood(policy))
+
+    assert queue.max_depth == queue.maxsize
+    assert queue.dropped + queue.coalesced > 0
+    # The reader kept up with the socket while the handler fell behind.
+    assert queue.enqueued + queue.dropped + queue.coalesced > queue.dequeued
+
+
+def test_get_returns_when_each_message_was_read():
+
+    async def run() -> list:
+        queue = StreamMessageQueue(maxsize=2, policy='coalesce', decoder=json.loads)
+        for n in range(4):
+            message = {'data': [{'service': 'QUOTE', 'timestamp': n, 'content': [{'key': 'SPY', '1': n}]}]}
+            await queue.put(json.dumps(message), received_ns=100 + n)
+        return [await queue.get() for _ in range(queue.depth)]
+
+    received = [received_ns for _, received_ns in asyncio.run(run())]
+
+    # The coalesced message keeps the reading of its first part.
+    assert received == [100, 101, 102]
@@ -0,0 +1,98 @@
+import pytest
+
+from data_models.order_book import ASK
+from data_models.order_book import BID
+from data_models.order_book import BookSide
+from data_models.order_book import OrderBook
+from data_models.order_book import OrderBooks
+
+
+def book_content(symbol: str, bid: float) -> dict:
+    return {
+        'key': symbol,
+        '1': 1640136547000,
+        '2': [{'0': bid, '1': 100, '2': 1, '3': []}],
+        '3': [{'0': bid + 0.01, '1': 200, '2': 1, '3': []}],
+    }
+
+
+def test_books_by_symbol():
+    books = OrderBooks()
+    books.apply_content('NASDAQ_BOOK', [book_content('AAPL', 172.5), book_content('MSFT', 334.75)])
+    books.apply_content('LISTED_BOOK', [book_content('AAPL', 172.4)])
+
+    assert books['AAPL'] is books.get('AAPL', 'NASDAQ_BOOK')
+    assert books['MSFT'] is books.get('MSFT')
+    with pytest.raises(KeyError):
+        books['SPY']
+
+
+def levels(*pairs) -> list:
+    return [{'0': price, '1': size, '2': 1, '3': []} for price, size in pairs]
+
+
+def test_replace_removes_stale_levels():
+    book = OrderBook('AAPL')
+    assert book.apply({'1': 1, '2': levels((172.5, 100), (172.49, 200), (172.48, 300))}) == 3
+
+    # Only the changed and the missing levels count.
+    assert book.apply({'1': 2, '2': levels((172.5, 100), (172.48, 400))}) == 2
+    assert book.top(5)[0] == [(172.5, 100), (172.48, 400)]
+    assert book.depth_at(BID, 172.49) == 0.0
+    assert book.book_time == 2
+    assert book.messages == 2 and book.level_changes == 5
+
+    assert book.bids.replace([]) == 2
+    assert len(book.bids) == 0 and book.best_bid() is None
+
+
+def test_set_level_with_size_zero_removes_it():
+    book = OrderBook('AAPL')
+    assert book.set_level(ASK, 172.51, 100)
+    assert book.set_level(ASK, 172.52, 200, count=2)
+    assert not book.set_level(ASK, 172.52, 200, count=2)
+    book.asks.entries[172.51] = [{'0': 'NSDQ', '1': 100, '2': 1000}]
+
+    assert book.set_level(ASK, 172.51, 0)
+    assert not book.set_level(ASK, 172.51, 0)
+    assert book.top(5)[1] == [(172.52, 200)]
+    assert book.market_makers(ASK, 172.51) == []
+    assert book.level_changes == 3
+
+
+def test_queries():
+    book = OrderBook('AAPL')
+    book.apply({
+        '2': levels((172.5, 100), (172.49, 200), (172.47, 300)),
+        '3': levels((172.51, 50), (172.52, 150), (172.55, 250)),
+    })
+
+    assert book.best_bid() == 172.5 and book.best_ask() == 172.51
+    assert book.spread() == pytest.approx(0.01)
+    assert book.mid() == pytest.approx(172.505)
+    assert book.top(2) == ([(172.5, 100), (172.49, 200)], [(172.51, 50), (172.52, 150)])
+
+    assert book.depth_at(BID, 172.49) == 200
+    assert book.depth_at(ASK, 172.53) == 0.0
+    # Through a price means that level and every better one.
+    assert book.depth_through(BID, 172.49) == 300
+    assert book.depth_through(BID, 172.48) == 300
+    assert book.depth_through(BID, 172.51) == 0
+    assert book.depth_through(ASK, 172.52) == 200
+    assert book.depth_through(ASK, 173) == 450
+
+    assert book.imbalance(1) == pytest.approx((100 - 50) / 150)
+    assert book.imbalance() == pytest.approx((600 - 450) / 1050)
+    assert OrderBook('MSFT').imbalance() == 0.0
+    assert OrderBook('MSFT').spread() is None
+
+
+def test_bids_sort_best_first_by_negated_price():
+    bids = BookSide(-1)
+    for price in (172.48, 172.5, 172.49, 172.47):
+        bids.set_level(price, 100)
+
+    assert bids.keys == [-172.5, -172.49, -172.48, -172.47]
+    assert bids.best() == 172.5
+    assert [price for price, _ in bids.top(4)] == [172.5, 172.49, 172.48, 172.47]
+    assert bids.size_at(172.48) == 100 and bids.size_at(172.46) == 0.0
@@ -0,0 +1,46 @@
+import numpy as np
+
+from data_models.quote_table import QuoteTable
+
+
+def test_quote_merges_partial_fields():
+    quotes = QuoteTable('QUOTE', capacity=1)
+    quotes.merge([
+        {'key': 'SPY', '1': 470.1, '2': 470.12, '3': 470.11, '6': 'P', '7': 'Q'},
+        {'key': 'QQQ', '1': 398.5, '2': 398.55},
+    ])
+    # Only the ask of SPY changed, the rest of its row is kept.
+    quotes.merge([{'key': 'SPY', '2': 470.14}])
+
+    assert quotes.symbols == ['SPY', 'QQQ']
+    assert quotes.updates == 3
+    np.testing.assert_allclose(quotes.bid(), [470.1, 398.5])
+    np.testing.assert_allclose(quotes.ask(), [470.14, 398.55])
+    np.testing.assert_allclose(quotes.spread(), [0.04, 0.05], atol=1e-9)
+    assert np.isnan(quotes.last()[1])
+    assert quotes.get('SPY', 'ask-id') == 'P'
+    assert quotes.get('QQQ', 'last-price') is None
+    assert quotes.get('IWM', 'bid-price') is None
+    assert quotes.quote('SPY') == {
+        'bid-price': 470.1, 'ask-price': 470.14, 'last-price': 470.11,
+        'ask-id': 'P', 'bid-id': 'Q', 'symbol': 'SPY',
+    }
+
+
+def test_option_reads_prices_by_name():
+    quotes = QuoteTable('OPTION')
+    quotes.merge([{
+        'key': 'SPY_011422C470',
+        '1': 'SPY Jan 14 2022 470 Call',
+        '2': 4.1,
+        '3': 4.2,
+        '4': 4.15,
+    }])
+    quotes.merge([{'key': 'SPY_011422C470', '4': 4.18}])
+
+    np.testing.assert_allclose(quotes.bid(), [4.1])
+    np.testing.assert_allclose(quotes.ask(), [4.2])
+    np.testing.assert_allclose(quotes.last(), [4.18])
+    np.testing.assert_allclose(quotes.mid(), [4.15])
+    assert quotes.get('SPY_011422C470', 'description') == 'SPY Jan 14 2022 470 Call'
+    assert np.isnan(quotes.column('description')[0])
@@ -0,0 +1,144 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from tos.mock_server import MockStreamerServer
+from tos.mock_server import mock_streaming_session
+
+
+async def serve() -> tuple:
+    server = MockStreamerServer(port=0, message_rate=100, seed=1)
+    await server.start()
+    streamer = mock_streaming_session(server.url)
+    streamer.timesale(service='TIMESALE_FUTURES', symbols=['/ES'], fields=[0, 1, 2, 3, 4])
+    streamer.reconnect_base_delay = 0
+    return server, streamer
+
+
+def test_refused_login_on_reconnect_ends_the_iterator():
+
+    async def run() -> None:
+        server, streamer = await serve()
+        try:
+            with pytest.raises(ValueError, match='LOGIN ERROR'):
+                async for batch in streamer.ticks():
+                    server.reject_login = True
+                    await streamer.connection.close()
+            assert streamer.reconnect is False
+            assert isinstance(streamer.stream_error, ValueError)
+            await streamer.stop()
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_close_stream_does_not_reconnect(tmp_path, capsys):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        server, streamer = loop.run_until_complete(serve())
+        loop.call_later(0.2, lambda: asyncio.ensure_future(streamer.close_stream()))
+        latency_report = str(tmp_path / 'latency.json')
+        streamer.stream(print_to_console=False, queue_size=100, latency_report=latency_report)
+        loop.run_until_complete(asyncio.sleep(0.2))
+
+        assert server.connections == 1
+        assert streamer.reconnects == 0
+        # The latency report goes to the file only, it isn't printed.
+        assert 'p99 us' not in capsys.readouterr().out
+        assert 'server_to_recv' in open(latency_report).read()
+        loop.run_until_complete(server.stop())
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+class SlowRecorder():
+
+    """Stands in for the `StreamRecorder`, notes what ran while a message was being recorded."""
+
+    def __init__(self, state: dict) -> None:
+        self.state = state
+        self.records = 0
+        self.records_after_close = 0
+        self.closed = False
+
+    def record(self, message_decoded: dict) -> None:
+        self.state['busy'] = True
+        time.sleep(0.002)
+        self.state['busy'] = False
+        self.records += 1
+        if self.closed:
+            self.records_after_close += 1
+
+    def close(self) -> None:
+        self.state['overlaps'] += self.state['busy']
+        self.closed = True
+
+
+def test_reconnect_and_close_wait_for_the_dispatch_thread():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        server, streamer = loop.run_until_complete(serve())
+        state = {'busy': False, 'overlaps': 0, 'threads': set()}
+        streamer.recorder = SlowRecorder(state)
+        streamer.events.on_tick(lambda symbol, times, prices, sizes: time.sleep(0.005))
+
+        reset_stream = streamer.sequences.reset_stream
+
+        def checked_reset_stream() -> None:
+            state['threads'].add(threading.current_thread().name)
+            state['overlaps'] += state['busy']
+            reset_stream()
+
+        streamer.sequences.reset_stream = checked_reset_stream
+        loop.call_later(0.3, lambda: asyncio.ensure_future(streamer.connection.close()))
+        loop.call_later(0.8, lambda: asyncio.ensure_future(streamer.close_stream()))
+        streamer.stream(print_to_console=False, queue_size=1000)
+
+        assert streamer.reconnects == 1
+        assert all(name.startswith('StreamDispatch') for name in state['threads']) and state['threads']
+        assert state['overlaps'] == 0
+        # Everything read before the close was dispatched and recorded, nothing after it.
+        assert streamer.queue.depth == 0
+        assert streamer.recorder.records > 0
+        assert streamer.recorder.records_after_close == 0
+        loop.run_until_complete(server.stop())
+    finally:
+        streamer._dispatch_executor.shutdown(wait=True)
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_backfill_merges_on_the_dispatch_thread():
+    threads = []
+
+    def price_history(symbol, start_date, end_date, frequency_type, frequency) -> dict:
+        return {'candles': [{'datetime': 60000, 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 10}]}
+
+    async def run() -> None:
+        streamer = mock_streaming_session('ws://localhost:1', price_history=price_history)
+        streamer.loop = asyncio.get_running_loop()
+        streamer.timesale(service='TIMESALE_EQUITY', symbols=['SPY'], fields=[0, 1, 2, 3, 4])
+        streamer.bars = streamer._build_bar_registry()
+        merge_history = streamer.bars.merge_history
+
+        def checked_merge_history(symbol, candles) -> int:
+            threads.append(threading.current_thread().name)
+            return merge_history(symbol, candles)
+
+        streamer.bars.merge_history = checked_merge_history
+        streamer._dispatch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='StreamDispatch')
+        try:
+            await streamer._backfill(since_ms=0)
+        finally:
+            streamer._dispatch_executor.shutdown(wait=True)
+        assert streamer.backfilled_bars == 1
+
+    asyncio.run(run())
+    assert threads and threads[0].startswith('StreamDispatch')
@@ -0,0 +1,320 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from tos.compression import codec_of
+from tos.compression import compress_file
+from tos.recorder import MAGIC
+from tos.recorder import StreamRecorder
+from tos.recorder import _concatenate
+from tos.recorder import build_columns
+from tos.recorder import encode_batch
+from tos.recorder import iter_batches
+from tos.recorder import iter_buffer_batches
+from tos.recorder import read_recording
+from tos.recorder import segment_paths
+from tos.tick_journal import day_name
+from tos.stream import TDStreamerClient
+
+
+def test_write_behavior_forwards_recorder_options(tmp_path):
+    streamer = TDStreamerClient(websocket_url='', user_principal_data={}, credentials={})
+    streamer.write_behavior(
+        file_path=str(tmp_path / 'es'),
+        write='binary',
+        rotate_bytes=1 << 20,
+        rotate_session=True,
+        codec='gzip',
+        retention_days=30,
+        retention_bytes=1 << 30,
+    )
+    recorder = streamer.recorder
+    try:
+        assert recorder.rotating
+        assert recorder.rotate_bytes == 1 << 20
+        assert recorder.codec == 'gzip'
+        assert recorder.retention_days == 30
+        assert recorder.retention_bytes == 1 << 30
+    finally:
+        recorder.close()
+
+
+def test_bool_field_missing_from_some_records_is_stored_as_float(tmp_path):
+    recorder = StreamRecorder(str(tmp_path / 'quotes'), background=False)
+    recorder.record({'data': [{
+        'service': 'QUOTE',
+        'timestamp': 1640136547000,
+        'command': 'SUBS',
+        'content': [
+            {'key': 'SPY', '1': 470.25, '48': True},
+            {'key': 'AAPL', '1': 172.5},
+            {'key': 'MSFT', '1': 334.75, '48': False},
+        ],
+    }]})
+    recorder.close()
+
+    halted = read_recording(str(tmp_path / 'quotes.tdrec'))['QUOTE']['48']
+    assert halted.dtype == np.float64
+    assert halted[0] == 1.0 and np.isnan(halted[1]) and halted[2] == 0.0
+
+
+def quote_message(symbol: str, bid: float, timestamp: int = 1640136547000) -> dict:
+    return {'data': [{
+        'service': 'QUOTE',
+        'timestamp': timestamp,
+        'command': 'SUBS',
+        'content': [{'key': symbol, '1': bid, '2': bid + 0.01}],
+    }]}
+
+
+def record_segments(recorder: StreamRecorder, count: int, first: int = 0) -> None:
+    """Records one quote per write, so every write past the first starts a segment."""
+    for i in range(first, first + count):
+        recorder.record(quote_message('SPY', 470 + i))
+        recorder.flush()
+
+
+def test_rotate_bytes_names_segments_and_reopens_the_last_one(tmp_path):
+    base_path = str(tmp_path / 'es')
+    recorder = StreamRecorder(base_path, background=False, rotate_bytes=64, codec=None)
+    record_segments(recorder, 3)
+    recorder.close()
+
+    day = day_name(recorder.session_day())
+    names = ['es.{}.{:03d}.tdrec'.format(day, number) for number in range(3)]
+    assert sorted(os.listdir(tmp_path)) == names
+    assert recorder.metrics()['segments'] == 3
+
+    recorder = StreamRecorder(base_path, background=False, rotate_bytes=1 << 20, codec=None)
+    assert recorder.file_path == str(tmp_path / names[-1])
+    record_segments(recorder, 1, first=3)
+    recorder.close()
+
+    assert sorted(os.listdir(tmp_path)) == names
+    assert len(list(iter_batches(str(tmp_path / names[-1])))) == 2
+    assert read_recording(base_path)['QUOTE']['1'].tolist() == [470, 471, 472, 473]
+
+    # Without append mode the next segment is started instead.
+    recorder = StreamRecorder(base_path, background=False, rotate_bytes=1 << 20, codec=None, append_mode=False)
+    recorder.close()
+    assert recorder.file_path == str(tmp_path / 'es.{}.003.tdrec'.format(day))
+
+
+def test_closed_segments_are_compressed(tmp_path):
+    base_path = str(tmp_path / 'es')
+    recorder = StreamRecorder(base_path, background=False, rotate_bytes=64, codec='gzip')
+    record_segments(recorder, 3)
+    recorder.close()
+
+    assert all(name.endswith('.tdrec.gz') for name in os.listdir(tmp_path))
+    assert len(segment_paths(base_path)) == 3
+    metrics = recorder.metrics()
+    assert metrics['segments_compressed'] == 3
+    assert metrics['compression_ratio'] is not None
+    assert read_recording(base_path)['QUOTE']['1'].tolist() == [470, 471, 472]
+
+    # A compressed last segment isn't appended to, the next one is started.
+    recorder = StreamRecorder(base_path, background=False, rotate_bytes=1 << 20, codec=None)
+    recorder.close()
+    assert recorder.file_path.endswith('.003.tdrec')
+
+
+def test_retention_deletes_the_oldest_segments(tmp_path, monkeypatch):
+    base_path = str(tmp_path / 'es')
+    today = 19000
+    monkeypatch.setattr(StreamRecorder, 'session_day', lambda self: today)
+
+    def segment(day: int, number: int = 0, size: int = 1000) -> str:
+        path = str(tmp_path / 'es.{}.{:03d}.tdrec'.format(day_name(day), number))
+        with open(path, 'wb') as segment_file:
+            segment_file.write(MAGIC + b'\x00' * (size - len(MAGIC)))
+        return path
+
+    old, yesterday = segment(today - 5), segment(today - 1)
+    recorder = StreamRecorder(base_path, background=False, rotate_session=True, codec=None, retention_days=2)
+    recorder.close()
+    assert not os.path.exists(old) and os.path.exists(yesterday)
+    assert recorder.segments_deleted == 1
+
+    oldest, older = segment(today - 1, 1), segment(today - 1, 2)
+    recorder = StreamRecorder(base_path, background=False, rotate_session=True, codec=None, retention_bytes=1500)
+    recorder.close()
+    # The open segment counts towards the total too.
+    assert not os.path.exists(yesterday) and not os.path.exists(oldest)
+    assert os.path.exists(older) and os.path.exists(recorder.file_path)
+
+
+def test_read_recording_across_compressed_and_plain_segments(tmp_path):
+    base_path = str(tmp_path / 'es')
+    recorder = StreamRecorder(base_path, background=False, rotate_bytes=64, codec=None)
+    record_segments(recorder, 4)
+    recorder.close()
+
+    paths = segment_paths(base_path)
+    compress_file(paths[0], 'gzip')
+    compress_file(paths[2], 'gzip')
+    assert [codec_of(path) for path in segment_paths(base_path)] == ['gzip', None, 'gzip', None]
+
+    assert read_recording(base_path)['QUOTE']['1'].tolist() == [470, 471, 472, 473]
+    assert read_recording(base_path, services=['TIMESALE_EQUITY']) == {}
+    with pytest.raises(FileNotFoundError):
+        read_recording(str(tmp_path / 'nq'))
+
+
+def round_trip(service: str, timestamps: list, content: list) -> dict:
+    encoded = encode_batch(service, build_columns(service, timestamps, content))
+    ((read_service, columns),) = list(iter_buffer_batches(encoded))
+    assert read_service == service
+    return columns
+
+
+def test_timesale_ticks_round_trip_per_symbol():
+    content = [
+        {'key': '/ES', '1': 1640136547000, '2': 4700.25, '3': 2, '4': 101, 'seq': 7},
+        {'key': '/NQ', '1': 1640136547001, '2': 16200.5, '3': 1, '4': 55, 'seq': 8},
+        {'key': '/ES', '1': 1640136547005, '2': 4700.0, '3': 5, '4': 102, 'seq': 9},
+        {'key': '/NQ', '1': 1640136546990, '2': 16201.0, '3': 3, '4': 54, 'seq': 10},
+        {'key': '/ES', '1': 1640136547010, '2': 4700.5, '3': 1, 'seq': 11},
+    ]
+    timestamps = [1640136547100, 1640136547100, 1640136547200, 1640136547200, 1640136547300]
+    columns = round_trip('TIMESALE_FUTURES', timestamps, content)
+
+    assert columns['key'].tolist() == [c['key'] for c in content]
+    assert columns['timestamp'].tolist() == timestamps
+    assert columns['time'].tolist() == [c['1'] for c in content]
+    assert columns['price'].tolist() == [c['2'] for c in content]
+    assert columns['size'].tolist() == [c['3'] for c in content]
+    assert columns['sequence'].tolist() == [101, 55, 102, 54, -1]
+    assert columns['seq'].tolist() == [7, 8, 9, 10, 11]
+
+
+def test_book_rows_round_trip_one_row_per_level():
+    content = [{
+        'key': 'AAPL',
+        '1': 1640136547000,
+        '2': [
+            {'0': 172.5, '1': 300, '2': 2, '3': [{'0': 'NSDQ', '1': 200, '2': 1000}, {'0': 'ARCX', '1': 100, '2': 1001}]},
+            {'0': 172.49, '1': 100, '2': 1, '3': []},
+        ],
+        '3': [{'0': 172.51, '1': 500, '2': 1, '3': [{'0': 'EDGX', '1': 500, '2': 1002}]}],
+    }]
+    columns = round_trip('NASDAQ_BOOK', [1640136547100], content)
+
+    assert columns['key'].tolist() == ['AAPL'] * 3
+    assert columns['book_time'].tolist() == [1640136547000] * 3
+    assert columns['side'].tolist() == [0, 0, 1]
+    assert columns['level'].tolist() == [0, 1, 0]
+    assert columns['price'].tolist() == [172.5, 172.49, 172.51]
+    assert columns['size'].tolist() == [300, 100, 500]
+    assert columns['count'].tolist() == [2, 1, 1]
+    assert columns['entries'].tolist() == ['NSDQ:200:1000;ARCX:100:1001', '', 'EDGX:500:1002']
+
+
+def test_concatenate_fills_fields_missing_from_some_batches():
+    first = round_trip('QUOTE', [1, 1], [{'key': 'SPY', '1': 470.25, '25': 'SPDR'}, {'key': 'QQQ', '1': 398.5, '25': 'QQQ'}])
+    second = round_trip('QUOTE', [2], [{'key': 'SPY', '1': 470.3, '8': 1000}])
+    columns = _concatenate([first, second])
+
+    assert columns['key'].tolist() == ['SPY', 'QQQ', 'SPY']
+    assert columns['timestamp'].tolist() == [1, 1, 2]
+    assert columns['1'].tolist() == [470.25, 398.5, 470.3]
+    assert columns['25'].dtype == object
+    assert columns['25'][:2].tolist() == ['SPDR', 'QQQ'] and np.isnan(columns['25'][2])
+    assert np.isnan(columns['8'][:2]).all() and columns['8'][2] == 1000
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_background_writer_hands_off_full_batches(tmp_path):
+    recorder = StreamRecorder(str(tmp_path / 'quotes'), batch_rows=2, flush_interval=60, flush_bytes=1)
+    try:
+        for i in range(3):
+            recorder.record(quote_message('SPY', 470 + i))
+        wait_for(lambda: recorder.metrics()['batches'] == 1)
+        metrics = recorder.metrics()
+        assert metrics['buffered_records'] == 1
+        assert metrics['pending_records'] == 0
+    finally:
+        recorder.close()
+
+
+def test_background_writer_hands_off_on_the_flush_interval(tmp_path):
+    recorder = StreamRecorder(str(tmp_path / 'quotes'), batch_rows=10000, flush_interval=0.05)
+    try:
+        recorder.record(quote_message('SPY', 470))
+        wait_for(lambda: recorder.metrics()['writes'] == 1)
+        assert recorder.metrics()['buffered_records'] == 0
+        assert read_recording(str(tmp_path / 'quotes.tdrec'))['QUOTE']['1'].tolist() == [470]
+    finally:
+        recorder.close()
+
+
+def test_records_past_max_pending_records_are_dropped(tmp_path, monkeypatch):
+    encoding = threading.Event()
+    release = threading.Event()
+
+    def slow_build_columns(service, timestamps, content):
+        encoding.set()
+        release.wait()
+        return build_columns(service, timestamps, content)
+
+    monkeypatch.setattr('tos.recorder.build_columns', slow_build_columns)
+    recorder = StreamRecorder(str(tmp_path / 'quotes'), batch_rows=1, flush_interval=60, max_pending_records=2)
+    try:
+        recorder.record(quote_message('SPY', 470))
+        encoding.wait(5)
+        for i in range(1, 4):
+            recorder.record(quote_message('SPY', 470 + i))
+        metrics = recorder.metrics()
+        assert metrics['pending_records'] == 3
+        assert metrics['dropped'] == 1
+        assert metrics['records'] == 3
+    finally:
+        release.set()
+        recorder.close()
+    assert read_recording(str(tmp_path / 'quotes.tdrec'))['QUOTE']['1'].tolist() == [470, 471, 472]
+
+
+@pytest.mark.parametrize('fsync, fsync_interval, fsyncs', [
+    ('batch', 5.0, 3 + 1),
+    ('interval', 3600.0, 0 + 1),
+    ('interval', 0.0, 3 + 1),
+    ('never', 5.0, 0),
+])
+def test_fsync_policies(tmp_path, fsync, fsync_interval, fsyncs):
+    recorder = StreamRecorder(str(tmp_path / 'quotes'), background=False, fsync=fsync, fsync_interval=fsync_interval)
+    for i in range(3):
+        recorder.record(quote_message('SPY', 470 + i))
+        recorder.flush()
+    # An empty flush doesn't write or fsync.
+    recorder.flush()
+    assert recorder.metrics()['writes'] == 3
+    # Closing fsyncs once more unless the policy is 'never'.
+    recorder.close()
+    assert recorder.metrics()['fsyncs'] == fsyncs
+
+
+def test_close_writes_everything_still_buffered(tmp_path):
+    recorder = StreamRecorder(str(tmp_path / 'quotes'), batch_rows=10000, flush_interval=60, flush_bytes=1 << 30)
+    for i in range(3):
+        recorder.record(quote_message('SPY', 470 + i))
+    recorder.record({'data': [{'service': 'NASDAQ_BOOK', 'timestamp': 1, 'content': [
+        {'key': 'AAPL', '1': 1, '2': [{'0': 172.5, '1': 100, '2': 1, '3': []}], '3': []},
+    ]}]})
+    assert recorder.metrics()['writes'] == 0
+    recorder.close()
+
+    metrics = recorder.metrics()
+    assert metrics['buffered_records'] == 0 and metrics['pending_records'] == 0
+    assert metrics['buffered_bytes'] == 0 and metrics['batches'] == 2
+    recording = read_recording(str(tmp_path / 'quotes.tdrec'))
+    assert recording['QUOTE']['1'].tolist() == [470, 471, 472]
+    assert recording['NASDAQ_BOOK']['price'].tolist() == [172.5]
@@ -0,0 +1,101 @@
+from tos.sequence import SequenceTracker
+
+SERVICE = 'TIMESALE_FUTURES'
+
+
+def trades(sequences, start_ms: int = 1640136547000, key: str = '/ES', seqs=None) -> list:
+    content = []
+    for n, sequence in enumerate(sequences):
+        trade = {'key': key, '1': start_ms + n, '2': 4640.0, '3': 1.0, '4': sequence}
+        if seqs is not None:
+            trade['seq'] = seqs[n]
+        content.append(trade)
+    return content
+
+
+def test_in_order_trades_are_kept_as_is():
+    tracker = SequenceTracker()
+    content = trades(range(1, 101))
+
+    assert tracker.filter(SERVICE, content) is content
+    assert tracker.symbol_metrics('/ES')['trades'] == 100
+    assert tracker.last_sequence('/ES') == 100
+
+
+def test_replayed_trades_are_dropped():
+    tracker = SequenceTracker()
+    content = trades(range(1, 11))
+    tracker.filter(SERVICE, content)
+
+    # A reconnect replays the last trades with their original times, then goes on.
+    replayed = content[7:] + trades(range(11, 14), start_ms=1640136547010)
+    kept = tracker.filter(SERVICE, replayed)
+
+    assert [trade['4'] for trade in kept] == [11, 12, 13]
+    assert tracker.symbol_metrics('/ES')['duplicates'] == 3
+    assert tracker.symbol_metrics('/ES')['resets'] == 0
+
+
+def test_gaps_are_counted():
+    tracker = SequenceTracker(gap_history=2)
+    kept = tracker.filter(SERVICE, trades([1, 2, 5, 6, 10, 20]))
+
+    assert len(kept) == 6
+    metrics = tracker.symbol_metrics('/ES')
+    assert (metrics['gaps'], metrics['missing'], metrics['max_gap']) == (3, 14, 9)
+    assert tracker.gapped_symbols() == [('/ES', 14)]
+    # Only the most recent gaps are kept.
+    assert [(gap.expected, gap.received, gap.size) for gap in tracker.recent_gaps] == [(7, 10, 3), (11, 20, 9)]
+
+
+def test_restarted_numbering_with_newer_trades_is_a_reset():
+    tracker = SequenceTracker()
+    tracker.filter(SERVICE, trades(range(1, 3001)))
+
+    # The next session numbers its trades from 1 again, well within reset_threshold.
+    next_session = trades(range(1, 3001), start_ms=1640222947000)
+    kept = tracker.filter(SERVICE, next_session)
+
+    assert len(kept) == 3000
+    metrics = tracker.symbol_metrics('/ES')
+    assert metrics['duplicates'] == 0
+    assert metrics['resets'] == 1
+    assert metrics['trades'] == 6000
+
+
+def test_large_drop_without_a_time_is_a_reset():
+    tracker = SequenceTracker(reset_threshold=100)
+    tracker.filter(SERVICE, trades([500]))
+    kept = tracker.filter(SERVICE, [{'key': '/ES', '4': 1}, {'key': '/ES', '4': 1}])
+
+    assert len(kept) == 1
+    assert tracker.symbol_metrics('/ES')['resets'] == 1
+    assert tracker.symbol_metrics('/ES')['duplicates'] == 1
+
+
+def test_stream_seq_gaps_and_reset_stream():
+    tracker = SequenceTracker()
+    tracker.filter(SERVICE, trades([1, 2, 3], seqs=[0, 1, 4]))
+
+    assert (tracker.stream_gaps, tracker.stream_missing) == (1, 2)
+
+    # A new login numbers seq from 0 again, the gaps are measured from the new counter.
+    tracker.reset_stream()
+    tracker.filter(SERVICE, trades([4, 5, 6], start_ms=1640136548000, seqs=[0, 1, 3]))
+    assert (tracker.stream_gaps, tracker.stream_missing) == (2, 3)
+
+    # The exchange sequences survive it, so replayed trades are still caught.
+    assert tracker.last_sequence('/ES') == 6
+    assert tracker.filter(SERVICE, trades([6], start_ms=1640136548002)) == []
+
+
+def test_reset_forgets_everything():
+    tracker = SequenceTracker()
+    tracker.filter(SERVICE, trades([1, 5], seqs=[0, 3]))
+    tracker.reset()
+
+    assert tracker.metrics() == {
+        'symbols': 0, 'trades': 0, 'duplicates': 0, 'gaps': 0, 'missing': 0,
+        'max_gap': 0, 'resets': 0, 'stream_gaps': 0, 'stream_missing': 0,
+    }
+    assert not tracker.recent_gaps
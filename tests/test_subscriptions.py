@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+from tos.stream import TDStreamerClient
+from tos.subscriptions import MAX_KEYS_PER_REQUEST
+
+USER_PRINCIPAL_DATA = {'accounts': [{'accountId': '123'}], 'streamerInfo': {'appId': 'app'}}
+
+
+class OpenConnection():
+
+    """Stands in for a live websocket, keeps what was sent."""
+
+    closed = False
+
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def send(self, message: str) -> None:
+        self.sent.append(json.loads(message)['requests'])
+
+
+def live_streamer() -> TDStreamerClient:
+    streamer = TDStreamerClient(websocket_url='', user_principal_data=USER_PRINCIPAL_DATA, credentials={})
+    streamer.connection = OpenConnection()
+    # Changes are only sent when a test flushes them.
+    streamer.subscriptions.flush_interval = 60
+    return streamer
+
+
+def commands(requests: list) -> list:
+    return [(r['service'], r['command'], r.get('parameters', {}).get('keys')) for r in requests]
+
+
+def test_first_symbols_of_a_service_are_subscribed_then_added():
+
+    async def run() -> None:
+        streamer = live_streamer()
+        manager = streamer.subscriptions
+        manager.subscribe('QUOTE', ['SPY', 'QQQ'], fields=[0, 1, 2])
+        assert commands(manager._build_requests()) == [('QUOTE', 'SUBS', 'QQQ,SPY')]
+        assert await manager.flush() == 1
+
+        manager.subscribe('QUOTE', ['IWM', 'SPY'])
+        requests = manager._build_requests()
+        assert commands(requests) == [('QUOTE', 'ADD', 'IWM')]
+        assert requests[0]['parameters']['fields'] == '0,1,2'
+        await manager.flush()
+
+        assert streamer.data_requests['requests'][0]['parameters']['keys'] == 'SPY,QQQ,IWM'
+        assert manager.refcount('QUOTE', 'SPY') == 2
+        assert len(streamer.connection.sent) == 2
+
+    asyncio.run(run())
+
+
+def test_long_key_lists_are_split():
+
+    async def run() -> None:
+        manager = live_streamer().subscriptions
+        symbols = ['SYM{:04d}'.format(i) for i in range(2 * MAX_KEYS_PER_REQUEST + 50)]
+        manager.subscribe('QUOTE', symbols, fields=[0, 1])
+        requests = manager._build_requests()
+        assert [r['command'] for r in requests] == ['SUBS', 'ADD', 'ADD']
+        assert [len(r['parameters']['keys'].split(',')) for r in requests] == [300, 300, 50]
+        await manager.flush()
+
+        manager.unsubscribe('QUOTE', symbols[:MAX_KEYS_PER_REQUEST + 50])
+        requests = manager._build_requests()
+        assert [r['command'] for r in requests] == ['UNSUBS', 'UNSUBS']
+        assert [len(r['parameters']['keys'].split(',')) for r in requests] == [300, 50]
+        await manager.flush()
+
+        # Removing the last symbols unsubscribes the whole service.
+        manager.unsubscribe('QUOTE', symbols)
+        assert commands(manager._build_requests()) == [('QUOTE', 'UNSUBS', None)]
+
+    asyncio.run(run())
+
+
+def test_changes_undone_within_the_window_are_not_sent():
+
+    async def run() -> None:
+        streamer = live_streamer()
+        manager = streamer.subscriptions
+        manager.subscribe('QUOTE', ['SPY'], fields=[0, 1])
+        await manager.flush()
+
+        manager.subscribe('QUOTE', ['QQQ'])
+        manager.unsubscribe('QUOTE', ['QQQ'])
+        manager.unsubscribe('QUOTE', ['SPY'])
+        manager.subscribe('QUOTE', ['SPY'])
+        manager.replace('QUOTE', old=['SPY'], new=['SPY'])
+
+        assert manager._build_requests() == []
+        assert await manager.flush() == 0
+        assert len(streamer.connection.sent) == 1
+        assert manager.symbols('QUOTE') == ['SPY']
+
+    asyncio.run(run())
+
+
+def test_new_fields_resubscribe_the_service():
+
+    async def run() -> None:
+        manager = live_streamer().subscriptions
+        manager.subscribe('QUOTE', ['SPY', 'QQQ'], fields=[0, 1])
+        await manager.flush()
+
+        manager.subscribe('QUOTE', ['IWM'], fields=[3, 2])
+        requests = manager._build_requests()
+        assert commands(requests) == [('QUOTE', 'SUBS', 'SPY,QQQ,IWM')]
+        assert requests[0]['parameters']['fields'] == '0,1,2,3'
+
+        # Fields already subscribed don't resubscribe.
+        await manager.flush()
+        manager.subscribe('QUOTE', ['DIA'], fields=[1])
+        assert commands(manager._build_requests()) == [('QUOTE', 'ADD', 'DIA')]
+
+    asyncio.run(run())
+
+
+def test_unsubscribe_releases_the_symbols_of_a_service():
+
+    async def run() -> None:
+        streamer = live_streamer()
+        streamer.level_one_quotes(symbols=['SPY', 'QQQ'], fields=[0, 1, 2])
+        # An iterator holding its own reference on SPY.
+        streamer.subscriptions.subscribe('QUOTE', ['SPY'])
+        await streamer.subscriptions.flush()
+
+        assert await streamer.unsubscribe('quote') == ['QQQ']
+        assert commands(streamer.connection.sent[-1]) == [('QUOTE', 'UNSUBS', 'QQQ')]
+        assert streamer.subscriptions.symbols('QUOTE') == ['SPY']
+        assert streamer.data_requests['requests'][0]['parameters']['keys'] == 'SPY'
+
+        assert await streamer.unsubscribe('QUOTE') == ['SPY']
+        assert commands(streamer.connection.sent[-1]) == [('QUOTE', 'UNSUBS', None)]
+        assert streamer.data_requests['requests'] == []
+
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from tos.tick_codec import FLAG_SAME_TICK_SIZE
+from tos.tick_codec import TickDecoder
+from tos.tick_codec import TickEncoder
+from tos.tick_codec import decode_ticks
+from tos.tick_codec import encode_ticks
+
+
+def trades(rng, count: int, start: int, tick_size: float) -> tuple:
+    times = start + np.cumsum(rng.integers(0, 50, count))
+    prices = 4640.0 + np.cumsum(rng.integers(-2, 3, count)) * tick_size
+    sizes = rng.integers(1, 20, count).astype(np.float64)
+    sequences = 24152284 + start + np.arange(count)
+    return times, prices, sizes, sequences
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_encoder_round_trip(seed):
+    rng = np.random.default_rng(seed)
+    encoder, decoder = TickEncoder(), TickDecoder()
+    start = 1640136547219
+    for _ in range(50):
+        count = int(rng.choice((0, 1, 3, 15, 16, 200)))
+        tick_size = float(rng.choice((0.25, 1.0, 0.01, 0.3)))
+        message = trades(rng, count, start, tick_size)
+        start += 10000
+        decoded = decoder.decode('/ES', encoder.encode('/ES', *message))
+        for expected, actual in zip(message, decoded):
+            np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-9)
+
+
+def test_stateful_block_skips_repeated_tick_size():
+    encoder = TickEncoder()
+    first = encoder.encode('/ES', np.array([1640136547219]), np.array([4640.25]), np.array([1.0]), np.array([1]))
+    second = encoder.encode('/ES', np.array([1640136547220]), np.array([4640.5]), np.array([2.0]), np.array([2]))
+
+    assert not first[0] & FLAG_SAME_TICK_SIZE
+    assert second[0] & FLAG_SAME_TICK_SIZE
+    assert len(second) == 5
+
+
+def test_block_round_trip():
+    rng = np.random.default_rng(3)
+    message = trades(rng, 1000, 1640136547219, 0.25)
+    decoded, offset = decode_ticks(encode_ticks(*message))
+    for expected, actual in zip(message, decoded):
+        np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+
+from tos.tick_journal import HEADER_SIZE
+from tos.tick_journal import INDEX_DTYPE
+from tos.tick_journal import ONE_DAY_MS
+from tos.tick_journal import TICK_DTYPE
+from tos.tick_journal import TickJournal
+
+# 2021-12-22 00:00 UTC.
+DAY_START = 1640131200000
+
+
+def trades(times) -> tuple:
+    times = np.asarray(times, dtype=np.int64)
+    return times, 100 + np.arange(len(times)) / 100, np.ones(len(times))
+
+
+def test_range_across_a_day_boundary(tmp_path):
+    journal = TickJournal(str(tmp_path), stride=4)
+    times = DAY_START + ONE_DAY_MS + np.arange(-10, 10) * 1000
+    journal.append('/ES', *trades(times))
+
+    assert len(journal.days('/ES')) == 2
+    assert journal.symbols() == ['/ES']
+    assert journal.range('/ES').tolist() == journal.range('/ES', times[0], times[-1] + 1).tolist()
+    np.testing.assert_array_equal(journal.range('/ES', times[5], times[15])['time'], times[5:15])
+    np.testing.assert_array_equal(journal.range('/ES', times[10])['time'], times[10:])
+    np.testing.assert_array_equal(journal.range('/ES', end_ms=times[10])['time'], times[:10])
+    assert [len(day) for day in journal.iter_days('/ES', times[5], times[15])] == [5, 5]
+    assert len(journal.range('SPY')) == 0
+
+
+def test_bound_at_stride_edges(tmp_path):
+    journal = TickJournal(str(tmp_path), stride=4)
+    # Repeated times straddle the index entries at positions 4 and 8.
+    times = DAY_START + np.array([0, 1, 2, 3, 3, 3, 4, 5, 5, 6, 7, 8]) * 1000
+    journal.append('/ES', *trades(times))
+
+    records, index = journal._mapped('/ES', journal.day_of(DAY_START))
+    assert index['position'].tolist() == [0, 4, 8]
+    for time_ms in DAY_START + np.arange(-1, 10) * 1000:
+        for side in ('left', 'right'):
+            assert journal._bound(records['time'], index, time_ms, side) == np.searchsorted(times, time_ms, side)
+
+
+def test_reopen_drops_a_cut_off_record_and_rebuilds_the_index(tmp_path):
+    journal = TickJournal(str(tmp_path), stride=4)
+    times = DAY_START + np.arange(10) * 1000
+    journal.append('/ES', *trades(times))
+    journal.close()
+
+    day = journal.day_of(DAY_START)
+    ticks_path = journal.path('/ES', day)
+    with open(ticks_path, 'ab') as ticks:
+        ticks.write(b'\x00' * (TICK_DTYPE.itemsize // 2))
+    os.remove(journal.path('/ES', day, '.idx'))
+
+    journal = TickJournal(str(tmp_path), stride=4)
+    journal.append('/ES', *trades(DAY_START + np.arange(10, 14) * 1000))
+    journal.flush()
+
+    assert os.path.getsize(ticks_path) == HEADER_SIZE + 14 * TICK_DTYPE.itemsize
+    index = np.fromfile(journal.path('/ES', day, '.idx'), dtype=INDEX_DTYPE)
+    assert index['position'].tolist() == [0, 4, 8, 12]
+    np.testing.assert_array_equal(journal.range('/ES')['time'], DAY_START + np.arange(14) * 1000)
+    assert journal.out_of_order == 0
+
+
+def test_least_recently_used_writer_is_closed_and_reopened(tmp_path):
+    journal = TickJournal(str(tmp_path), max_open_files=2)
+    journal.append('SPY', *trades([DAY_START]))
+    journal.append('QQQ', *trades([DAY_START]))
+    journal.append('SPY', *trades([DAY_START + 1000]))
+    journal.append('IWM', *trades([DAY_START]))
+
+    day = journal.day_of(DAY_START)
+    assert list(journal._writers) == [('SPY', day), ('IWM', day)]
+
+    journal.append('QQQ', *trades([DAY_START + 1000]))
+    assert list(journal._writers) == [('IWM', day), ('QQQ', day)]
+    assert journal.metrics()['open_files'] == 2
+    for symbol, count in [('SPY', 2), ('QQQ', 2), ('IWM', 1)]:
+        assert len(journal.range(symbol)) == count
+
+
+def test_appends_are_flushed_on_the_interval(tmp_path):
+    journal = TickJournal(str(tmp_path), flush_interval=3600)
+    reader = TickJournal(str(tmp_path))
+    journal.append('/ES', *trades([DAY_START]))
+    assert len(reader.range('/ES')) == 0
+
+    journal.flush_interval = 0
+    journal.append('/ES', *trades([DAY_START + 1000]))
+    assert len(reader.range('/ES')) == 2
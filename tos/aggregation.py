@@ -0,0 +1,392 @@
+import re
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+from data_models.bar_store import BarDeltas
+from data_models.bar_store import BarStore
+from data_models.bar_store import ONE_MINUTE_MS
+from data_models.bar_store import candle_arrays
+from data_models.bar_store import reduce_trades
+
+TradeArrays = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+# The time, open, high, low, close and volume fields of the streamed chart bars.
+# TD numbers CHART_FUTURES differently from CHART_EQUITY.
+CHART_BAR_FIELDS = {
+    'CHART_EQUITY': ('7', '1', '2', '3', '4', '5'),
+    'CHART_FUTURES': ('1', '2', '3', '4', '5', '6'),
+}
+
+
+def split_timesale_content(content: List[dict]) -> Dict[str, TradeArrays]:
+    """Splits the `content` list of a TIMESALE message into per-symbol trade arrays.
+
+    Entries without a trade time, price or size are skipped.
+
+    Arguments:
+    ----
+    content {List[dict]} -- The content of a TIMESALE_EQUITY or TIMESALE_FUTURES message.
+
+    Returns:
+    ----
+    Dict[str, TradeArrays] -- The trade times, prices and sizes keyed by symbol.
+    """
+    try:
+        symbols = [c['key'] for c in content]
+        times = np.array([c['1'] for c in content], dtype=np.int64)
+        prices = np.array([c['2'] for c in content], dtype=np.float64)
+        sizes = np.array([c['3'] for c in content], dtype=np.float64)
+    except KeyError:
+        content = [c for c in content if '1' in c and '2' in c and '3' in c]
+        return split_timesale_content(content) if content else {}
+
+    if not symbols:
+        return {}
+    if symbols.count(symbols[0]) == len(symbols):
+        return {symbols[0]: (times, prices, sizes)}
+
+    symbol_ids = {}
+    codes = np.array([symbol_ids.setdefault(symbol, len(symbol_ids)) for symbol in symbols], dtype=np.int64)
+    trades = {}
+    for symbol, code in symbol_ids.items():
+        mask = codes == code
+        trades[symbol] = (times[mask], prices[mask], sizes[mask])
+    return trades
+
+
+def reduce_timesale_content(content: List[dict], period_ms: int = ONE_MINUTE_MS) -> Dict[str, BarDeltas]:
+    """Reduces the `content` list of a TIMESALE message to per-symbol bar deltas.
+
+    Arguments:
+    ----
+    content {List[dict]} -- The content of a TIMESALE_EQUITY or TIMESALE_FUTURES message.
+    period_ms {int} -- The bar length in milliseconds. (default: {60000})
+
+    Returns:
+    ----
+    Dict[str, BarDeltas] -- The bar deltas keyed by symbol.
+    """
+    return {
+        symbol: reduce_trades(times, prices, sizes, period_ms)
+        for symbol, (times, prices, sizes) in split_timesale_content(content).items()
+    }
+
+
+TIMEFRAME_UNITS_MS = {'s': 1000, 'm': ONE_MINUTE_MS, 'h': 60 * ONE_MINUTE_MS}
+TIMEFRAME_PATTERN = re.compile(r'^(\d+)([smhtv])$')
+
+
+def parse_timeframe(timeframe: str) -> Tuple[str, int]:
+    """Parses a timeframe such as '30s', '5m', '1h', '500t' (ticks) or '10000v' (volume).
+
+    Returns:
+    ----
+    Tuple[str, int] -- The bar kind ('time', 'tick' or 'volume') and the period in
+        milliseconds, trades or shares/contracts.
+    """
+    match = TIMEFRAME_PATTERN.match(timeframe)
+    if match is None:
+        raise ValueError('Invalid timeframe: {}'.format(timeframe))
+
+    count, unit = int(match.group(1)), match.group(2)
+    if count <= 0:
+        raise ValueError('Invalid timeframe: {}'.format(timeframe))
+    if unit == 't':
+        return 'tick', count
+    if unit == 'v':
+        return 'volume', count
+    return 'time', count * TIMEFRAME_UNITS_MS[unit]
+
+
+class _CountBars:
+    """Bars that close after a fixed number of trades or a fixed volume."""
+
+    def __init__(self, bars: BarStore, threshold: int, by_volume: bool) -> None:
+        self.bars = bars
+        self.threshold = threshold
+        self.by_volume = by_volume
+        self.total = 0.0
+        self.last_id = -1
+
+    def add_trade(self, trade_time: int, price: float, size: float) -> None:
+        bar_id = self.total // self.threshold
+        self.total += size if self.by_volume else 1
+        if bar_id == self.last_id:
+            self.bars.update_last(price, size)
+        else:
+            self.last_id = bar_id
+            self.bars.append(trade_time, price, size)
+
+    def add_trades(self, times: np.ndarray, prices: np.ndarray, sizes: np.ndarray) -> None:
+        measure = sizes if self.by_volume else np.ones(len(sizes))
+        before = self.total + np.cumsum(measure) - measure
+        bar_ids = before // self.threshold
+        self.total = float(before[-1] + measure[-1])
+
+        starts = np.flatnonzero(np.diff(bar_ids)) + 1
+        starts = np.concatenate(([0], starts))
+        ends = np.append(starts[1:], len(bar_ids)) - 1
+        highs = np.maximum.reduceat(prices, starts)
+        lows = np.minimum.reduceat(prices, starts)
+        volumes = np.add.reduceat(sizes, starts)
+
+        first = 0
+        if bar_ids[0] == self.last_id:
+            self.bars.merge_last(highs[0], lows[0], prices[ends[0]], volumes[0])
+            first = 1
+        if first < len(starts):
+            new = starts[first:]
+            self.bars.extend(times[new], prices[new], highs[first:], lows[first:], prices[ends[first:]], volumes[first:])
+        self.last_id = bar_ids[-1]
+
+
+class MultiTimeframeAggregator:
+    """Keeps bars for several timeframes up to date from one trade stream.
+
+    Time bars are bucketed with integer math on the trade time in epoch
+    milliseconds (field '1' of the TIMESALE content), so every extra
+    timeframe costs one modulo and an in-place bar update per trade.
+
+    Arguments:
+    ----
+    timeframes {List[str]} -- The timeframes to build, see `parse_timeframe`. (default: {['1m']})
+    capacity {int} -- The number of bars kept per timeframe. (default: {4096})
+
+    Usage:
+    ----
+        >>> aggregator = MultiTimeframeAggregator(timeframes=['1m', '5m', '1h', '500t'])
+        >>> aggregator.add_trade(1640136547219, 4640.0, 1.0)
+        >>> aggregator.bars['5m'].to_data_frame(last=60)
+    """
+
+    def __init__(self, timeframes: List[str] = None, capacity: int = 4096) -> None:
+        self.bars: Dict[str, BarStore] = {}
+        self._time_bars: List[BarStore] = []
+        self._count_bars: List[_CountBars] = []
+        for timeframe in timeframes or ['1m']:
+            self.add_timeframe(timeframe, capacity)
+
+    def add_timeframe(self, timeframe: str, capacity: int = 4096) -> BarStore:
+        """Starts building bars for another timeframe from the next trade on."""
+        if timeframe in self.bars:
+            return self.bars[timeframe]
+
+        kind, period = parse_timeframe(timeframe)
+        if kind == 'time':
+            bars = BarStore(capacity=capacity, period_ms=period)
+            self._time_bars.append(bars)
+        else:
+            bars = BarStore(capacity=capacity, period_ms=0)
+            self._count_bars.append(_CountBars(bars, period, by_volume=kind == 'volume'))
+
+        self.bars[timeframe] = bars
+        return bars
+
+    def add_trade(self, trade_time: int, price: float, size: float) -> None:
+        """Adds a single trade to every timeframe."""
+        for bars in self._time_bars:
+            bars.add_trade(trade_time, price, size)
+        for bars in self._count_bars:
+            bars.add_trade(trade_time, price, size)
+
+    def add_trades(self, times: np.ndarray, prices: np.ndarray, sizes: np.ndarray) -> None:
+        """Adds a batch of trades, e.g. one symbol's trades from a TIMESALE message."""
+        if len(times) == 0:
+            return
+        for bars in self._time_bars:
+            bars.add_trades(times, prices, sizes)
+        for bars in self._count_bars:
+            bars.add_trades(times, prices, sizes)
+
+    def merge_history(self, times, opens, highs, lows, closes, volumes) -> int:
+        """Merges 1-minute history bars into the 1-minute timeframe, if there is one."""
+        added = 0
+        for bars in self._time_bars:
+            if bars.period_ms == ONE_MINUTE_MS:
+                added += bars.merge_history(times, opens, highs, lows, closes, volumes)
+        return added
+
+    def publish(self) -> None:
+        """Publishes a snapshot of every timeframe, see `BarStore.publish`."""
+        for bars in self.bars.values():
+            bars.publish()
+
+
+class BarRegistry:
+    """Routes streamed trades to per-symbol bars.
+
+    Bars are created up front for the subscribed symbols, so routing a trade
+    on the stream is a single dictionary lookup.
+
+    Arguments:
+    ----
+    symbols {List[str]} -- The symbols to create bars for. (default: {None})
+    factory {Callable} -- Builds the bars for a new symbol, anything with
+        `add_trades(times, prices, sizes)` and `publish()` methods works. (default: {BarStore})
+
+    Usage:
+    ----
+        >>> registry = BarRegistry(symbols=['SPY', 'QQQ', '/ES'])
+        >>> td_stream_session.timesale(service='TIMESALE_EQUITY', symbols=['SPY', 'QQQ'], fields=[0, 1, 2, 3, 4])
+        >>> td_stream_session.stream(registry)
+        >>> registry['SPY'].to_data_frame(last=60)
+    """
+
+    def __init__(self, symbols: List[str] = None, factory=BarStore) -> None:
+        self.factory = factory
+        self._bars = {}
+
+        # How the streamed chart bars compared with the bars built from ticks.
+        self.chart_bars = 0
+        self.chart_reconciled = 0
+        self.chart_volume_drift = 0.0
+        for symbol in symbols or []:
+            self.add(symbol)
+
+    @classmethod
+    def from_requests(cls, data_requests: dict, factory=BarStore) -> 'BarRegistry':
+        """Builds a registry for every symbol subscribed to a TIMESALE or CHART service.
+
+        Arguments:
+        ----
+        data_requests {dict} -- The `data_requests` of a `TDStreamerClient`.
+        """
+        return cls(symbols=bar_symbols(data_requests), factory=factory)
+
+    def add(self, symbol: str, bars=None):
+        """Registers bars for a symbol, creating them with the factory if not given."""
+        if bars is None:
+            bars = self._bars.get(symbol)
+            if bars is None:
+                bars = self.factory()
+        self._bars[symbol] = bars
+        return bars
+
+    def get(self, symbol: str):
+        """Returns the bars of a symbol, or None if it is not registered."""
+        return self._bars.get(symbol)
+
+    def __getitem__(self, symbol: str):
+        return self._bars[symbol]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._bars
+
+    def __len__(self) -> int:
+        return len(self._bars)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._bars)
+
+    def add_trades(self, symbol: str, times: np.ndarray, prices: np.ndarray, sizes: np.ndarray) -> int:
+        """Adds a batch of trades to a symbol's bars and publishes a new snapshot
+        of them, registering the symbol if needed.
+
+        Returns:
+        ----
+        int -- The number of bars that were appended, 0 if the bars don't say.
+        """
+        bars = self._bars.get(symbol)
+        if bars is None:
+            bars = self.add(symbol)
+        appended = bars.add_trades(times, prices, sizes)
+        bars.publish()
+        return appended or 0
+
+    def add_bar_deltas(self, symbol: str, deltas: BarDeltas) -> None:
+        """Merges bars reduced elsewhere, e.g. by a streaming shard, into a symbol's
+        bars and publishes a new snapshot of them. The bars must be `BarStore`s
+        with the same bar length the deltas were reduced with."""
+        bars = self._bars.get(symbol)
+        if bars is None:
+            bars = self.add(symbol)
+        bars.add_bars(*deltas)
+        bars.publish()
+
+    def merge_history(self, symbol: str, candles: List[dict]) -> int:
+        """Merges 1-minute price history candles into a symbol's bars.
+
+        Arguments:
+        ----
+        symbol {str} -- The symbol the candles belong to.
+        candles {List[dict]} -- The `candles` of a price history response.
+
+        Returns:
+        ----
+        int -- The number of bars that were missing.
+        """
+        bars = self._bars.get(symbol)
+        if bars is None or not candles:
+            return 0
+        added = bars.merge_history(*candle_arrays(candles))
+        bars.publish()
+        return added
+
+    def add_timesale_content(self, content: List[dict]) -> None:
+        """Routes the `content` list of a TIMESALE message to each symbol's bars."""
+        for symbol, (times, prices, sizes) in split_timesale_content(content).items():
+            self.add_trades(symbol, times, prices, sizes)
+
+    def add_chart_content(self, service: str, content: List[dict]) -> List[str]:
+        """Writes the completed 1-minute bars of a CHART_EQUITY or CHART_FUTURES
+        message into each symbol's bars and publishes them.
+
+        A bar the ticks already built is overwritten with the server's bar, the
+        difference in volume is added to `chart_volume_drift`. Bars that can't
+        take whole bars, like a `MultiTimeframeAggregator`, are skipped.
+
+        Returns:
+        ----
+        Dict[str, int] -- The number of bars appended to the end of each symbol's
+        bars, keyed by the symbols whose bars were updated.
+        """
+        time_field, open_field, high_field, low_field, close_field, volume_field = CHART_BAR_FIELDS[service]
+        updated = {}
+        for bar in content:
+            symbol = bar['key']
+            bars = self._bars.get(symbol)
+            if bars is None:
+                bars = self.add(symbol)
+            set_bar = getattr(bars, 'set_bar', None)
+            if set_bar is None or time_field not in bar:
+                continue
+            replaced = set_bar(
+                bar[time_field],
+                bar[open_field],
+                bar[high_field],
+                bar[low_field],
+                bar[close_field],
+                bar[volume_field],
+            )
+            self.chart_bars += 1
+            appended = updated.get(symbol, 0)
+            if replaced is not None:
+                self.chart_reconciled += 1
+                self.chart_volume_drift += bar[volume_field] - replaced
+            elif bars.last_time == bar[time_field]:
+                appended += 1
+            bars.publish()
+            updated[symbol] = appended
+        return updated
+
+
+def bar_symbols(data_requests: dict) -> List[str]:
+    """Lists the symbols subscribed to services bars are built from, TIMESALE
+    and the 1-minute CHART services, in a streamer request."""
+    symbols = []
+    for request in data_requests['requests']:
+        service = request['service']
+        if not (service.startswith('TIMESALE') or service in CHART_BAR_FIELDS):
+            continue
+        if request['parameters'].get('keys'):
+            for symbol in request['parameters']['keys'].split(','):
+                if symbol not in symbols:
+                    symbols.append(symbol)
+    return symbols
+
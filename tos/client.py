@@ -37,6 +37,7 @@ from td.exceptions import NotFndError
 from td.exceptions import ServerError
 from td.exceptions import GeneralError
 from tos.helper import convert_price_history_to_data_frame
+from tos.helper import convert_price_history_to_bar_store
 from tos.helper import datetime_to_tos_timestamp
 
 class TDClient():
@@ -774,17 +775,23 @@ class TDClient():
         # return the response of the get request.
         return self._make_request(method='get', endpoint=endpoint, params=params)
 
-    def get_price_history_for_day_trading(self, symbol: str) -> Dict:
+    def _get_price_history_for_day_trading(self, symbol: str) -> Dict:
+        """The 1-minute price history of the last 3 days, as returned by `get_price_history`."""
         end_time = datetime.datetime.now()
         start_time = end_time - timedelta(days=3)
-        response_json = self.get_price_history(
+        return self.get_price_history(
             symbol=symbol, 
             start_date= datetime_to_tos_timestamp(start_time),
             end_date=datetime_to_tos_timestamp(end_time),
             frequency_type='minute',
             frequency=1,
         )
-        return convert_price_history_to_data_frame(response_json)
+
+    def get_price_history_for_day_trading(self, symbol: str) -> Dict:
+        return convert_price_history_to_data_frame(self._get_price_history_for_day_trading(symbol))
+
+    def get_bars_for_day_trading(self, symbol: str):
+        return convert_price_history_to_bar_store(self._get_price_history_for_day_trading(symbol))
 
     def search_instruments(self, symbol: str, projection: str = None) -> Dict:
         """ Search or retrieve instrument data, including fundamental data.
@@ -1941,6 +1948,7 @@ class TDClient():
             websocket_url=socket_url,
             user_principal_data=userPrincipalsResponse,
             credentials=credentials,
+            price_history=self.get_price_history,
         )
 
         return streaming_session
\ No newline at end of file
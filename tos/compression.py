@@ -0,0 +1,103 @@
+import gzip
+import os
+import shutil
+
+from typing import List
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# The file suffix each codec adds.
+CODEC_SUFFIXES = {
+    'zstd': '.zst',
+    'lz4': '.lz4',
+    'gzip': '.gz',
+}
+
+COPY_CHUNK = 1 << 20
+
+
+def available_codecs() -> List[str]:
+    """Lists the codecs that can be used in this environment, best first."""
+    codecs = []
+    if zstandard is not None:
+        codecs.append('zstd')
+    if lz4 is not None:
+        codecs.append('lz4')
+    codecs.append('gzip')
+    return codecs
+
+
+def codec_of(file_path: str) -> str:
+    """The codec a file was compressed with, None if it isn't compressed."""
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if file_path.endswith(suffix):
+            return codec
+    return None
+
+
+def strip_codec_suffix(file_path: str) -> str:
+    codec = codec_of(file_path)
+    return file_path[:-len(CODEC_SUFFIXES[codec])] if codec else file_path
+
+
+def _open(file_path: str, codec: str, mode: str):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ImportError('The zstd codec requires `pip install zstandard`.')
+        if mode == 'rb':
+            return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+        return zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(open(file_path, 'wb'), closefd=True)
+    if codec == 'lz4':
+        if lz4 is None:
+            raise ImportError('The lz4 codec requires `pip install lz4`.')
+        return lz4.frame.open(file_path, mode)
+    if codec == 'gzip':
+        # Level 1 is several times faster than the default and still shrinks
+        # the repetitive columns of a recording most of the way.
+        return gzip.open(file_path, mode, compresslevel=1) if mode == 'wb' else gzip.open(file_path, mode)
+    raise ValueError('Invalid codec: {}, must be one of {}'.format(codec, list(CODEC_SUFFIXES)))
+
+
+def compress_file(file_path: str, codec: str = None, remove: bool = True) -> str:
+    """Compresses a file next to itself, streaming so memory stays flat.
+
+    The compressed file is written under a temporary name and renamed when
+    complete, so a reader never sees half of it.
+
+    Arguments:
+    ----
+    file_path {str} -- The file to compress.
+    codec {str} -- One of 'zstd', 'lz4' or 'gzip', the best available if None. (default: {None})
+    remove {bool} -- Delete the original once compressed. (default: {True})
+
+    Returns:
+    ----
+    str -- The path of the compressed file.
+    """
+    codec = codec or available_codecs()[0]
+    compressed_path = file_path + CODEC_SUFFIXES[codec]
+    partial_path = compressed_path + '.partial'
+    with open(file_path, 'rb') as source, _open(partial_path, codec, 'wb') as target:
+        shutil.copyfileobj(source, target, COPY_CHUNK)
+    os.replace(partial_path, compressed_path)
+    if remove:
+        os.remove(file_path)
+    return compressed_path
+
+
+def read_file(file_path: str) -> bytes:
+    """Reads a file, decompressing it if its suffix names a codec."""
+    codec = codec_of(file_path)
+    if codec is None:
+        with open(file_path, 'rb') as source:
+            return source.read()
+    with _open(file_path, codec, 'rb') as source:
+        return source.read()
@@ -0,0 +1,92 @@
+import json
+
+from typing import Callable
+from typing import Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# TD sometimes sends a U+FFFD replacement character where a value should be,
+# which leaves the message as invalid JSON. It gets swapped for "None".
+REPLACEMENT_CHARACTER = '\ufffd'
+REPLACEMENT_VALUE = '"None"'
+
+Decoder = Callable[[Union[str, bytes]], dict]
+
+# What the backends raise on invalid JSON, UnicodeDecodeError is a ValueError.
+DECODE_ERRORS = (ValueError,) if msgspec is None else (ValueError, msgspec.DecodeError)
+
+
+def available_backends() -> list:
+    """Lists the JSON backends that can be used in this environment, fastest first."""
+    backends = []
+    if orjson is not None:
+        backends.append('orjson')
+    if msgspec is not None:
+        backends.append('msgspec')
+    backends.append('json')
+    return backends
+
+
+def _backend_loads(backend: str) -> Callable:
+    if backend == 'orjson':
+        if orjson is None:
+            raise ImportError('The orjson backend requires `pip install orjson`.')
+        return orjson.loads
+    if backend == 'msgspec':
+        if msgspec is None:
+            raise ImportError('The msgspec backend requires `pip install msgspec`.')
+        return msgspec.json.Decoder().decode
+    if backend == 'json':
+        return json.loads
+    raise ValueError('Unknown JSON backend: {}'.format(backend))
+
+
+def get_decoder(backend: str = 'auto') -> Decoder:
+    """Builds a synchronous decoder for streamer messages.
+
+    Messages are parsed as they are first, so a replacement character inside a
+    string value stays part of the string. Only a message that fails to parse is
+    retried with the replacement characters swapped out, the way TD's broken
+    values are handled. Binary frames that are not valid UTF-8 are decoded with
+    replacement characters and go through the same retry.
+
+    Arguments:
+    ----
+    backend {str} -- One of 'auto', 'orjson', 'msgspec' or 'json'. 'auto' picks
+        the fastest one that is installed. (default: {'auto'})
+
+    Returns:
+    ----
+    Decoder -- A function taking the raw message and returning a python dictionary.
+    """
+
+    if backend == 'auto':
+        backend = available_backends()[0]
+
+    loads = _backend_loads(backend)
+
+    def decode(message: Union[str, bytes]) -> dict:
+        try:
+            return loads(message)
+        except DECODE_ERRORS:
+            if isinstance(message, bytes):
+                # orjson and msgspec report bad UTF-8 as a plain decode error.
+                message = message.decode('utf-8', errors='replace')
+                try:
+                    return loads(message)
+                except DECODE_ERRORS:
+                    pass
+            if REPLACEMENT_CHARACTER not in message:
+                raise
+            return loads(message.replace(REPLACEMENT_CHARACTER, REPLACEMENT_VALUE))
+
+    decode.backend = backend
+    return decode
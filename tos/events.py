@@ -0,0 +1,214 @@
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+
+import numpy as np
+
+QUOTE_SERVICES = [
+    'QUOTE',
+    'OPTION',
+    'LEVELONE_FUTURES',
+    'LEVELONE_FOREX',
+    'LEVELONE_FUTURES_OPTIONS',
+]
+
+BOOK_SERVICES = [
+    'NASDAQ_BOOK',
+    'LISTED_BOOK',
+    'OPTIONS_BOOK',
+    'FUTURES_BOOK',
+    'FOREX_BOOK',
+    'FUTURES_OPTIONS_BOOK',
+]
+
+# The events and the arguments their handlers are called with.
+#   tick:       (symbol, times, prices, sizes), the trades of one message as arrays
+#   quote:      (symbol, fields), the quote fields of one message keyed by field id
+#   bar_update: (symbol, bars), after the bars were updated and published
+#   bar_close:  (symbol, bars, closed), when `closed` bars before the newest one completed
+#   book:       (symbol, book), the book content of one message
+EVENT_TYPES = ['tick', 'quote', 'bar_update', 'bar_close', 'book']
+
+RouteKey = Tuple[str, str, str]
+
+
+class TickBatch(NamedTuple):
+    """The trades of a symbol from one message, or several when coalesced."""
+    symbol: str
+    times: np.ndarray
+    prices: np.ndarray
+    sizes: np.ndarray
+
+    @property
+    def count(self) -> int:
+        return len(self.times)
+
+    def merge(self, newer: 'TickBatch') -> 'TickBatch':
+        return TickBatch(
+            self.symbol,
+            np.concatenate((self.times, newer.times)),
+            np.concatenate((self.prices, newer.prices)),
+            np.concatenate((self.sizes, newer.sizes)),
+        )
+
+
+class QuoteUpdate(NamedTuple):
+    """The changed fields of a quote, keyed by field id."""
+    symbol: str
+    fields: dict
+
+    def merge(self, newer: 'QuoteUpdate') -> 'QuoteUpdate':
+        fields = dict(self.fields)
+        fields.update(newer.fields)
+        return QuoteUpdate(self.symbol, fields)
+
+
+def update_key(update) -> str:
+    """What `TickBatch`es and `QuoteUpdate`s are coalesced by."""
+    return update.symbol
+
+
+class EventBus():
+
+    """Calls strategy handlers as streamed data is dispatched.
+
+    Handlers are registered for an event and optionally a symbol and a service,
+    leaving either out matches all of them. The handlers of each (event, service,
+    symbol) are resolved once and cached as a tuple, so dispatching is a dictionary
+    lookup and plain calls with the arrays and dictionaries the stream already has,
+    no event objects are built. A handler that raises is counted in `errors` and
+    doesn't stop the stream or the other handlers.
+
+    Usage:
+    ----
+        >>> @td_stream_session.events.on_tick(symbol='SPY')
+        ... def on_spy_trades(symbol, times, prices, sizes):
+        ...     print(symbol, prices[-1])
+        >>> td_stream_session.events.on_bar_close(lambda symbol, bars, closed: print(bars.to_data_frame(last=2)))
+    """
+
+    def __init__(self) -> None:
+        self._handlers: Dict[RouteKey, List[Callable]] = {}
+        self._routes: Dict[RouteKey, Tuple[Callable, ...]] = {}
+        self._counts: Dict[str, int] = {event: 0 for event in EVENT_TYPES}
+        self.errors = 0
+        self.last_error: Exception = None
+
+    def subscribe(self, event: str, handler: Callable, symbol: str = None, service: str = None) -> Callable:
+        """Registers a handler.
+
+        Arguments:
+        ----
+        event {str} -- One of 'tick', 'quote', 'bar_update', 'bar_close' or 'book'.
+        handler {Callable} -- Called with the arguments of the event, see `EVENT_TYPES`.
+        symbol {str} -- Only call it for this symbol. (default: {None})
+        service {str} -- Only call it for this service, e.g. 'TIMESALE_FUTURES'. (default: {None})
+
+        Returns:
+        ----
+        Callable -- The handler, so this can be used as a decorator.
+        """
+        if event not in EVENT_TYPES:
+            raise ValueError('Invalid event: {}, must be one of {}'.format(event, EVENT_TYPES))
+        self._handlers.setdefault((event, service, symbol), []).append(handler)
+        self._counts[event] += 1
+        self._routes = {}
+        return handler
+
+    def unsubscribe(self, event: str, handler: Callable, symbol: str = None, service: str = None) -> None:
+        """Removes a handler registered with the same event, symbol and service."""
+        handlers = self._handlers.get((event, service, symbol))
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+            self._counts[event] -= 1
+            self._routes = {}
+
+    def _register(self, event: str, handler: Callable, symbol: str, service: str) -> Callable:
+        if handler is None:
+            return lambda handler: self.subscribe(event, handler, symbol, service)
+        return self.subscribe(event, handler, symbol, service)
+
+    def on_tick(self, handler: Callable = None, symbol: str = None, service: str = None) -> Callable:
+        return self._register('tick', handler, symbol, service)
+
+    def on_quote(self, handler: Callable = None, symbol: str = None, service: str = None) -> Callable:
+        return self._register('quote', handler, symbol, service)
+
+    def on_bar_update(self, handler: Callable = None, symbol: str = None, service: str = None) -> Callable:
+        return self._register('bar_update', handler, symbol, service)
+
+    def on_bar_close(self, handler: Callable = None, symbol: str = None, service: str = None) -> Callable:
+        return self._register('bar_close', handler, symbol, service)
+
+    def on_book(self, handler: Callable = None, symbol: str = None, service: str = None) -> Callable:
+        return self._register('book', handler, symbol, service)
+
+    def has_handlers(self, event: str) -> bool:
+        return self._counts[event] > 0
+
+    def handlers(self, event: str, service: str, symbol: str) -> Tuple[Callable, ...]:
+        """The handlers to call for an event, most specific registrations first."""
+        key = (event, service, symbol)
+        route = self._routes.get(key)
+        if route is None:
+            route = []
+            for match in ((event, service, symbol), (event, None, symbol), (event, service, None), (event, None, None)):
+                for handler in self._handlers.get(match, ()):
+                    if handler not in route:
+                        route.append(handler)
+            route = self._routes[key] = tuple(route)
+        return route
+
+    def emit(self, event: str, service: str, symbol: str, *args) -> None:
+        """Calls the handlers of an event with the symbol and `args`."""
+        for handler in self.handlers(event, service, symbol):
+            try:
+                handler(symbol, *args)
+            except Exception as e:
+                self._failed(e)
+
+    def _failed(self, error: Exception) -> None:
+        self.errors += 1
+        self.last_error = error
+
+    def dispatch_trades(self, service: str, symbol: str, times, prices, sizes, bars, appended: int,
+                        ticks: bool = True) -> None:
+        """Emits the events of one message's trades for a symbol, after they were
+        added to `bars` and `appended` new bars were started. Streamed chart bars
+        pass `ticks=False` and only emit 'bar_update'."""
+        counts = self._counts
+        if counts['tick'] and ticks:
+            for handler in self.handlers('tick', service, symbol):
+                try:
+                    handler(symbol, times, prices, sizes)
+                except Exception as e:
+                    self._failed(e)
+        if counts['bar_close'] and appended:
+            # The first bar of an empty store doesn't close anything.
+            closed = appended if len(bars) > appended else appended - 1
+            if closed:
+                for handler in self.handlers('bar_close', service, symbol):
+                    try:
+                        handler(symbol, bars, closed)
+                    except Exception as e:
+                        self._failed(e)
+        if counts['bar_update']:
+            for handler in self.handlers('bar_update', service, symbol):
+                try:
+                    handler(symbol, bars)
+                except Exception as e:
+                    self._failed(e)
+
+    def dispatch_content(self, event: str, service: str, content: List[dict]) -> None:
+        """Emits a 'quote' or 'book' event for each entry of a message's content."""
+        if not self._counts[event]:
+            return
+        for fields in content:
+            symbol = fields.get('key')
+            for handler in self.handlers(event, service, symbol):
+                try:
+                    handler(symbol, fields)
+                except Exception as e:
+                    self._failed(e)
@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 import json
 import pandas as pd
 from helpers.datetime_helper import round_to_one_minute
+from data_models.bar_store import BarStore
 from data_models.streaming_timesales_content import StreamingTimeSaleContent
 
 def datetime_to_tos_timestamp(dt: datetime) -> int:
@@ -35,6 +36,12 @@ def convert_price_history_to_data_frame(json_data):
     #df['vwap'] = (((df['High'] + df['Low'])/2)*df['Volume']).cumsum() / df['Volume'].cumsum()
     return df
 
+def convert_price_history_to_bar_store(json_data, capacity: int = 4096) -> BarStore:
+    if 'candles' not in json_data:
+        print(json_data)
+
+    return BarStore.from_candles(json_data['candles'], capacity=capacity)
+
 def generate_sample_price_history():
     json_data = {'candles': []}
     current_minute = datetime.now()
@@ -0,0 +1,202 @@
+import json
+import time
+
+from typing import Dict
+from typing import List
+
+# The stages a streamed trade goes through, in order.
+LATENCY_STAGES = (
+    'exchange_to_server',
+    'server_to_recv',
+    'recv_to_parsed',
+    'parsed_to_bar',
+    'bar_to_render',
+)
+
+# Each power of two is split into this many buckets, which keeps every
+# bucket within about 6% of the values in it.
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+LINEAR_BUCKETS = 2 * SUB_BUCKETS
+OCTAVES = 40
+
+
+def bucket_index(value: int) -> int:
+    """The histogram bucket of a non-negative integer value."""
+    if value < LINEAR_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS * (shift + 1) + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_bounds(index: int) -> tuple:
+    """The lowest value of a bucket and the lowest value of the next one."""
+    if index < LINEAR_BUCKETS:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    low = (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+    return low, low + (1 << shift)
+
+
+class LatencyHistogram():
+
+    """A log-linear histogram of latencies in microseconds.
+
+    Recording is a bucket lookup and a list increment, so it can sit on the hot
+    path. Percentiles are reported as the upper bound of their bucket.
+    """
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (SUB_BUCKETS * (OCTAVES + 1))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.negative = 0
+
+    def record(self, value_us: int) -> None:
+        """Records a latency. Negative values, e.g. from clock skew between us and
+        the server, are counted as zero and tallied in `negative`."""
+        value_us = int(value_us)
+        if value_us < 0:
+            self.negative += 1
+            value_us = 0
+        index = bucket_index(value_us)
+        if index >= len(self.counts):
+            index = len(self.counts) - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value_us
+        if self.max is None or value_us > self.max:
+            self.max = value_us
+        if self.min is None or value_us < self.min:
+            self.min = value_us
+
+    def percentile(self, percentile: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_bounds(index)[1] - 1, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_us': round(self.mean, 1),
+            'min_us': self.min or 0,
+            'p50_us': self.percentile(50),
+            'p90_us': self.percentile(90),
+            'p99_us': self.percentile(99),
+            'p999_us': self.percentile(99.9),
+            'max_us': self.max or 0,
+            'negative': self.negative,
+        }
+
+    def buckets(self) -> List[tuple]:
+        """The non-empty buckets as (low us, high us, count)."""
+        return [bucket_bounds(index) + (count,) for index, count in enumerate(self.counts) if count]
+
+
+class LatencyRecorder():
+
+    """Per-stage latency histograms for the streaming pipeline.
+
+    The stages are:
+
+    - exchange_to_server: the service timestamp minus the trade time in field '1',
+      for the oldest trade of each TIMESALE message.
+    - server_to_recv: our wall clock when the message was read minus the service
+      timestamp. This includes any clock offset between us and TD.
+    - recv_to_parsed: from reading the message off the socket, including any time
+      spent in the message queue, to having it decoded.
+    - parsed_to_bar: dispatching the decoded message, i.e. updating the bars.
+    - bar_to_render: from a bar snapshot being published to a chart having drawn it.
+
+    Stages inside the process are timed with `time.perf_counter_ns`. One sample
+    is taken per message, not per trade.
+
+    Usage:
+    ----
+        >>> latency = LatencyRecorder()
+        >>> td_stream_session.latency = latency
+        >>> latency.metrics()['parsed_to_bar']['p99_us']
+    """
+
+    def __init__(self, stages: tuple = LATENCY_STAGES) -> None:
+        self.histograms: Dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in stages}
+
+        # Converts perf_counter_ns readings to epoch nanoseconds.
+        self.wall_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def record(self, stage: str, value_us: int) -> None:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        histogram.record(value_us)
+
+    def record_since(self, stage: str, start_ns: int, end_ns: int = None) -> None:
+        """Records the time since a `time.perf_counter_ns` reading."""
+        if end_ns is None:
+            end_ns = time.perf_counter_ns()
+        self.record(stage, (end_ns - start_ns) // 1000)
+
+    def record_message(self, message_decoded: dict, received_ns: int, parsed_ns: int, handled_ns: int) -> None:
+        """Records the stages of one streamed message.
+
+        Arguments:
+        ----
+        message_decoded {dict} -- The decoded message.
+        received_ns {int} -- The `time.perf_counter_ns` reading when it was read off the socket.
+        parsed_ns {int} -- The reading once it was decoded.
+        handled_ns {int} -- The reading once it was dispatched.
+        """
+        histograms = self.histograms
+        histograms['recv_to_parsed'].record((parsed_ns - received_ns) // 1000)
+        histograms['parsed_to_bar'].record((handled_ns - parsed_ns) // 1000)
+
+        if 'data' not in message_decoded:
+            return
+        received_us = (received_ns + self.wall_offset_ns) // 1000
+        for data in message_decoded['data']:
+            timestamp = data.get('timestamp')
+            if timestamp is None:
+                continue
+            histograms['server_to_recv'].record(received_us - timestamp * 1000)
+            if data['service'].startswith('TIMESALE') and data['content']:
+                trade_time = data['content'][0].get('1')
+                if trade_time is not None:
+                    histograms['exchange_to_server'].record((timestamp - trade_time) * 1000)
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        return self.histograms[stage]
+
+    def metrics(self) -> dict:
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def reset(self) -> None:
+        for stage in self.histograms:
+            self.histograms[stage] = LatencyHistogram()
+
+    def report(self) -> str:
+        """Formats the stage summaries as a table."""
+        lines = ['{:<20}{:>10}{:>10}{:>10}{:>10}{:>10}{:>12}'.format('stage', 'count', 'p50 us', 'p90 us', 'p99 us', 'p99.9 us', 'max us')]
+        for stage, summary in self.metrics().items():
+            lines.append('{:<20}{count:>10}{p50_us:>10}{p90_us:>10}{p99_us:>10}{p999_us:>10}{max_us:>12}'.format(stage, **summary))
+        return '\n'.join(lines)
+
+    def dump(self, file_path: str) -> None:
+        """Writes the summaries and the non-empty buckets of every stage as JSON."""
+        dump = {
+            stage: dict(histogram.summary(), buckets=histogram.buckets())
+            for stage, histogram in self.histograms.items()
+        }
+        with open(file_path, 'w', encoding='utf-8') as latency_file:
+            json.dump(dump, latency_file, indent=2)
@@ -0,0 +1,259 @@
+import asyncio
+import collections
+import time
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+OVERFLOW_POLICIES = ['block', 'drop-oldest', 'coalesce']
+
+# Trades and bars can't be merged without losing them, so they are appended.
+APPEND_SERVICE_PREFIXES = ('TIMESALE', 'CHART')
+
+
+class StreamMessageQueue():
+
+    """A bounded queue between the socket reader and the message processors.
+
+    Arguments:
+    ----
+    maxsize {int} -- The number of messages that can wait to be processed. (default: {1000})
+    policy {str} -- What to do when the queue is full. 'block' stops reading the socket
+        until there is room, 'drop-oldest' discards the oldest waiting message and
+        'coalesce' folds new messages into one pending message per service and symbol:
+        quote and book fields keep their latest value and trades are appended, so no
+        trade is lost. (default: {'block'})
+    decoder {Callable} -- Decodes raw messages, only needed by the 'coalesce' policy. (default: {None})
+    """
+
+    def __init__(self, maxsize: int = 1000, policy: str = 'block', decoder: Callable = None) -> None:
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError('Invalid overflow policy: {}, must be one of {}'.format(policy, OVERFLOW_POLICIES))
+        if policy == 'coalesce' and decoder is None:
+            raise ValueError('The coalesce policy needs a decoder.')
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.decoder = decoder
+
+        self._queue = collections.deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._empty = asyncio.Event()
+
+        # Pending coalesced content, keyed by (service, symbol) in arrival order.
+        self._pending: Dict[Tuple[str, str], Union[dict, List[dict]]] = {}
+        self._pending_timestamps: Dict[str, int] = {}
+        self._pending_received_ns = None
+
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        """The number of messages waiting, a pending coalesced message counts as one."""
+        return len(self._queue) + (1 if self._pending else 0)
+
+    def metrics(self) -> dict:
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'dequeued': self.dequeued,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'blocked': self.blocked,
+            'blocked_seconds': self.blocked_seconds,
+        }
+
+    async def put(self, message: Union[str, bytes, dict], received_ns: int = None) -> None:
+        """Queues a raw or decoded message, applying the overflow policy if full.
+        `received_ns` is the `time.perf_counter_ns` reading when it was read."""
+
+        if self._pending:
+            # Keep the order, everything after the first coalesced message is coalesced too.
+            self._coalesce(message, received_ns)
+            return
+
+        if len(self._queue) >= self.maxsize:
+            if self.policy == 'block':
+                self.blocked += 1
+                started = time.perf_counter()
+                while len(self._queue) >= self.maxsize:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+                self.blocked_seconds += time.perf_counter() - started
+            elif self.policy == 'drop-oldest':
+                self._queue.popleft()
+                self.dropped += 1
+            else:
+                self._coalesce(message, received_ns)
+                return
+
+        self._queue.append((received_ns, message))
+        self.enqueued += 1
+        if len(self._queue) > self.max_depth:
+            self.max_depth = len(self._queue)
+        self._not_empty.set()
+
+    async def get(self) -> Tuple[Union[str, bytes, dict], int]:
+        """Waits for the next message. Coalesced messages come back decoded.
+
+        Returns:
+        ----
+        Tuple[Union[str, bytes, dict], int] -- The message and when it was read, see `put`.
+        """
+
+        while not self._queue and not self._pending:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        if self._queue:
+            received_ns, message = self._queue.popleft()
+        else:
+            received_ns = self._pending_received_ns
+            message = self._flush_pending()
+        self.dequeued += 1
+        self._not_full.set()
+        if not self.depth:
+            self._empty.set()
+        return message, received_ns
+
+    async def drained(self) -> None:
+        """Waits until every waiting message has been taken by `get`."""
+
+        while self.depth:
+            self._empty.clear()
+            await self._empty.wait()
+
+    def _coalesce(self, message: Union[str, bytes, dict], received_ns: int = None) -> None:
+        if not isinstance(message, dict):
+            message = self.decoder(message)
+
+        if 'data' not in message:
+            # Responses and notifications are small and rare, don't hold them back.
+            self._queue.append((received_ns, message))
+            self.enqueued += 1
+            self._not_empty.set()
+            return
+
+        if not self._pending:
+            self._pending_received_ns = received_ns
+        for data in message['data']:
+            service = data['service']
+            self._pending_timestamps[service] = data.get('timestamp')
+            append = service.startswith(APPEND_SERVICE_PREFIXES)
+            for content in data['content']:
+                key = (service, content.get('key'))
+                if append:
+                    self._pending.setdefault(key, []).append(content)
+                elif key in self._pending:
+                    self._pending[key].update(content)
+                else:
+                    self._pending[key] = dict(content)
+        self.coalesced += 1
+        self._not_empty.set()
+
+    def _flush_pending(self) -> dict:
+        sections = {}
+        for (service, _), content in self._pending.items():
+            section = sections.get(service)
+            if section is None:
+                section = sections[service] = {
+                    'service': service,
+                    'timestamp': self._pending_timestamps.get(service),
+                    'command': 'SUBS',
+                    'content': [],
+                }
+            if isinstance(content, list):
+                section['content'].extend(content)
+            else:
+                section['content'].append(content)
+
+        self._pending = {}
+        self._pending_timestamps = {}
+        self._pending_received_ns = None
+        return {'data': list(sections.values())}
+
+
+BUFFER_POLICIES = ['drop-oldest', 'coalesce']
+
+
+class BatchBuffer():
+
+    """A bounded buffer between synchronous event handlers and an async consumer.
+
+    Handlers can't wait for room, so a full buffer either drops its oldest item
+    or merges the new item into the newest waiting item with the same key. The
+    coalescing buffer holds at most `maxsize` items plus one per key.
+
+    Arguments:
+    ----
+    maxsize {int} -- The number of items that can wait. (default: {256})
+    policy {str} -- 'drop-oldest' or 'coalesce'. (default: {'coalesce'})
+    key {Callable} -- The key items are coalesced by. (default: {None})
+    merge {Callable} -- Merges two items with the same key, older one first. (default: {None})
+    """
+
+    def __init__(self, maxsize: int = 256, policy: str = 'coalesce', key: Callable = None, merge: Callable = None) -> None:
+        if policy not in BUFFER_POLICIES:
+            raise ValueError('Invalid buffer policy: {}, must be one of {}'.format(policy, BUFFER_POLICIES))
+        if policy == 'coalesce' and (key is None or merge is None):
+            raise ValueError('The coalesce policy needs a key and a merge function.')
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key = key
+        self.merge = merge
+
+        self._items = collections.deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+
+        self.put_count = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item) -> None:
+        if self.closed:
+            return
+        self.put_count += 1
+        items = self._items
+        if len(items) >= self.maxsize:
+            if self.policy == 'drop-oldest':
+                items.popleft()
+                self.dropped += 1
+            else:
+                key = self.key(item)
+                for index in range(len(items) - 1, -1, -1):
+                    if self.key(items[index]) == key:
+                        items[index] = self.merge(items[index], item)
+                        self.coalesced += 1
+                        return
+        items.append(item)
+        self._ready.set()
+
+    async def get(self):
+        """Waits for the next item, returns None once the buffer is closed and empty."""
+        while not self._items:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popleft()
+
+    def close(self) -> None:
+        """Ends the consumer once the waiting items are taken."""
+        self.closed = True
+        self._ready.set()
@@ -0,0 +1,373 @@
+"""A local stand-in for the TD streamer, for load testing.
+
+It speaks enough of the streamer protocol for `TDStreamerClient` to connect:
+the ADMIN LOGIN handshake, SUBS/ADD/UNSUBS by key, QOS, heartbeats and
+TIMESALE, QUOTE/LEVELONE_FUTURES and BOOK data frames at a configurable rate
+with optional bursts.
+
+Run from the repository root:
+
+    python -m tos.mock_server --port 8765 --rate 50 --ticks 5 --burst-every 10 --burst-seconds 2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from typing import Dict
+from typing import List
+from typing import Set
+
+import websockets
+
+from tos.stream import TDStreamerClient
+
+TIMESALE_SERVICES = ['TIMESALE_EQUITY', 'TIMESALE_FUTURES', 'TIMESALE_OPTIONS', 'TIMESALE_FOREX']
+QUOTE_SERVICES = ['QUOTE', 'LEVELONE_FUTURES']
+BOOK_SERVICES = ['NASDAQ_BOOK', 'LISTED_BOOK', 'OPTIONS_BOOK']
+BOOK_MPIDS = ['NSDQ', 'ARCX', 'BATS', 'EDGX', 'IEXG', 'MEMX']
+
+MOCK_ACCOUNT_ID = '000000000'
+MOCK_APP_ID = 'mock'
+MOCK_TOKEN = 'mock-token'
+
+
+def mock_user_principals() -> dict:
+    """User principals with just enough in them to build a `TDStreamerClient`."""
+    return {
+        'accounts': [{'accountId': MOCK_ACCOUNT_ID}],
+        'streamerInfo': {'appId': MOCK_APP_ID, 'token': MOCK_TOKEN},
+    }
+
+
+def mock_streaming_session(url: str = 'ws://localhost:8765', **kwargs) -> TDStreamerClient:
+    """Builds a streaming client pointed at a local `MockStreamerServer`."""
+    credentials = {'userid': MOCK_ACCOUNT_ID, 'token': MOCK_TOKEN}
+    return TDStreamerClient(websocket_url=url, user_principal_data=mock_user_principals(), credentials=credentials, **kwargs)
+
+
+def _timestamp() -> int:
+    return time.time_ns() // 1000000
+
+
+class _SymbolState():
+
+    """The random walk behind the data of one symbol."""
+
+    def __init__(self, symbol: str, rng: random.Random) -> None:
+        self.symbol = symbol
+        self.tick_size = 0.25 if symbol.startswith('/') else 0.01
+        self.price = round(rng.uniform(20, 500) / self.tick_size) * self.tick_size
+        self.sequence = rng.randint(1, 1000000)
+        self.volume = 0
+
+
+class _Session():
+
+    """The subscriptions of one client connection."""
+
+    def __init__(self) -> None:
+        self.logged_in = False
+        self.subscriptions: Dict[str, Set[str]] = {}
+        self.seq: Dict[str, int] = {}
+        self.qos_seconds = 0.0
+
+
+class MockStreamerServer():
+
+    """Emulates the TD streamer websocket for local load testing.
+
+    Arguments:
+    ----
+    host {str} -- The interface to listen on. (default: {'localhost'})
+    port {int} -- The port to listen on, 0 picks a free one. (default: {8765})
+    message_rate {float} -- Data messages sent per second while nothing is bursting. (default: {10.0})
+    ticks_per_message {int} -- Trades per symbol in each TIMESALE section. (default: {5})
+    symbols_per_message {int} -- How many of the subscribed symbols appear in each message,
+        rotating through them. All of them if not set. (default: {None})
+    burst_every {float} -- Seconds between bursts, no bursts if not set. (default: {None})
+    burst_seconds {float} -- How long a burst lasts. (default: {1.0})
+    burst_multiplier {float} -- How much faster messages are sent during a burst. (default: {10.0})
+    reject_login {bool} -- Answer every LOGIN with code 3, to test error handling. (default: {False})
+    heartbeat_seconds {float} -- Seconds between heartbeat notifications. (default: {10.0})
+    seed {int} -- Seeds the random walks so runs are repeatable. (default: {None})
+
+    Usage:
+    ----
+        >>> server = MockStreamerServer(port=8765, message_rate=100)
+        >>> asyncio.get_event_loop().run_until_complete(server.start())
+        >>> td_stream_session = mock_streaming_session(server.url)
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 8765, message_rate: float = 10.0,
+                 ticks_per_message: int = 5, symbols_per_message: int = None, burst_every: float = None,
+                 burst_seconds: float = 1.0, burst_multiplier: float = 10.0, reject_login: bool = False,
+                 heartbeat_seconds: float = 10.0, seed: int = None) -> None:
+        self.host = host
+        self.port = port
+        self.message_rate = message_rate
+        self.ticks_per_message = ticks_per_message
+        self.symbols_per_message = symbols_per_message
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self.burst_multiplier = burst_multiplier
+        self.reject_login = reject_login
+        self.heartbeat_seconds = heartbeat_seconds
+
+        self.messages_sent = 0
+        self.ticks_sent = 0
+        self.bytes_sent = 0
+        self.connections = 0
+
+        self._rng = random.Random(seed)
+        self._symbols: Dict[str, _SymbolState] = {}
+        self._server = None
+        self._started = None
+
+    @property
+    def url(self) -> str:
+        return 'ws://{}:{}'.format(self.host, self.port)
+
+    async def start(self) -> None:
+        """Starts listening, returns once the server is accepting connections."""
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started = time.perf_counter()
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    def current_rate(self) -> float:
+        """The message rate right now, taking bursts into account."""
+        if not self.burst_every:
+            return self.message_rate
+        elapsed = (time.perf_counter() - self._started) % self.burst_every
+        if elapsed < self.burst_seconds:
+            return self.message_rate * self.burst_multiplier
+        return self.message_rate
+
+    def _symbol(self, symbol: str) -> _SymbolState:
+        state = self._symbols.get(symbol)
+        if state is None:
+            state = self._symbols[symbol] = _SymbolState(symbol, self._rng)
+        return state
+
+    async def _handler(self, websocket, path: str = None) -> None:
+        self.connections += 1
+        session = _Session()
+        producer = asyncio.ensure_future(self._produce(websocket, session))
+        try:
+            async for message in websocket:
+                if message == 'ping':
+                    continue
+                for request in json.loads(message).get('requests', []):
+                    response = self._handle_request(session, request)
+                    await self._send(websocket, response)
+                    if session.logged_in is None:
+                        await websocket.close()
+                        return
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            producer.cancel()
+
+    def _response(self, request: dict, code: int, msg: str) -> dict:
+        return {
+            'response': [{
+                'service': request.get('service'),
+                'requestid': str(request.get('requestid')),
+                'command': request.get('command'),
+                'timestamp': _timestamp(),
+                'content': {'code': code, 'msg': msg},
+            }]
+        }
+
+    def _handle_request(self, session: _Session, request: dict) -> dict:
+        service = request.get('service')
+        command = request.get('command')
+        parameters = request.get('parameters') or {}
+
+        if service == 'ADMIN' and command == 'LOGIN':
+            if self.reject_login or parameters.get('token') != MOCK_TOKEN:
+                # None tells the handler to hang up after answering.
+                session.logged_in = None
+                return self._response(request, 3, 'Login denied.')
+            session.logged_in = True
+            return self._response(request, 0, 'mock-server-01')
+
+        if not session.logged_in:
+            return self._response(request, 3, 'Not logged in.')
+
+        if service == 'ADMIN' and command == 'QOS':
+            session.qos_seconds = [0.5, 0.75, 1.0, 1.5, 3.0, 5.0][int(parameters.get('qoslevel', 2))]
+            return self._response(request, 0, 'QoS command succeeded. Set qoslevel={}'.format(parameters.get('qoslevel')))
+
+        keys = [k for k in (parameters.get('keys') or '').split(',') if k]
+        if command == 'SUBS':
+            session.subscriptions[service] = set(keys)
+        elif command == 'ADD':
+            session.subscriptions.setdefault(service, set()).update(keys)
+        elif command == 'UNSUBS':
+            if keys:
+                session.subscriptions.get(service, set()).difference_update(keys)
+            else:
+                session.subscriptions.pop(service, None)
+        else:
+            return self._response(request, 11, 'Unknown command: {}'.format(command))
+
+        if not session.subscriptions.get(service):
+            session.subscriptions.pop(service, None)
+        return self._response(request, 0, '{} command succeeded'.format(command))
+
+    async def _send(self, websocket, message: dict) -> None:
+        raw = json.dumps(message)
+        await websocket.send(raw)
+        self.bytes_sent += len(raw)
+
+    async def _produce(self, websocket, session: _Session) -> None:
+        rotation = 0
+        next_heartbeat = time.perf_counter() + self.heartbeat_seconds
+        next_send = time.perf_counter()
+        while True:
+            next_send += 1.0 / self.current_rate()
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # We fell behind, don't try to catch up with a flood.
+                next_send = time.perf_counter()
+
+            if time.perf_counter() >= next_heartbeat:
+                next_heartbeat += self.heartbeat_seconds
+                await self._send(websocket, {'notify': [{'heartbeat': str(_timestamp())}]})
+
+            if not session.logged_in or not session.subscriptions:
+                continue
+
+            sections = []
+            for service, keys in list(session.subscriptions.items()):
+                keys = sorted(keys)
+                if self.symbols_per_message and len(keys) > self.symbols_per_message:
+                    start = rotation % len(keys)
+                    keys = (keys[start:] + keys[:start])[:self.symbols_per_message]
+                section = self._build_section(session, service, keys)
+                if section is not None:
+                    sections.append(section)
+            rotation += self.symbols_per_message or 0
+
+            if sections:
+                await self._send(websocket, {'data': sections})
+                self.messages_sent += 1
+
+    def _build_section(self, session: _Session, service: str, keys: List[str]) -> dict:
+        now = _timestamp()
+        if service in TIMESALE_SERVICES:
+            content = []
+            seq = session.seq.get(service, 0)
+            for key in keys:
+                state = self._symbol(key)
+                for _ in range(self.ticks_per_message):
+                    content.append(self._trade(state, seq, now))
+                    seq += 1
+            session.seq[service] = seq
+            self.ticks_sent += len(content)
+        elif service in QUOTE_SERVICES:
+            content = [self._quote(self._symbol(key)) for key in keys]
+        elif service in BOOK_SERVICES:
+            content = [self._book(self._symbol(key), now) for key in keys]
+        else:
+            return None
+        return {'service': service, 'timestamp': now, 'command': 'SUBS', 'content': content}
+
+    def _step(self, state: _SymbolState) -> None:
+        state.price = max(state.tick_size, state.price + self._rng.choice((-1, 0, 0, 1)) * state.tick_size)
+
+    def _trade(self, state: _SymbolState, seq: int, now: int) -> dict:
+        self._step(state)
+        size = float(self._rng.choice((1, 1, 1, 2, 5, 10, 100)))
+        state.sequence += 1
+        state.volume += size
+        return {
+            'seq': seq,
+            'key': state.symbol,
+            '1': now - self._rng.randint(0, 50),
+            '2': round(state.price, 2),
+            '3': size,
+            '4': state.sequence,
+        }
+
+    def _quote(self, state: _SymbolState) -> dict:
+        # Like TD, only send the fields that changed.
+        self._step(state)
+        quote = {'key': state.symbol}
+        if self._rng.random() < 0.7:
+            quote['1'] = round(state.price - state.tick_size, 2)
+            quote['4'] = self._rng.randint(1, 50) * 100
+        if self._rng.random() < 0.7:
+            quote['2'] = round(state.price + state.tick_size, 2)
+            quote['5'] = self._rng.randint(1, 50) * 100
+        if self._rng.random() < 0.3:
+            quote['3'] = round(state.price, 2)
+            quote['8'] = state.volume
+        return quote
+
+    def _book(self, state: _SymbolState, now: int, depth: int = 10) -> dict:
+        self._step(state)
+
+        def levels(side: int) -> list:
+            book = []
+            for i in range(depth):
+                entries = [
+                    {'0': mpid, '1': self._rng.randint(1, 20) * 100, '2': now - self._rng.randint(0, 60000)}
+                    for mpid in self._rng.sample(BOOK_MPIDS, self._rng.randint(1, 3))
+                ]
+                book.append({
+                    '0': round(state.price + side * (i + 1) * state.tick_size, 2),
+                    '1': sum(e['1'] for e in entries),
+                    '2': len(entries),
+                    '3': entries,
+                })
+            return book
+
+        return {'key': state.symbol, '1': now, '2': levels(-1), '3': levels(1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the TD streamer.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=10.0, help='Data messages per second.')
+    parser.add_argument('--ticks', type=int, default=5, help='Trades per symbol per TIMESALE section.')
+    parser.add_argument('--symbols-per-message', type=int, default=None)
+    parser.add_argument('--burst-every', type=float, default=None, help='Seconds between bursts.')
+    parser.add_argument('--burst-seconds', type=float, default=1.0)
+    parser.add_argument('--burst-multiplier', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockStreamerServer(
+        host=args.host,
+        port=args.port,
+        message_rate=args.rate,
+        ticks_per_message=args.ticks,
+        symbols_per_message=args.symbols_per_message,
+        burst_every=args.burst_every,
+        burst_seconds=args.burst_seconds,
+        burst_multiplier=args.burst_multiplier,
+        seed=args.seed,
+    )
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(server.start())
+    print('Mock streamer listening on {}'.format(server.url))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        print('{} messages, {} ticks, {} bytes sent.'.format(server.messages_sent, server.ticks_sent, server.bytes_sent))
+
+
+if __name__ == '__main__':
+    main()
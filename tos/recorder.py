@@ -0,0 +1,752 @@
+"""Binary columnar recordings of streamed messages.
+
+A recording is a file of batches. Each batch holds the records of one service,
+one row per record and one typed column per field, so loading a day of trades
+is a handful of `np.frombuffer` calls instead of parsing text.
+
+File layout, all integers little endian:
+
+    magic       8 bytes  b'TDREC\\x00\\x01\\x00'
+    batch*      until the end of the file
+
+    batch:
+    header_len  uint32   length of the JSON header
+    header      JSON     {"service": str, "rows": int, "columns": [column, ...]}
+    body        bytes    the column data, in the order of the header
+
+    column:     {"name": str, "dtype": numpy dtype string, "nbytes": int,
+                 "categories": [str, ...],   (only for string columns)
+                 "encoding": str,            (only for encoded columns)
+                 "codes": str}               (only for 'ticks' columns)
+
+String columns are dictionary encoded: the body holds int32 codes into the
+"categories" list. Encoded columns hold `tos.tick_codec` output instead of
+raw values: 'varint' and 'delta-varint' decode to one column, 'ticks' to the
+time, price, size and sequence columns, with deltas per symbol of the
+"codes" column. Rows are built per service:
+
+- TIMESALE_*: timestamp (delta-varint), key (varint), time ('1'), price
+  ('2'), size ('3') and sequence ('4') as one 'ticks' column, and seq
+  (delta-varint).
+- *_BOOK: one row per price level with timestamp, key, book_time, side
+  (0 bid, 1 ask), level, price, size, count and the market maker entries
+  as 'MPID:size:time' joined by ';'.
+- everything else: timestamp, key and one column per field id. Numbers are
+  int64, or float64 with NaN when some records don't carry the field; other
+  values are strings, nested ones as JSON.
+
+A rotated recording is a series of segments next to each other, named
+<name>.<YYYYMMDD>.<NNN>.tdrec after the session day, each a complete recording
+on its own. Closed segments may be compressed, which adds the codec's suffix.
+"""
+import collections
+import concurrent.futures
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from tos.compression import CODEC_SUFFIXES
+from tos.compression import available_codecs
+from tos.compression import codec_of
+from tos.compression import compress_file
+from tos.compression import read_file
+from tos.compression import strip_codec_suffix
+from tos.latency import LatencyHistogram
+from tos.tick_codec import decode_deltas
+from tos.tick_codec import decode_ticks
+from tos.tick_codec import encode_deltas
+from tos.tick_codec import encode_ticks
+from tos.tick_codec import varint_decode
+from tos.tick_codec import varint_encode
+from tos.tick_journal import ONE_DAY_MS
+from tos.tick_journal import day_name
+
+MAGIC = b'TDREC\x00\x01\x00'
+RECORDING_SUFFIX = '.tdrec'
+HEADER_LENGTH = struct.Struct('<I')
+
+BOOK_SUFFIX = '_BOOK'
+
+# When written data is forced to disk, see `StreamRecorder`.
+FSYNC_POLICIES = ['batch', 'interval', 'never']
+
+SEGMENT_PATTERN = r'^{}\.(\d{{8}})\.(\d+){}(\.\w+)?$'
+
+# The columns of each batch, by name.
+Columns = Dict[str, np.ndarray]
+
+
+class EncodedColumn(NamedTuple):
+    """A column stored as `tos.tick_codec` output, see the module docstring."""
+    data: bytes
+    encoding: str
+    rows: int
+    dtype: str = '<i8'
+    codes: str = None
+
+
+def _string_column(values: list) -> Tuple[np.ndarray, List[str]]:
+    categories = {}
+    codes = np.fromiter(
+        (categories.setdefault(value, len(categories)) for value in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return codes, list(categories)
+
+
+def _infer_column(values: list) -> Tuple[np.ndarray, List[str]]:
+    """Types a column of raw field values, None marks a record without the field."""
+    kinds = set(type(value) for value in values)
+    complete = type(None) not in kinds
+    kinds.discard(type(None))
+    if kinds == {bool} and complete:
+        return np.array(values, dtype=np.bool_), None
+    # Bools missing from some records are stored like numbers, 1.0 and 0.0 with NaN for the gaps.
+    if kinds and kinds <= {bool, int, float}:
+        if kinds == {int} and complete:
+            return np.array(values, dtype=np.int64), None
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64), None
+
+    strings = []
+    for value in values:
+        if value is None:
+            strings.append('')
+        elif isinstance(value, str):
+            strings.append(value)
+        elif isinstance(value, (list, dict)):
+            strings.append(json.dumps(value))
+        else:
+            strings.append(str(value))
+    return _string_column(strings)
+
+
+def timesale_columns(timestamps: List[int], content: List[dict]) -> Dict[str, tuple]:
+    """Builds the columns of TIMESALE records, delta encoded per symbol."""
+    get = dict.get
+    rows = len(content)
+    codes, categories = _string_column([c['key'] for c in content])
+    ticks = encode_ticks(
+        np.array([get(c, '1', 0) for c in content], dtype=np.int64),
+        np.array([get(c, '2', np.nan) for c in content], dtype=np.float64),
+        np.array([get(c, '3', np.nan) for c in content], dtype=np.float64),
+        np.array([get(c, '4', -1) for c in content], dtype=np.int64),
+        codes=codes,
+    )
+    return {
+        'timestamp': EncodedColumn(encode_deltas(np.array(timestamps, dtype=np.int64)), 'delta-varint', rows),
+        'key': (EncodedColumn(varint_encode(codes.astype(np.uint64)), 'varint', rows, '<i4'), categories),
+        'ticks': EncodedColumn(ticks, 'ticks', rows, codes='key'),
+        'seq': EncodedColumn(encode_deltas(np.array([get(c, 'seq', -1) for c in content], dtype=np.int64)), 'delta-varint', rows),
+    }
+
+
+def book_columns(timestamps: List[int], content: List[dict]) -> Dict[str, tuple]:
+    """Builds the columns of book records, one row per price level."""
+    rows = {name: [] for name in ('timestamp', 'key', 'book_time', 'side', 'level', 'price', 'size', 'count', 'entries')}
+    for timestamp, book in zip(timestamps, content):
+        for side, field in ((0, '2'), (1, '3')):
+            for level, entry in enumerate(book.get(field) or ()):
+                rows['timestamp'].append(timestamp)
+                rows['key'].append(book['key'])
+                rows['book_time'].append(book.get('1', 0))
+                rows['side'].append(side)
+                rows['level'].append(level)
+                rows['price'].append(entry['0'])
+                rows['size'].append(entry['1'])
+                rows['count'].append(entry.get('2', 0))
+                rows['entries'].append(';'.join(
+                    '{}:{}:{}'.format(e.get('0'), e.get('1'), e.get('2')) for e in entry.get('3') or ()
+                ))
+    return {
+        'timestamp': (np.array(rows['timestamp'], dtype=np.int64), None),
+        'key': _string_column(rows['key']),
+        'book_time': (np.array(rows['book_time'], dtype=np.int64), None),
+        'side': (np.array(rows['side'], dtype=np.int8), None),
+        'level': (np.array(rows['level'], dtype=np.int32), None),
+        'price': (np.array(rows['price'], dtype=np.float64), None),
+        'size': (np.array(rows['size'], dtype=np.float64), None),
+        'count': (np.array(rows['count'], dtype=np.int64), None),
+        'entries': _string_column(rows['entries']),
+    }
+
+
+def field_columns(timestamps: List[int], content: List[dict]) -> Dict[str, tuple]:
+    """Builds the columns of flat records, one column per field id."""
+    fields = []
+    seen = set()
+    for c in content:
+        for field in c:
+            if field not in seen and field != 'key':
+                seen.add(field)
+                fields.append(field)
+    columns = {
+        'timestamp': (np.array(timestamps, dtype=np.int64), None),
+        'key': _string_column([str(c.get('key', '')) for c in content]),
+    }
+    for field in fields:
+        columns[field] = _infer_column([c.get(field) for c in content])
+    return columns
+
+
+def build_columns(service: str, timestamps: List[int], content: List[dict]) -> Dict[str, tuple]:
+    """Builds the typed columns of a batch of records of one service."""
+    if service.startswith('TIMESALE'):
+        return timesale_columns(timestamps, content)
+    if service.endswith(BOOK_SUFFIX):
+        return book_columns(timestamps, content)
+    return field_columns(timestamps, content)
+
+
+def encode_batch(service: str, columns: Dict[str, tuple]) -> bytes:
+    """Serializes the columns of one batch."""
+    rows = 0
+    described = []
+    bodies = []
+    for name, values in columns.items():
+        categories = None
+        if not isinstance(values, EncodedColumn):
+            values, categories = values
+        if isinstance(values, EncodedColumn):
+            rows = values.rows
+            column = {'name': name, 'dtype': values.dtype, 'nbytes': len(values.data), 'encoding': values.encoding}
+            if values.codes is not None:
+                column['codes'] = values.codes
+            body = values.data
+        else:
+            values = np.ascontiguousarray(values)
+            rows = len(values)
+            column = {'name': name, 'dtype': values.dtype.str, 'nbytes': values.nbytes}
+            body = values.tobytes()
+        if categories is not None:
+            column['categories'] = categories
+        described.append(column)
+        bodies.append(body)
+
+    header = json.dumps({'service': service, 'rows': rows, 'columns': described}, separators=(',', ':')).encode('utf-8')
+    return HEADER_LENGTH.pack(len(header)) + header + b''.join(bodies)
+
+
+class StreamRecorder():
+
+    """Records decoded streamer messages into a binary columnar recording.
+
+    `record` only appends the message content to per-service lists. Every
+    `batch_rows` records of a service, and every `flush_interval` seconds for
+    quieter ones, the lists are handed to a writer thread that builds the typed
+    columns, collects the encoded batches in memory and writes them out once
+    `flush_bytes` are buffered or `flush_interval` has passed. The event loop
+    never touches the file, so a slow disk shows up in `metrics` instead of as
+    feed lag. If the writer falls more than `max_pending_records` behind, new
+    records are dropped and counted rather than letting memory grow.
+
+    The fsync policy says when written data is forced to disk: 'batch' after
+    every write, 'interval' at most every `fsync_interval` seconds, or 'never',
+    leaving it to the operating system.
+
+    With `rotate_bytes` or `rotate_session` set the recording is split into
+    segments (see the module docstring): a new one is started when the current
+    one reaches `rotate_bytes` or the session day changes. Closed segments are
+    compressed on another thread with `codec`, and the oldest are deleted to
+    stay within `retention_days` and `retention_bytes`. `read_recording` reads
+    the segments back, compressed or not, given the same `file_path`.
+
+    Arguments:
+    ----
+    file_path {str} -- The recording to write, `.tdrec` is added if missing.
+    batch_rows {int} -- The number of records of a service written as one batch. (default: {10000})
+    append_mode {bool} -- Append to an existing recording instead of replacing it. (default: {True})
+    flush_interval {float} -- The longest records wait before they are written, in seconds. (default: {1.0})
+    flush_bytes {int} -- Write once this many encoded bytes are buffered. (default: {1 << 20})
+    fsync {str} -- One of 'batch', 'interval' or 'never'. (default: {'interval'})
+    fsync_interval {float} -- Seconds between fsyncs with the 'interval' policy. (default: {5.0})
+    max_pending_records {int} -- Records the writer may fall behind by before new ones are
+        dropped. (default: {5000000})
+    background {bool} -- Write from a background thread, False writes in `flush` and `close`
+        on the calling thread, which suits offline conversions. (default: {True})
+    rotate_bytes {int} -- Start a new segment past this size. (default: {None})
+    rotate_session {bool} -- Start a new segment when the session day changes. (default: {False})
+    session_offset_ms {int} -- Where session days start, in ms after midnight UTC. (default: {0})
+    codec {str} -- How closed segments are compressed, one of 'zstd', 'lz4' or 'gzip',
+        'auto' for the best available or None to keep them as they are. (default: {'auto'})
+    retention_days {int} -- Keep the segments of this many session days. (default: {None})
+    retention_bytes {int} -- Delete the oldest segments past this total size. (default: {None})
+
+    Usage:
+    ----
+        >>> td_stream_session.write_behavior(file_path='es_2021_12_22.tdrec', write='binary')
+        >>> td_stream_session.stream()
+        >>> columns = read_recording('es_2021_12_22.tdrec')['TIMESALE_FUTURES']
+        >>> td_stream_session.recorder = StreamRecorder('recordings/es', rotate_session=True, retention_days=30)
+    """
+
+    def __init__(self, file_path: str, batch_rows: int = 10000, append_mode: bool = True,
+                 flush_interval: float = 1.0, flush_bytes: int = 1 << 20, fsync: str = 'interval',
+                 fsync_interval: float = 5.0, max_pending_records: int = 5000000, background: bool = True,
+                 rotate_bytes: int = None, rotate_session: bool = False, session_offset_ms: int = 0,
+                 codec: str = 'auto', retention_days: int = None, retention_bytes: int = None) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('Invalid fsync policy: {}, must be one of {}'.format(fsync, FSYNC_POLICIES))
+        if not file_path.endswith(RECORDING_SUFFIX):
+            file_path += RECORDING_SUFFIX
+        self.base_path = file_path
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_pending_records = max_pending_records
+
+        self.rotate_bytes = rotate_bytes
+        self.rotate_session = rotate_session
+        self.session_offset_ms = session_offset_ms
+        if codec is not None and codec != 'auto' and codec not in CODEC_SUFFIXES:
+            raise ValueError('Invalid codec: {}, must be one of {}'.format(codec, list(CODEC_SUFFIXES)))
+        self.codec = available_codecs()[0] if codec == 'auto' else codec
+        self.retention_days = retention_days
+        self.retention_bytes = retention_bytes
+        self.rotating = bool(rotate_bytes or rotate_session)
+        self._compressor: concurrent.futures.ThreadPoolExecutor = None
+
+        self.segments = 0
+        self.segments_compressed = 0
+        self.segments_deleted = 0
+        self.bytes_before_compression = 0
+        self.bytes_after_compression = 0
+
+        self._open_segment(append_mode)
+
+        # Filled by `record` and swapped out whole under the lock.
+        self._content: Dict[str, List[dict]] = {}
+        self._timestamps: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+        # Handed off (service, timestamps, content) and the encoded bytes not written yet.
+        self._pending: Deque[tuple] = collections.deque()
+        self._pending_records = 0
+        self._buffer = bytearray()
+        self._buffer_batches = 0
+
+        self._last_handoff = time.monotonic()
+        self._last_write = time.monotonic()
+        self._last_fsync = time.monotonic()
+
+        self.records = 0
+        self.dropped = 0
+        self.batches = 0
+        self.bytes_written = 0
+        self.writes = 0
+        self.fsyncs = 0
+        self.errors = 0
+        self.last_error: Exception = None
+        self.flush_latency = LatencyHistogram()
+
+        if self.rotating and (retention_days or retention_bytes):
+            self._apply_retention()
+
+        self._wake = threading.Event()
+        self._closing = False
+        self._thread: threading.Thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name='StreamRecorder', daemon=True)
+            self._thread.start()
+
+    def record(self, message_decoded: dict) -> None:
+        """Buffers the data of a decoded message."""
+        with self._lock:
+            for data in message_decoded.get('data', ()):
+                content = data['content']
+                if self._pending_records > self.max_pending_records:
+                    self.dropped += len(content)
+                    continue
+                service = data['service']
+                buffered = self._content.get(service)
+                if buffered is None:
+                    buffered = self._content[service] = []
+                    self._timestamps[service] = []
+                buffered.extend(content)
+                self._timestamps[service].extend([data.get('timestamp', 0)] * len(content))
+                self.records += len(content)
+                if len(buffered) >= self.batch_rows:
+                    self._hand_off(service)
+        if self._thread is None and self._pending:
+            self._encode_pending()
+
+    def take(self, service: str) -> Tuple[List[int], List[dict]]:
+        """Removes and returns the buffered timestamps and content of a service."""
+        content = self._content.pop(service, [])
+        timestamps = self._timestamps.pop(service, [])
+        return timestamps, content
+
+    def _hand_off(self, service: str) -> None:
+        """Queues the records of a service for the writer, called with the lock held."""
+        timestamps, content = self.take(service)
+        if content:
+            self._pending.append((service, timestamps, content))
+            self._pending_records += len(content)
+            if self._thread is not None and len(self._pending) == 1:
+                self._wake.set()
+
+    def _hand_off_all(self) -> None:
+        with self._lock:
+            for service in list(self._content):
+                self._hand_off(service)
+            self._last_handoff = time.monotonic()
+
+    def flush(self, service: str = None) -> None:
+        """Queues the buffered records of a service, or of every service, for writing.
+        Without a background thread they are written before this returns."""
+        if service is None:
+            self._hand_off_all()
+        else:
+            with self._lock:
+                self._hand_off(service)
+
+        if self._thread is None:
+            self._encode_pending()
+            self._write_buffer()
+        else:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            closing = self._closing
+
+            now = time.monotonic()
+            if closing or now - self._last_handoff >= self.flush_interval:
+                self._hand_off_all()
+            self._encode_pending()
+            if closing or len(self._buffer) >= self.flush_bytes or now - self._last_write >= self.flush_interval:
+                self._write_buffer()
+            if closing:
+                return
+
+    def _encode_pending(self) -> None:
+        while self._pending:
+            service, timestamps, content = self._pending.popleft()
+            try:
+                self._buffer += encode_batch(service, build_columns(service, timestamps, content))
+                self._buffer_batches += 1
+            except Exception as e:
+                self._failed(e)
+            with self._lock:
+                self._pending_records -= len(content)
+            if len(self._buffer) >= self.flush_bytes:
+                self._write_buffer()
+
+    def session_day(self) -> int:
+        """The session day number of now, days since the epoch."""
+        return (int(time.time() * 1000) - self.session_offset_ms) // ONE_DAY_MS
+
+    def _open_segment(self, append_mode: bool = True) -> None:
+        """Opens the file to write to, the next segment of the session if rotating."""
+        if not self.rotating:
+            file_path = self.base_path
+        else:
+            self._segment_day = self.session_day()
+            name = day_name(self._segment_day)
+            index = 0
+            for path in segment_paths(self.base_path):
+                day, number = segment_of(self.base_path, path)
+                if day == name:
+                    index = number + 1
+                    if append_mode and codec_of(path) is None:
+                        index = number
+            file_path = '{}.{}.{:03d}{}'.format(self.base_path[:-len(RECORDING_SUFFIX)], name, index, RECORDING_SUFFIX)
+
+        self.file_path = file_path
+        exists = append_mode and os.path.exists(file_path) and os.path.getsize(file_path) > 0
+        self._file = open(file_path, 'ab' if exists else 'wb')
+        if not exists:
+            self._file.write(MAGIC)
+        self._segment_bytes = self._file.tell()
+        self.segments += 1
+
+    def _should_rotate(self, size: int) -> bool:
+        if self.rotate_session and self.session_day() != self._segment_day:
+            return True
+        return bool(self.rotate_bytes) and self._segment_bytes > len(MAGIC) and self._segment_bytes + size > self.rotate_bytes
+
+    def _close_segment(self) -> None:
+        """Closes the current file and hands it to the compression thread."""
+        if self.fsync != 'never':
+            try:
+                self._sync()
+            except OSError as e:
+                self._failed(e)
+        self._file.close()
+        if self.rotating and (self.codec or self.retention_days or self.retention_bytes):
+            if self._compressor is None:
+                self._compressor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='StreamRecorderCompress')
+            self._compressor.submit(self._finish_segment, self.file_path)
+
+    def _finish_segment(self, file_path: str) -> None:
+        """Compresses a closed segment and applies the retention, off the writer thread."""
+        try:
+            if self.codec:
+                size = os.path.getsize(file_path)
+                compressed_path = compress_file(file_path, self.codec)
+                self.bytes_before_compression += size
+                self.bytes_after_compression += os.path.getsize(compressed_path)
+                self.segments_compressed += 1
+            self._apply_retention()
+        except Exception as e:
+            self._failed(e)
+
+    def _apply_retention(self) -> None:
+        """Deletes the oldest closed segments past `retention_days` or `retention_bytes`."""
+        closed = [path for path in segment_paths(self.base_path) if strip_codec_suffix(path) != self.file_path]
+        if self.retention_days:
+            first_day = day_name(self.session_day() - self.retention_days + 1)
+            for path in list(closed):
+                if segment_of(self.base_path, path)[0] < first_day:
+                    self._delete_segment(path)
+                    closed.remove(path)
+        if self.retention_bytes:
+            sizes = [os.path.getsize(path) for path in closed]
+            total = sum(sizes) + (os.path.getsize(self.file_path) if os.path.exists(self.file_path) else 0)
+            for path, size in zip(closed, sizes):
+                if total <= self.retention_bytes:
+                    break
+                self._delete_segment(path)
+                total -= size
+
+    def _delete_segment(self, file_path: str) -> None:
+        try:
+            os.remove(file_path)
+            self.segments_deleted += 1
+        except OSError as e:
+            self._failed(e)
+
+    def _write_buffer(self) -> None:
+        """Writes the encoded batches and fsyncs as the policy says."""
+        self._last_write = time.monotonic()
+        if not self._buffer:
+            return
+        start = time.perf_counter_ns()
+        try:
+            if self.rotating and self._should_rotate(len(self._buffer)):
+                self._close_segment()
+                self._open_segment(append_mode=False)
+            self._file.write(self._buffer)
+            self._segment_bytes += len(self._buffer)
+            self._file.flush()
+            if self.fsync == 'batch' or (self.fsync == 'interval' and self._last_write - self._last_fsync >= self.fsync_interval):
+                self._sync()
+            self.batches += self._buffer_batches
+            self.bytes_written += len(self._buffer)
+            self.writes += 1
+        except OSError as e:
+            self._failed(e)
+        self.flush_latency.record((time.perf_counter_ns() - start) // 1000)
+        self._buffer = bytearray()
+        self._buffer_batches = 0
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self.fsyncs += 1
+
+    def _failed(self, error: Exception) -> None:
+        self.errors += 1
+        self.last_error = error
+
+    def close(self) -> None:
+        """Writes everything still buffered and closes the recording."""
+        if self._thread is not None:
+            self._closing = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        else:
+            self.flush()
+        if not self._file.closed:
+            self._close_segment()
+        if self._compressor is not None:
+            self._compressor.shutdown(wait=True)
+            self._compressor = None
+
+    def metrics(self) -> dict:
+        return {
+            'records': self.records,
+            'dropped': self.dropped,
+            'buffered_records': sum(len(content) for content in list(self._content.values())),
+            'pending_records': self._pending_records,
+            'buffered_bytes': len(self._buffer),
+            'batches': self.batches,
+            'writes': self.writes,
+            'bytes_written': self.bytes_written,
+            'fsyncs': self.fsyncs,
+            'errors': self.errors,
+            'flush_latency_us': self.flush_latency.summary(),
+            'segments': self.segments,
+            'segments_compressed': self.segments_compressed,
+            'segments_deleted': self.segments_deleted,
+            'compression_ratio': round(self.bytes_before_compression / self.bytes_after_compression, 2)
+            if self.bytes_after_compression else None,
+        }
+
+
+def segment_of(file_path: str, segment_path: str) -> Tuple[str, int]:
+    """The (YYYYMMDD, number) of a segment of a rotated recording."""
+    stem = file_path[:-len(RECORDING_SUFFIX)] if file_path.endswith(RECORDING_SUFFIX) else file_path
+    match = re.match(SEGMENT_PATTERN.format(re.escape(stem), re.escape(RECORDING_SUFFIX)), segment_path)
+    return match.group(1), int(match.group(2))
+
+
+def segment_paths(file_path: str) -> List[str]:
+    """The segments of a rotated recording in order, compressed or not."""
+    stem = file_path[:-len(RECORDING_SUFFIX)] if file_path.endswith(RECORDING_SUFFIX) else file_path
+    directory = os.path.dirname(stem) or '.'
+    if not os.path.isdir(directory):
+        return []
+    pattern = re.compile(SEGMENT_PATTERN.format(re.escape(os.path.basename(stem)), re.escape(RECORDING_SUFFIX)))
+
+    segments = {}
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match is None or (match.group(3) and codec_of(name) is None):
+            continue
+        key = (match.group(1), int(match.group(2)))
+        # A segment caught between compressing and removing the original is read from the original.
+        if key not in segments or codec_of(name) is None:
+            segments[key] = os.path.join(os.path.dirname(stem), name)
+    return [segments[key] for key in sorted(segments)]
+
+
+def iter_batches(file_path: str) -> Iterator[Tuple[str, Columns]]:
+    """Yields the (service, columns) of every batch of a recording. Numeric
+    columns are read-only views of the memory-mapped file, compressed segments
+    are decompressed into memory first."""
+    if codec_of(file_path) is not None:
+        data = read_file(file_path)
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not a stream recording.'.format(file_path))
+        yield from iter_buffer_batches(data, len(MAGIC))
+        return
+
+    with open(file_path, 'rb') as recording:
+        if os.fstat(recording.fileno()).st_size <= len(MAGIC):
+            return
+        data = mmap.mmap(recording.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('{} is not a stream recording.'.format(file_path))
+
+    yield from iter_buffer_batches(data, len(MAGIC))
+
+
+def iter_buffer_batches(data, offset: int = 0) -> Iterator[Tuple[str, Columns]]:
+    """Yields the batches found in a buffer, starting at `offset`."""
+    view = memoryview(data)
+    end = len(data)
+    while offset + HEADER_LENGTH.size <= end:
+        (header_len,) = HEADER_LENGTH.unpack_from(view, offset)
+        offset += HEADER_LENGTH.size
+        if offset + header_len > end:
+            break
+        header = json.loads(bytes(view[offset:offset + header_len]))
+        offset += header_len
+
+        if offset + sum(column['nbytes'] for column in header['columns']) > end:
+            # A batch cut off by a crash, everything before it is still good.
+            break
+
+        columns = {}
+        codes = {}
+        rows = header['rows']
+        for column in header['columns']:
+            encoding = column.get('encoding')
+            body = view[offset:offset + column['nbytes']]
+            offset += column['nbytes']
+            if encoding is None:
+                values = np.frombuffer(body, dtype=np.dtype(column['dtype']), count=rows)
+            elif encoding == 'varint':
+                values = varint_decode(body, rows)[0].astype(column['dtype'])
+            elif encoding == 'delta-varint':
+                values = decode_deltas(body, rows)[0].astype(column['dtype'])
+            elif encoding == 'ticks':
+                (times, prices, sizes, sequences), _ = decode_ticks(body, codes=codes.get(column.get('codes')))
+                columns.update(time=times, price=prices, size=sizes, sequence=sequences)
+                continue
+            else:
+                raise ValueError('Unknown column encoding: {}'.format(encoding))
+            if 'categories' in column:
+                codes[column['name']] = values
+                values = np.array(column['categories'], dtype=object)[values]
+            columns[column['name']] = values
+        yield header['service'], columns
+
+
+def _concatenate(batches: List[Columns]) -> Columns:
+    if len(batches) == 1:
+        return batches[0]
+    names = []
+    for batch in batches:
+        names.extend(name for name in batch if name not in names)
+    columns = {}
+    for name in names:
+        parts = []
+        for batch in batches:
+            values = batch.get(name)
+            if values is None:
+                # A field that only showed up in some batches.
+                rows = len(next(iter(batch.values())))
+                values = np.full(rows, np.nan)
+            parts.append(values)
+        if any(part.dtype == object for part in parts) and not all(part.dtype == object for part in parts):
+            parts = [part.astype(object) for part in parts]
+        columns[name] = np.concatenate(parts)
+    return columns
+
+
+def read_recording(file_path: str, services: List[str] = None) -> Dict[str, Columns]:
+    """Loads a recording as one set of columns per service.
+
+    Arguments:
+    ----
+    file_path {str} -- The recording, or the `file_path` a rotated recording was written
+        with to read all of its segments.
+    services {List[str]} -- Only load these services. (default: {None})
+
+    Returns:
+    ----
+    Dict[str, Columns] -- The columns of each service, keyed by column name.
+    """
+    if os.path.exists(file_path):
+        paths = [file_path]
+    else:
+        paths = segment_paths(file_path)
+        if not paths:
+            raise FileNotFoundError(file_path)
+
+    batches: Dict[str, List[Columns]] = {}
+    for path in paths:
+        for service, columns in iter_batches(path):
+            if services is None or service in services:
+                batches.setdefault(service, []).append(columns)
+    return {service: _concatenate(parts) for service, parts in batches.items()}
+
+
+def recording_to_data_frame(columns: Columns) -> pd.DataFrame:
+    """Builds a frame from the columns of one service, with the symbol as a categorical."""
+    frame = pd.DataFrame(columns, copy=False)
+    if 'key' in frame:
+        frame['key'] = frame['key'].astype('category')
+    return frame
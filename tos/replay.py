@@ -0,0 +1,284 @@
+"""Offline replay of recorded streamer messages.
+
+Recorded messages are pushed through the same decode and dispatch code the
+live stream uses, so the bar pipeline can be load-tested and regression-tested
+without a TD connection.
+
+Run from the repository root:
+
+    python -m tos.replay sample_data/timesales_futures.txt --speed 0 --loops 1000
+"""
+import argparse
+import json
+import os
+import time
+
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+
+from helpers.sample_data import iter_recorded_messages
+from tos.aggregation import BarRegistry
+from tos.stream import TDStreamerClient
+from tos.tick_journal import TickJournal
+
+JOURNAL_SUFFIX = '.jsonl'
+
+# A journal line is the receive time in epoch milliseconds, a tab and the raw message.
+JournalEntry = Tuple[int, str]
+
+
+def message_timestamp(message: dict) -> int:
+    """The server timestamp of a decoded message, or None if it has none."""
+    for section in ('data', 'snapshot', 'notify'):
+        for service in message.get(section, []):
+            if 'timestamp' in service:
+                return service['timestamp']
+    return None
+
+
+def write_journal(file_path: str, entries: Iterable[Union[JournalEntry, dict]]) -> int:
+    """Writes messages to a journal file.
+
+    Arguments:
+    ----
+    file_path {str} -- Where to write the journal.
+    entries {Iterable[Union[JournalEntry, dict]]} -- Either (received ms, raw message) pairs
+        or decoded messages, which are stamped with their server timestamp.
+
+    Returns:
+    ----
+    int -- The number of messages written.
+    """
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as journal:
+        for entry in entries:
+            if isinstance(entry, dict):
+                entry = (message_timestamp(entry) or 0, json.dumps(entry))
+            received, raw = entry
+            journal.write('{}\t{}\n'.format(received, raw))
+            count += 1
+    return count
+
+
+def read_journal(file_path: str) -> Iterator[JournalEntry]:
+    """Yields the (received ms, raw message) pairs of a journal file."""
+    with open(file_path, encoding='utf-8') as journal:
+        for line in journal:
+            received, _, raw = line.rstrip('\n').partition('\t')
+            if raw:
+                yield int(received), raw
+
+
+def read_messages(file_path: str) -> List[JournalEntry]:
+    """Loads a recording as (timestamp ms, raw message) pairs.
+
+    Journals (.jsonl) are read as they are, console recordings like
+    sample_data/timesales_futures.txt are converted to JSON up front so that
+    replaying them costs the same decode as a live message.
+    """
+    if file_path.endswith(JOURNAL_SUFFIX):
+        return list(read_journal(file_path))
+    return [
+        (message_timestamp(message) or 0, json.dumps(message))
+        for message in iter_recorded_messages(file_path)
+    ]
+
+
+def tick_journal_entries(journal: TickJournal, symbol: str, start_ms: int = None, end_ms: int = None,
+                         service: str = None) -> List[JournalEntry]:
+    """Rebuilds TIMESALE messages from the trades of a tick journal, one message
+    per trade time, so they replay through the same decode as a live message.
+
+    Arguments:
+    ----
+    journal {TickJournal} -- The journal.
+    symbol {str} -- The symbol.
+    start_ms {int} -- The first trade time. (default: {None})
+    end_ms {int} -- The time to stop before. (default: {None})
+    service {str} -- The service of the messages, TIMESALE_FUTURES for symbols starting
+        with '/' and TIMESALE_EQUITY otherwise. (default: {None})
+    """
+    if service is None:
+        service = 'TIMESALE_FUTURES' if symbol.startswith('/') else 'TIMESALE_EQUITY'
+    ticks = journal.range(symbol, start_ms, end_ms)
+    if len(ticks) == 0:
+        return []
+
+    times = ticks['time'].tolist()
+    prices = ticks['price'].tolist()
+    sizes = ticks['size'].tolist()
+    sequences = ticks['sequence'].tolist()
+    bounds = np.flatnonzero(np.diff(ticks['time'])) + 1
+    starts = [0] + bounds.tolist()
+    ends = bounds.tolist() + [len(times)]
+
+    entries = []
+    for start, end in zip(starts, ends):
+        content = []
+        for i in range(start, end):
+            trade = {'key': symbol, '1': times[i], '2': prices[i], '3': sizes[i]}
+            if sequences[i] >= 0:
+                trade['4'] = sequences[i]
+            content.append(trade)
+        message = {'data': [{'service': service, 'timestamp': times[start], 'command': 'SUBS', 'content': content}]}
+        entries.append((times[start], json.dumps(message)))
+    return entries
+
+
+class ReplayReport():
+
+    """Throughput and latency of a replay run."""
+
+    def __init__(self, messages: int, ticks: int, elapsed: float, latencies_ns: np.ndarray) -> None:
+        self.messages = messages
+        self.ticks = ticks
+        self.elapsed = elapsed
+        self.latencies_ns = latencies_ns
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.elapsed if self.elapsed else 0.0
+
+    def latency_us(self, percentile: float) -> float:
+        """The per-message decode and dispatch latency at a percentile, in microseconds."""
+        if len(self.latencies_ns) == 0:
+            return 0.0
+        return float(np.percentile(self.latencies_ns, percentile)) / 1000
+
+    def __repr__(self) -> str:
+        return (
+            '{messages} messages, {ticks} ticks in {elapsed:.3f}s: {tps:,.0f} ticks/s, '
+            '{mps:,.0f} messages/s, latency p50 {p50:.1f}us p99 {p99:.1f}us max {pmax:.1f}us'
+        ).format(
+            messages=self.messages,
+            ticks=self.ticks,
+            elapsed=self.elapsed,
+            tps=self.ticks_per_second,
+            mps=self.messages_per_second,
+            p50=self.latency_us(50),
+            p99=self.latency_us(99),
+            pmax=self.latency_us(100),
+        )
+
+
+class StreamReplayer():
+
+    """Plays recorded messages through a `TDStreamerClient` without connecting.
+
+    Arguments:
+    ----
+    streamer {TDStreamerClient} -- The client to dispatch to, an offline one is built if
+        not given. (default: {None})
+    bars {BarRegistry} -- Where the replayed trades are aggregated. (default: {None})
+    speed {float} -- 1 replays in real time, N replays N times faster and 0 or None
+        replays as fast as possible. (default: {None})
+
+    Usage:
+    ----
+        >>> replayer = StreamReplayer(speed=0)
+        >>> report = replayer.replay_file('sample_data/timesales_futures.txt')
+        >>> replayer.bars['/ES'].to_data_frame()
+    """
+
+    def __init__(self, streamer: TDStreamerClient = None, bars: BarRegistry = None, speed: float = None) -> None:
+        if streamer is None:
+            streamer = TDStreamerClient(websocket_url='', user_principal_data={}, credentials={})
+        self.streamer = streamer
+        self.streamer.bars = self.streamer._build_bar_registry(bars)
+        self.speed = speed
+
+    @property
+    def bars(self) -> BarRegistry:
+        return self.streamer.bars
+
+    def replay(self, entries: Iterable[JournalEntry], loops: int = 1) -> ReplayReport:
+        """Decodes and dispatches (timestamp ms, raw message) pairs.
+
+        Arguments:
+        ----
+        entries {Iterable[JournalEntry]} -- The messages to replay.
+        loops {int} -- How many times to play the messages, for load testing. (default: {1})
+
+        Returns:
+        ----
+        ReplayReport -- The throughput and per-message latency of the run.
+        """
+        entries = list(entries)
+        latencies = np.zeros(len(entries) * loops, dtype=np.int64)
+        parse = self.streamer._parse_json_message
+        handle = self.streamer._handle_message
+        ticks = 0
+        index = 0
+
+        start = time.perf_counter()
+        for _ in range(loops):
+            # Every loop plays the same trades again, which would otherwise be dropped as duplicates.
+            self.streamer.sequences.reset()
+            first_timestamp = None
+            loop_start = time.perf_counter()
+            for timestamp, raw in entries:
+                if self.speed:
+                    if first_timestamp is None:
+                        first_timestamp = timestamp
+                    due = loop_start + (timestamp - first_timestamp) / 1000 / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                began = time.perf_counter_ns()
+                message = parse(raw)
+                handle(message)
+                latencies[index] = time.perf_counter_ns() - began
+                index += 1
+
+                for data in message.get('data', []):
+                    if data['service'].startswith('TIMESALE'):
+                        ticks += len(data['content'])
+        elapsed = time.perf_counter() - start
+
+        return ReplayReport(messages=index, ticks=ticks, elapsed=elapsed, latencies_ns=latencies)
+
+    def replay_file(self, file_path: str, loops: int = 1) -> ReplayReport:
+        """Replays a console recording or a .jsonl journal."""
+        return self.replay(read_messages(file_path), loops=loops)
+
+    def replay_tick_journal(self, journal: TickJournal, symbol: str, start_ms: int = None, end_ms: int = None,
+                            loops: int = 1) -> ReplayReport:
+        """Replays a time range of a symbol's trades from a tick journal."""
+        return self.replay(tick_journal_entries(journal, symbol, start_ms, end_ms), loops=loops)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay recorded streamer messages through the bar pipeline.')
+    parser.add_argument('file_path', help='A console recording, a .jsonl journal or a tick journal directory.')
+    parser.add_argument('--symbol', help='The symbol to replay from a tick journal.')
+    parser.add_argument('--start', type=int, help='The first trade time to replay from a tick journal, in epoch ms.')
+    parser.add_argument('--end', type=int, help='The trade time to stop before, in epoch ms.')
+    parser.add_argument('--speed', type=float, default=0, help='1 for real time, N for N times faster, 0 for max speed.')
+    parser.add_argument('--loops', type=int, default=1, help='How many times to play the recording.')
+    args = parser.parse_args()
+
+    replayer = StreamReplayer(speed=args.speed)
+    if os.path.isdir(args.file_path):
+        if not args.symbol:
+            parser.error('--symbol is required to replay a tick journal.')
+        journal = TickJournal(args.file_path)
+        print(replayer.replay_tick_journal(journal, args.symbol, args.start, args.end, loops=args.loops))
+    else:
+        print(replayer.replay_file(args.file_path, loops=args.loops))
+    for symbol in replayer.bars.symbols:
+        print(symbol)
+        print(replayer.bars[symbol].to_data_frame(last=5))
+
+
+if __name__ == '__main__':
+    main()
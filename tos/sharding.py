@@ -0,0 +1,250 @@
+"""Sharded streaming across worker processes.
+
+A single `TDStreamerClient` decodes and aggregates every subscribed symbol on
+one core. `ShardedStreamer` splits the symbols of each subscription across N
+worker processes by a CRC32 hash of the key, so a symbol always lands on the
+same shard. Every worker runs its own streamer connection, decodes its
+messages, checks trade sequences and reduces trades to bar deltas. It then
+sends compact updates back to the parent. The parent merges them into one
+`BarRegistry` and one quote table.
+
+Each shard opens its own streamer connection, so check how many concurrent
+connections the account allows before running more than one.
+
+    >>> streamer = ShardedStreamer(
+    ...     session_factory=functools.partial(mock_streaming_session, 'ws://localhost:8765'),
+    ...     subscriptions=[('timesale', {'service': 'TIMESALE_EQUITY', 'symbols': symbols, 'fields': [0, 1, 2, 3, 4]})],
+    ...     shards=4,
+    ... )
+    >>> streamer.start()
+    >>> streamer.bars['SPY'].snapshot.to_data_frame(last=60)
+"""
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+
+from tos.aggregation import BarRegistry
+from tos.aggregation import reduce_timesale_content
+from tos.aggregation import split_timesale_content
+from tos.tick_codec import TickDecoder
+from tos.tick_codec import TickEncoder
+
+# A streamer subscription: the `TDStreamerClient` method and its keyword arguments.
+Subscription = Tuple[str, dict]
+
+PUBLISH_MODES = ['bars', 'ticks']
+
+
+class ShardUpdate(NamedTuple):
+    shard: int
+    kind: str
+    service: str
+    key: str
+    payload: object
+
+
+def shard_of(key: str, shards: int) -> int:
+    """The shard a symbol is streamed on."""
+    return zlib.crc32(key.encode('utf-8')) % shards
+
+
+def shard_symbols(symbols: List[str], shards: int) -> List[List[str]]:
+    """Splits symbols across shards by a hash of the key, keeping their order."""
+    split = [[] for _ in range(shards)]
+    for symbol in symbols:
+        split[shard_of(symbol, shards)].append(symbol)
+    return split
+
+
+def shard_subscriptions(subscriptions: List[Subscription], shards: int) -> List[List[Subscription]]:
+    """Splits the symbols of each subscription across shards. A shard only gets
+    the subscriptions it has symbols for."""
+    split = [[] for _ in range(shards)]
+    for method, kwargs in subscriptions:
+        for shard, symbols in enumerate(shard_symbols(kwargs['symbols'], shards)):
+            if symbols:
+                split[shard].append((method, dict(kwargs, symbols=symbols)))
+    return split
+
+
+class _ShardPublisher():
+
+    """Replaces the message handler of a shard's streamer, sending one batch of
+    updates to the parent per message."""
+
+    def __init__(self, streamer, shard: int, updates: multiprocessing.Queue, publish: str) -> None:
+        self.streamer = streamer
+        self.shard = shard
+        self.updates = updates
+        self.publish = publish
+        self.encoder = TickEncoder()
+
+    def __call__(self, message_decoded: dict) -> None:
+        batch = []
+        for data in message_decoded.get('data', []):
+            service = data['service']
+            if service.startswith('TIMESALE'):
+                content = self.streamer.sequences.filter(service, data['content'])
+                if self.publish == 'bars':
+                    reduced = reduce_timesale_content(content)
+                else:
+                    reduced = {
+                        symbol: self.encoder.encode(symbol, *trades)
+                        for symbol, trades in split_timesale_content(content).items()
+                    }
+                for symbol, payload in reduced.items():
+                    batch.append(ShardUpdate(self.shard, self.publish, service, symbol, payload))
+            else:
+                for content in data['content']:
+                    batch.append(ShardUpdate(self.shard, 'content', service, content.get('key'), content))
+        if batch:
+            self.updates.put(batch)
+
+
+def _run_shard(shard: int, session_factory: Callable, subscriptions: List[Subscription],
+               updates: multiprocessing.Queue, publish: str) -> None:
+    streamer = session_factory()
+    for method, kwargs in subscriptions:
+        getattr(streamer, method)(**kwargs)
+    streamer._handle_message = _ShardPublisher(streamer, shard, updates, publish)
+    streamer.stream(print_to_console=False)
+
+
+class ShardedStreamer():
+
+    """Streams a large subscription on several worker processes.
+
+    Arguments:
+    ----
+    session_factory {Callable} -- Builds a logged out `TDStreamerClient` in the worker,
+        it must be picklable, e.g. a module level function or a `functools.partial`.
+    subscriptions {List[Subscription]} -- The subscriptions to split, as (method, kwargs)
+        pairs where kwargs has the `symbols`, e.g. ('level_one_quotes', {'symbols': [...], 'fields': [0, 1, 2]}).
+    shards {int} -- The number of worker processes. (default: {the number of cores})
+    publish {str} -- What the shards send back for trades: 'bars' sends the per-minute
+        deltas of each message, which is the least to pickle, 'ticks' sends the trades
+        delta encoded with `tos.tick_codec` and aggregates them in the parent, which works
+        with any bar factory. Listeners get the decoded (times, prices, sizes). (default: {'bars'})
+    bars {BarRegistry} -- Where the merged bars are kept. (default: {None})
+    """
+
+    def __init__(self, session_factory: Callable, subscriptions: List[Subscription], shards: int = None,
+                 publish: str = 'bars', bars: BarRegistry = None) -> None:
+        if publish not in PUBLISH_MODES:
+            raise ValueError('Invalid publish mode: {}, must be one of {}'.format(publish, PUBLISH_MODES))
+
+        self.session_factory = session_factory
+        self.subscriptions = subscriptions
+        self.shards = shards or multiprocessing.cpu_count()
+        self.publish = publish
+        self.bars = bars if bars is not None else BarRegistry()
+
+        # The latest fields of every quote, book or other keyed content, by (service, key).
+        self.quotes: Dict[Tuple[str, str], dict] = {}
+        self.listeners: List[Callable[[ShardUpdate], None]] = []
+
+        self._updates = multiprocessing.Queue()
+        # One per shard, each shard encodes its symbols' trades as deltas from the last ones sent.
+        self._decoders: Dict[int, TickDecoder] = {}
+        self._processes: List[multiprocessing.Process] = []
+        self._drainer: threading.Thread = None
+        self._running = False
+
+        self.batches = 0
+        self.updates = 0
+        self.shard_updates = [0] * self.shards
+
+    def add_listener(self, listener: Callable[[ShardUpdate], None]) -> None:
+        """Calls `listener` with every update after it was merged, on the drain thread."""
+        self.listeners.append(listener)
+
+    def start(self) -> None:
+        """Starts the shard processes and the thread merging their updates."""
+        self._running = True
+        for shard, subscriptions in enumerate(shard_subscriptions(self.subscriptions, self.shards)):
+            if not subscriptions:
+                continue
+            process = multiprocessing.Process(
+                target=_run_shard,
+                args=(shard, self.session_factory, subscriptions, self._updates, self.publish),
+                name='td-stream-shard-{}'.format(shard),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+        self._drainer = threading.Thread(target=self._drain, name='td-stream-shard-drain', daemon=True)
+        self._drainer.start()
+
+    def stop(self) -> None:
+        """Stops the shard processes and the drain thread."""
+        self._running = False
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join()
+        self._processes = []
+        if self._drainer is not None:
+            self._drainer.join()
+            self._drainer = None
+
+    def run(self) -> None:
+        """Streams until interrupted."""
+        self.start()
+        try:
+            while self._running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _drain(self) -> None:
+        while self._running:
+            try:
+                batch = self._updates.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self.merge(batch)
+
+    def merge(self, batch: List[ShardUpdate]) -> None:
+        """Merges a batch of shard updates into the bars and quotes."""
+        for update in batch:
+            if update.kind == 'bars':
+                self.bars.add_bar_deltas(update.key, update.payload)
+            elif update.kind == 'ticks':
+                decoder = self._decoders.get(update.shard)
+                if decoder is None:
+                    decoder = self._decoders[update.shard] = TickDecoder()
+                times, prices, sizes, _ = decoder.decode(update.key, update.payload)
+                update = update._replace(payload=(times, prices, sizes))
+                self.bars.add_trades(update.key, times, prices, sizes)
+            else:
+                fields = self.quotes.get((update.service, update.key))
+                if fields is None:
+                    self.quotes[(update.service, update.key)] = update.payload
+                else:
+                    fields.update(update.payload)
+            for listener in self.listeners:
+                listener(update)
+
+        self.batches += 1
+        self.updates += len(batch)
+        self.shard_updates[batch[0].shard] += len(batch)
+
+    def metrics(self) -> dict:
+        return {
+            'shards': self.shards,
+            'alive': sum(process.is_alive() for process in self._processes),
+            'batches': self.batches,
+            'updates': self.updates,
+            'shard_updates': list(self.shard_updates),
+        }
@@ -1,12 +1,18 @@
 import asyncio
+import concurrent.futures
 import csv
 import io
 import json
 import os
+import random
 import textwrap
+import time
 import unicodedata
 import urllib
 
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
 from typing import List
 from typing import Union
 
@@ -15,8 +21,40 @@ import websockets
 from td.enums import CSV_FIELD_KEYS
 from td.enums import CSV_FIELD_KEYS_LEVEL_2
 from td.enums import STREAM_FIELD_IDS
-from tos.helper import add_or_update_data_frame
-from data_models.streaming_timesales_content import StreamingTimeSaleContent
+from data_models.bar_store import BarStore
+from data_models.order_book import OrderBooks
+from data_models.quote_table import QuoteTable
+from helpers.datetime_helper import ONE_MINUTE_MS
+from tos.aggregation import CHART_BAR_FIELDS
+from tos.aggregation import BarRegistry
+from tos.aggregation import bar_symbols
+from tos.aggregation import split_timesale_content
+from tos.decoder import get_decoder
+from tos.events import BOOK_SERVICES
+from tos.events import QUOTE_SERVICES
+from tos.events import EventBus
+from tos.events import QuoteUpdate
+from tos.events import TickBatch
+from tos.events import update_key
+from tos.latency import LatencyRecorder
+from tos.message_queue import BatchBuffer
+from tos.message_queue import StreamMessageQueue
+from tos.recorder import StreamRecorder
+from tos.sequence import SequenceTracker
+from tos.subscriptions import SubscriptionManager
+from tos.tick_journal import TickJournal
+
+# The field ids of each service that `ticks` and `quotes` subscribe with by default.
+ITERATOR_FIELDS = {
+    'TIMESALE_EQUITY': 'timesale',
+    'TIMESALE_FUTURES': 'timesale',
+    'TIMESALE_OPTIONS': 'timesale',
+    'QUOTE': 'level_one_quote',
+    'OPTION': 'level_one_option',
+    'LEVELONE_FUTURES': 'level_one_futures',
+    'LEVELONE_FOREX': 'level_one_forex',
+    'LEVELONE_FUTURES_OPTIONS': 'level_one_futures_options',
+}
 
 
 class TDStreamerClient():
@@ -27,7 +65,8 @@ class TDStreamerClient():
         handles messages, and streams data back to the user.
     """
 
-    def __init__(self, websocket_url: str, user_principal_data: dict, credentials: dict) -> None:     
+    def __init__(self, websocket_url: str, user_principal_data: dict, credentials: dict, json_backend: str = 'auto',
+                 price_history: Callable = None) -> None:     
         """Initalizes the Streaming Client.
         
         Initalizes the Client Object and defines different components that will be needed to
@@ -35,10 +74,15 @@ class TDStreamerClient():
         Arguments:
         ----
         websocket_url {str} -- The websocket URL that is returned from a Get_User_Prinicpals Request.
+            A full ws:// or wss:// URL is used as is, e.g. for a local test server.
         user_principal_data {dict} -- The data that was returned from the "Get_User_Principals" request. 
             Contains the info need for the account info.
         credentials {dict} -- A credentials dictionary that is created from the "create_streaming_session"
             method.
+        json_backend {str} -- The JSON library used to decode messages, one of 'auto', 'orjson',
+            'msgspec' or 'json'. (default: {'auto'})
+        price_history {Callable} -- `TDClient.get_price_history`, used to backfill the 1-minute
+            bars missed while reconnecting. (default: {None})
         
         Usage:
         ----
@@ -50,12 +94,17 @@ class TDStreamerClient():
             >>> td_session.login()
             >>> td_stream_session = td_session.create_streaming_session()
         """
-        self.websocket_url = "wss://{}/ws".format(websocket_url)
+        if websocket_url.startswith(('ws://', 'wss://')):
+            self.websocket_url = websocket_url
+        else:
+            self.websocket_url = "wss://{}/ws".format(websocket_url)
         self.credentials = credentials
         self.user_principal_data = user_principal_data
         self.connection: websockets.WebSocketClientProtocol = None
         self.file_stream_level_1: io.TextIOWrapper = None
         self.file_stream_level_2: io.TextIOWrapper = None
+        self.stream_writer_level_1 = None
+        self.stream_writer_level_2 = None
 
         # this will hold all of our requests
         self.data_requests = {"requests": []}
@@ -69,6 +118,46 @@ class TDStreamerClient():
 
         self.print_to_console = True
         self.write_flag = False
+        self.recorder: StreamRecorder = None
+        self.journal: TickJournal = None
+        self.decoder = get_decoder(backend=json_backend)
+        self.queue: StreamMessageQueue = None
+        self._dispatch_executor: concurrent.futures.ThreadPoolExecutor = None
+
+        # The dispatch task and consumer buffers of `start`, `ticks` and `quotes`.
+        self._dispatcher: asyncio.Task = None
+        self._buffers: List[BatchBuffer] = []
+
+        # Flags sequence gaps and drops duplicate trades before they reach the bars.
+        self.sequences = SequenceTracker()
+
+        # The latest level one quote of every symbol, per service.
+        self.quote_tables: Dict[str, QuoteTable] = {}
+
+        # The live level 2 book of every symbol.
+        self.books = OrderBooks()
+
+        # Adds and removes symbols on the live connection.
+        self.subscriptions = SubscriptionManager(self)
+
+        # Strategy handlers, called as messages are dispatched.
+        self.events = EventBus()
+
+        # Per-stage latency histograms, set to None to turn the timing off.
+        self.latency = LatencyRecorder()
+        self.latency_report = None
+
+        # Reconnect with jittered exponential backoff and backfill the missed bars.
+        self.price_history = price_history
+        self.reconnect = False
+        self.reconnect_base_delay = 1.0
+        self.reconnect_max_delay = 60.0
+        self.reconnects = 0
+        self.backfilled_bars = 0
+
+        # The refused login that ended the stream, raised again by `stream` and the iterators.
+        self.stream_error = None
+        self._closing = False
 
         try:
             self.loop = asyncio.get_event_loop()
@@ -78,9 +167,7 @@ class TDStreamerClient():
         except:
             print('h')
 
-        self.unsubscribe_count = 0
-
-    def write_behavior(self, file_path: str, write: str = 'csv', append_mode: bool = True) -> None:        
+    def write_behavior(self, file_path: str, write: str = 'csv', append_mode: bool = True, **recorder_options) -> None:        
         """Sets the csv dump location and the append mode.
         Arguments:
         ----
@@ -89,10 +176,20 @@ class TDStreamerClient():
         Keyword Arguments:
         ----
         
-        write {str} -- Defines where you want to write the streaming data to. Right now can only specify
-            'csv'. (default: {'csv'})
+        write {str} -- Defines where you want to write the streaming data to, either 'csv' or
+            'binary'. 'binary' records every message into a columnar recording that
+            `tos.recorder.read_recording` loads back as arrays. 'journal' appends the
+            dispatched trades to a `TickJournal` in the `file_path` directory. (default: {'csv'})
         append_mode {bool} -- Defines whether the write mode should be append or new. If append-mode is True, 
             then all CSV data will go to the existing file. Can either be `True` or `False`. (default: {True})
+        recorder_options -- Passed on to the `StreamRecorder` of the 'binary' mode, or the
+            `TickJournal` of the 'journal' mode, see them for all of them. The ones for long sessions are:
+            rotate_bytes {int} -- Start a new segment past this size. (default: {None})
+            rotate_session {bool} -- Start a new segment when the session day changes. (default: {False})
+            codec {str} -- How closed segments are compressed, one of 'zstd', 'lz4' or 'gzip',
+                'auto' for the best available or None to keep them as they are. (default: {'auto'})
+            retention_days {int} -- Keep the segments of this many session days. (default: {None})
+            retention_bytes {int} -- Delete the oldest segments past this total size. (default: {None})
         Usage:
         ----
             >>> td_session = TDClient(
@@ -103,6 +200,12 @@ class TDStreamerClient():
             >>> td_session.login()
             >>> td_stream_session = td_session.create_streaming_session()
             >>> td_stream_session.write_behavior(file_path='data_dump.csv')
+            >>> td_stream_session.write_behavior(
+                file_path='recordings/es',
+                write='binary',
+                rotate_session=True,
+                retention_days=30
+            )
         """
 
         if write == 'csv':
@@ -127,8 +230,18 @@ class TDStreamerClient():
                 newline=''
             )
 
+            # Built once, not per message.
+            self.stream_writer_level_1 = csv.writer(self.file_stream_level_1)
+            self.stream_writer_level_2 = csv.writer(self.file_stream_level_2)
+
             self.write_flag = True
 
+        elif write == 'binary':
+            self.recorder = StreamRecorder(file_path=file_path, append_mode=append_mode, **recorder_options)
+
+        elif write == 'journal':
+            self.journal = TickJournal(root=file_path, **recorder_options)
+
     def _write_non_chart_services(self, data_content: dict, service_name: str) -> List:
         """Takes a Non-Chart Services and parses the values to write.
         Arguments:
@@ -322,8 +435,8 @@ class TDStreamerClient():
         else:
             return None
 
-        stream_writer_level_1 = csv.writer(self.file_stream_level_1)
-        stream_writer_level_2 = csv.writer(self.file_stream_level_2)
+        stream_writer_level_1 = self.stream_writer_level_1
+        stream_writer_level_2 = self.stream_writer_level_2
 
         for service_result in data:
 
@@ -377,37 +490,24 @@ class TDStreamerClient():
                     new_row = [service_timestamp] + row
                     stream_writer_level_2.writerow(new_row)
 
-    async def unsubscribe(self, service: str) -> dict:
+    async def unsubscribe(self, service: str) -> List[str]:
         """Unsubscribe from a service.
+        The symbols of the service are released through `subscriptions` and the
+        UNSUBS is sent right away. Symbols that something else, like an iterator,
+        still holds a reference on stay subscribed.
         Arguments:
         ----
         service {str} -- The name of the service, to unsubscribe from. For example,
             "LEVELONE_FUTURES" or "QUOTES".
         Returns:
         ----
-        dict -- A message from the websocket specifiying whether the unsubscribe command
-            was successful.
+        List[str] -- The symbols that are no longer subscribed.
         """
 
-        self.unsubscribe_count += 1
-
-        service_count = len(self.data_requests['requests']) + self.unsubscribe_count
-        
-        request = {
-            "requests":[
-                {
-                    "service": service.upper(), 
-                    "requestid": service_count, 
-                    "command": 'UNSUBS',
-                    "account": self.user_principal_data['accounts'][0]['accountId'],
-                    "source": self.user_principal_data['streamerInfo']['appId']
-                }
-            ]
-        }
-
-        await self._send_message(json.dumps(request))
-
-        return await self._receive_message(return_value=True)
+        service = service.upper()
+        removed = self.subscriptions.unsubscribe(service, self.subscriptions.symbols(service))
+        await self.subscriptions.flush()
+        return removed
 
     def _build_login_request(self) -> str:
         """Builds the Login request for the streamer.
@@ -481,20 +581,201 @@ class TDStreamerClient():
 
         return await self._receive_message(return_value=True)
 
-    def stream(self, data_frame, print_to_console: bool = True) -> None:
+    async def start(self, bars: Union[BarRegistry, BarStore] = None, reconnect: bool = True) -> None:
+        """Connects and dispatches messages on the running event loop.
+        The asyncio counterpart of `stream`, it returns once the data request
+        was sent, so the `ticks` and `quotes` iterators and the event handlers
+        share the loop with the rest of the application.
+        Keyword Arguments:
+        ----
+        bars {Union[BarRegistry, BarStore]} -- Where the trades are aggregated, see `stream`. (default: {None})
+        reconnect {bool} -- Reconnect and resubscribe when the connection drops. (default: {True})
+        """
+
+        if self._dispatcher is not None:
+            return
+
+        self.loop = asyncio.get_running_loop()
+        self.print_to_console = False
+        self.reconnect = reconnect
+        self.bars = self._build_bar_registry(bars)
+
+        await self._connect()
+        await self._send_message(self._build_data_request())
+        self._dispatcher = asyncio.ensure_future(self._dispatch_messages())
+
+    async def stop(self) -> None:
+        """Stops dispatching, closes the connection and ends the iterators."""
+
+        # Closing the connection must not look like a drop to reconnect from.
+        self.reconnect = False
+
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            except ValueError:
+                # The refused login, already raised to the iterators.
+                pass
+            self._dispatcher = None
+
+        if self.connection is not None:
+            await self.connection.close()
+        if self.recorder is not None:
+            self.recorder.flush()
+        if self.journal is not None:
+            self.journal.flush()
+        for buffer in self._buffers:
+            buffer.close()
+
+    async def _dispatch_messages(self) -> None:
+        """Reads and dispatches messages for `start` until the connection closes."""
+
+        try:
+            while True:
+                try:
+                    message = await self.connection.recv()
+                except websockets.exceptions.ConnectionClosed:
+                    if self.reconnect:
+                        await self._reconnect()
+                        continue
+                    break
+                received_ns = time.perf_counter_ns()
+                self._handle_timed(self._parse_json_message(message=message), received_ns)
+        finally:
+            for buffer in self._buffers:
+                buffer.close()
+
+    async def ticks(self, symbols: List[str] = None, service: str = None, maxsize: int = 256,
+                    overflow: str = 'coalesce') -> AsyncIterator[TickBatch]:
+        """Yields the streamed trades in per-symbol batches.
+        The stream is started if it isn't already. The `symbols` are subscribed
+        to through `subscriptions` while the iterator is open, so they don't have
+        to be requested first, and released when it closes. Cancelling the task
+        running the loop removes the subscription, after a `break` it is removed
+        when the generator is closed, use `contextlib.aclosing` to do that right away.
+        Keyword Arguments:
+        ----
+        symbols {List[str]} -- Subscribe to and yield these symbols, all the trades already
+            subscribed to if not set. (default: {None})
+        service {str} -- Only yield this TIMESALE service, the symbols are subscribed on
+            TIMESALE_FUTURES if they start with '/' and TIMESALE_EQUITY otherwise if not
+            set. (default: {None})
+        maxsize {int} -- The number of batches that can wait for the consumer. (default: {256})
+        overflow {str} -- What to do when that many are waiting: 'coalesce' appends the
+            trades to the waiting batch of the same symbol, 'drop-oldest' discards the
+            oldest batch. (default: {'coalesce'})
+        Usage:
+        ----
+            >>> async for batch in td_stream_session.ticks(symbols=['SPY']):
+            ...     print(batch.symbol, batch.prices[-1], batch.count)
+        """
+
+        buffer = BatchBuffer(maxsize=maxsize, policy=overflow, key=update_key, merge=TickBatch.merge)
+
+        def on_tick(symbol, times, prices, sizes) -> None:
+            buffer.put(TickBatch(symbol, times, prices, sizes))
+
+        async for batch in self._iterate('tick', buffer, on_tick, symbols, service):
+            yield batch
+
+    async def quotes(self, symbols: List[str] = None, service: str = None, maxsize: int = 256,
+                     overflow: str = 'coalesce') -> AsyncIterator[QuoteUpdate]:
+        """Yields the changed fields of streamed quotes, see `ticks`. The symbols
+        are subscribed on LEVELONE_FUTURES if they start with '/' and on QUOTE
+        otherwise, unless `service` is set. Coalescing merges the fields into the
+        waiting update of the same symbol."""
+
+        buffer = BatchBuffer(maxsize=maxsize, policy=overflow, key=update_key, merge=QuoteUpdate.merge)
+
+        def on_quote(symbol, fields) -> None:
+            buffer.put(QuoteUpdate(symbol, fields))
+
+        async for update in self._iterate('quote', buffer, on_quote, symbols, service):
+            yield update
+
+    async def _iterate(self, event: str, buffer: BatchBuffer, handler: Callable,
+                       symbols: List[str], service: str) -> AsyncIterator:
+        subscriptions = self._iterator_subscriptions(event, symbols, service)
+        symbols = symbols or [None]
+        for symbol in symbols:
+            self.events.subscribe(event, handler, symbol=symbol, service=service)
+        self._buffers.append(buffer)
+
+        try:
+            for subscription_service, keys in subscriptions.items():
+                self.subscriptions.subscribe(subscription_service, keys, fields=self._iterator_fields(subscription_service))
+            if self._dispatcher is None:
+                await self.start()
+            while True:
+                item = await buffer.get()
+                if item is None:
+                    if self.stream_error is not None:
+                        raise self.stream_error
+                    return
+                yield item
+        finally:
+            for symbol in symbols:
+                self.events.unsubscribe(event, handler, symbol=symbol, service=service)
+            self._buffers.remove(buffer)
+            for subscription_service, keys in subscriptions.items():
+                self.subscriptions.unsubscribe(subscription_service, keys)
+
+    def _iterator_subscriptions(self, event: str, symbols: List[str], service: str) -> Dict[str, List[str]]:
+        """Groups the symbols of a `ticks` or `quotes` iterator by the service they are subscribed on."""
+
+        subscriptions = {}
+        for symbol in symbols or []:
+            if service is not None:
+                symbol_service = service
+            elif event == 'tick':
+                symbol_service = 'TIMESALE_FUTURES' if symbol.startswith('/') else 'TIMESALE_EQUITY'
+            else:
+                symbol_service = 'LEVELONE_FUTURES' if symbol.startswith('/') else 'QUOTE'
+            subscriptions.setdefault(symbol_service, []).append(symbol)
+        return subscriptions
+
+    def _iterator_fields(self, service: str) -> List[str]:
+        """All the fields of a service, unless some were already subscribed to."""
+
+        if self.subscriptions.fields_of(service) or service not in ITERATOR_FIELDS:
+            return None
+        return list(self.fields_ids_dictionary[ITERATOR_FIELDS[service]])
+
+    def stream(self, bars: Union[BarRegistry, BarStore] = None, print_to_console: bool = True,
+               queue_size: int = None, overflow: str = 'block', reconnect: bool = True,
+               latency_report: str = None) -> None:
         """Starts the stream and prints the output to the console.
         Initalizes the stream by building a login request, starting 
         an event loop, creating a connection, passing through the 
         requests, and keeping the loop running.
         Keyword Arguments:
         ----
-        print_to_console {bool} -- Specifies whether the content is to be printed
-            to the console or not. (default: {True})
+        bars {Union[BarRegistry, BarStore]} -- Where the time and sales trades are aggregated.
+            A `BarRegistry` keeps bars per symbol, if nothing is passed one is built for the
+            subscribed symbols. A single `BarStore` (or `MultiTimeframeAggregator`) can be
+            passed when only one symbol is subscribed. (default: {None})
+        print_to_console {bool} -- Specifies whether the content, and the latency report
+            when the stream closes, are to be printed to the console or not. (default: {True})
+        queue_size {int} -- If set, the socket is read by its own task that hands messages
+            through a queue of this size to a worker thread, which decodes and dispatches
+            them, so slow processing doesn't stall the reads. Handlers then run on that
+            thread, one message at a time and in order. (default: {None})
+        overflow {str} -- What to do when the queue is full, one of 'block', 'drop-oldest'
+            or 'coalesce'. See `StreamMessageQueue`. (default: {'block'})
+        reconnect {bool} -- Reconnect, log in and resubscribe when the connection drops, and
+            backfill the missed 1-minute bars if a `price_history` source was given. (default: {True})
+        latency_report {str} -- A file to write the latency histograms to when the stream
+            closes. (default: {None})
         """        
 
         # Print it to the console.
         self.print_to_console = print_to_console
-        self.data_frame = data_frame
+        self.reconnect = reconnect
+        self.latency_report = latency_report
+        self.bars = self._build_bar_registry(bars)
         
         # Connect to the Websocket.
         self.loop.run_until_complete(self._connect())
@@ -503,11 +784,46 @@ class TDStreamerClient():
         asyncio.ensure_future(self._send_message(self._build_data_request()))
 
         # Start Recieving Messages.
-        asyncio.ensure_future(self._receive_message(return_value=False))
+        if queue_size:
+            self.queue = StreamMessageQueue(maxsize=queue_size, policy=overflow, decoder=self.decoder)
+            asyncio.ensure_future(self._read_messages())
+            asyncio.ensure_future(self._process_messages())
+        else:
+            asyncio.ensure_future(self._receive_message(return_value=False))
 
         # Keep the Loop going, until an exception is reached.
         self.loop.run_forever()
 
+        if self.stream_error is not None:
+            raise self.stream_error
+
+    def _build_bar_registry(self, bars: Union[BarRegistry, BarStore] = None) -> BarRegistry:
+        """Builds the registry that routes streamed trades to each symbol's bars.
+        Arguments:
+        ----
+        bars {Union[BarRegistry, BarStore]} -- A registry, or the bars of the only subscribed symbol.
+        Raises:
+        ----
+        ValueError: Error if a single bar store is passed for several symbols.
+        Returns:
+        ----
+        BarRegistry -- The registry, pre-sized for the subscribed symbols.
+        """
+
+        if isinstance(bars, BarRegistry):
+            for symbol in bar_symbols(self.data_requests):
+                if symbol not in bars:
+                    bars.add(symbol)
+            return bars
+
+        registry = BarRegistry.from_requests(self.data_requests)
+        if bars is not None:
+            if len(registry) > 1:
+                raise ValueError('A single bar store was passed for several symbols, use a BarRegistry.')
+            for symbol in registry.symbols:
+                registry.add(symbol, bars)
+        return registry
+
     def close_logic(self, logic_type: str) -> bool:
         """Defines how the stream should close.
         Sets the logic to determine how long to keep the server open. 
@@ -526,10 +842,29 @@ class TDStreamerClient():
 
     async def close_stream(self) -> None:
         """Closes the connection to the streaming service."""        
-        
+
+        # The readers see the connection close and end up here again.
+        if self._closing:
+            return
+        self._closing = True
+
+        # Closing the connection must not look like a drop to reconnect from.
+        self.reconnect = False
+
         # close the connection.
         await self.connection.close()
 
+        # The messages already read are dispatched before the writers close.
+        if self.queue is not None and self._dispatch_executor is not None:
+            await self.queue.drained()
+        await self._on_dispatch_thread(self._close_writers)
+
+        if self.latency is not None:
+            if self.print_to_console:
+                print(self.latency.report())
+            if self.latency_report:
+                self.latency.dump(self.latency_report)
+
         # Define the Message.
         message = textwrap.dedent("""
         {lin_brk}
@@ -545,7 +880,7 @@ class TDStreamerClient():
 
         # Stop the loop.
         if self.loop.is_running():
-            self.loop.call_soon_threadsafe(self.loop.stop())
+            self.loop.call_soon_threadsafe(self.loop.stop)
             print(message)
             await asyncio.sleep(3)
 
@@ -569,6 +904,29 @@ class TDStreamerClient():
         #     except asyncio.CancelledError:
         #         print("main(): cancel_me is cancelled now")
 
+    def _close_writers(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    async def _on_dispatch_thread(self, function: Callable, *args):
+        """Calls a function that touches the dispatch state, e.g. the bars, the
+        sequence tracker or the writers. With a message queue it runs on the
+        dispatch thread, after the message in flight, so it can't race the
+        handlers. Otherwise it's called right away.
+        Arguments:
+        ----
+        function {Callable} -- The function to call with `args`.
+        Returns:
+        ----
+        What the function returned.
+        """
+
+        if self._dispatch_executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._dispatch_executor, function, *args)
+
     async def _connect(self) -> websockets.WebSocketClientProtocol:
         """Connects the Client to the TD Websocket.
         Connecting to webSocket server websockets.client.connect 
@@ -600,9 +958,12 @@ class TDStreamerClient():
 
             while True:
                 
-                # Grab the Response.
-                response = await self._receive_message(return_value=True)
+                # Grab the Response, reading the socket directly so a drop during
+                # the login surfaces here instead of closing the stream.
+                response = self._parse_json_message(message=await self.connection.recv())
                 responses = response.get('response')
+                if not responses:
+                    continue
 
                 # If we get a code 3, we had a login error.
                 if responses[0]['content']['code'] == 3:
@@ -666,9 +1027,10 @@ class TDStreamerClient():
                 
                 # Grab the Message
                 message = await self.connection.recv()
+                received_ns = time.perf_counter_ns()
 
                 # Parse Message
-                message_decoded = await self._parse_json_message(message=message)
+                message_decoded = self._parse_json_message(message=message)
             
                 if return_value:
                     return message_decoded
@@ -681,38 +1043,268 @@ class TDStreamerClient():
                 print('-'*20)
                 print('') 
                 """
-                if 'data' in message_decoded:
-                    for data in message_decoded['data']:
-                        service = data['service']
-                        if service in ['TIMESALE_FUTURES', 'TIMESALE_EQUITY']:
-                            for content in data['content']:
-                                timesale = StreamingTimeSaleContent()
-                                timesale.load_from_tos(content)
-                                add_or_update_data_frame(self.data_frame, timesale)
+                self._handle_timed(message_decoded, received_ns)
 
             except websockets.exceptions.ConnectionClosed:
 
+                if self.reconnect and not return_value:
+                    await self._reconnect()
+                    continue
+
                 # stop the connection if there is an error.
                 await self.close_stream()
                 break           
 
-    async def _parse_json_message(self, message: str) -> dict:
+    async def _reconnect(self) -> None:
+        """Reconnects after the connection dropped.
+        Retries with exponential backoff and full jitter until the login
+        succeeds, sends the subscriptions again and then backfills the bars
+        that were missed while we were disconnected. A refused login or
+        authorization won't clear up by retrying, it closes the stream and
+        is raised.
+        Raises:
+        ----
+        ValueError: The login was refused.
+        websockets.exceptions.InvalidStatusCode: The handshake was unauthorized.
+        """
+
+        disconnected_ms = time.time_ns() // 1000000
+        attempt = 0
+
+        while True:
+            delay = min(self.reconnect_max_delay, self.reconnect_base_delay * 2 ** attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+
+            try:
+                await self._connect()
+                # The messages of the dropped connection are dispatched before the new one's.
+                if self.queue is not None and self._dispatch_executor is not None:
+                    await self.queue.drained()
+                await self._on_dispatch_thread(self.sequences.reset_stream)
+                await self._send_message(self._build_data_request())
+                break
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                if isinstance(e, websockets.exceptions.InvalidStatusCode) and e.status_code in (401, 403):
+                    await self._fail(e)
+                    raise
+                attempt += 1
+                print('Reconnect attempt {} failed: {}'.format(attempt, e))
+            except ValueError as e:
+                await self._fail(e)
+                raise
+
+        self.reconnects += 1
+        await self._backfill(since_ms=disconnected_ms)
+
+    async def _fail(self, error: Exception) -> None:
+        """Ends the stream after an error retrying can't fix.
+        `stream` raises the error once its loop stops, the iterators of `start`
+        raise it when their buffers close.
+        Arguments:
+        ----
+        error {Exception} -- The error that ended the stream.
+        """
+
+        print('Stream stopped: {}'.format(error))
+        self.stream_error = error
+        self.reconnect = False
+
+        if self._dispatcher is None:
+            await self.close_stream()
+        elif self.connection is not None:
+            await self.connection.close()
+
+    async def _backfill(self, since_ms: int) -> None:
+        """Backfills the completed 1-minute bars missed since a point in time.
+        The newest bar each symbol had before the drop is refetched as well,
+        since the stream only saw part of it. The minute in progress is left
+        to the stream.
+        Arguments:
+        ----
+        since_ms {int} -- When the connection dropped, in epoch milliseconds.
+        """
+
+        if self.price_history is None or self.bars is None:
+            return
+
+        now_ms = time.time_ns() // 1000000
+        current_minute = now_ms - now_ms % ONE_MINUTE_MS
+
+        for symbol in self.bars.symbols:
+            bars = self.bars[symbol]
+            start = getattr(bars, 'last_time', None) or since_ms - since_ms % ONE_MINUTE_MS
+            if start >= current_minute:
+                continue
+
+            try:
+                response = await self.loop.run_in_executor(None, lambda: self.price_history(
+                    symbol=symbol,
+                    start_date=start,
+                    end_date=now_ms,
+                    frequency_type='minute',
+                    frequency=1,
+                ))
+            except Exception as e:
+                print('Backfill for {} failed: {}'.format(symbol, e))
+                continue
+
+            candles = [c for c in response.get('candles', []) if start <= c['datetime'] < current_minute]
+            self.backfilled_bars += await self._on_dispatch_thread(self.bars.merge_history, symbol, candles)
+
+    async def _read_messages(self) -> None:
+        """Reads the socket into the message queue until the connection closes."""
+
+        while True:
+            try:
+                message = await self.connection.recv()
+            except websockets.exceptions.ConnectionClosed:
+                if self.reconnect:
+                    await self._reconnect()
+                    continue
+                await self.close_stream()
+                break
+
+            await self.queue.put(message, time.perf_counter_ns())
+
+            # recv() doesn't yield while the socket has buffered messages, so give the
+            # processor a turn whenever there is work waiting.
+            if self.queue.depth:
+                await asyncio.sleep(0)
+
+    async def _process_messages(self) -> None:
+        """Hands the messages waiting in the queue to the dispatch thread. The
+        loop stays free to read the socket meanwhile, so a slow handler fills the
+        queue and its overflow policy applies instead of delaying `recv`."""
+
+        if self._dispatch_executor is None:
+            self._dispatch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='StreamDispatch')
+        loop = asyncio.get_running_loop()
+
+        while True:
+            message, received_ns = await self.queue.get()
+            await loop.run_in_executor(self._dispatch_executor, self._process_message, message, received_ns)
+
+    def _process_message(self, message: Union[str, bytes, dict], received_ns: int = None) -> None:
+        """Decodes and dispatches one queued message, on the dispatch thread."""
+
+        if not isinstance(message, dict):
+            message = self._parse_json_message(message=message)
+        self._handle_timed(message, received_ns)
+
+    def _handle_timed(self, message_decoded: dict, received_ns: int = None) -> None:
+        """Dispatches a decoded message and records its latencies.
+        Arguments:
+        ----
+        message_decoded {dict} -- The decoded message from the stream.
+        received_ns {int} -- The `time.perf_counter_ns` reading when the message
+            was read off the socket. (default: {None})
+        """
+
+        if self.latency is None or received_ns is None:
+            self._handle_message(message_decoded)
+            return
+
+        parsed_ns = time.perf_counter_ns()
+        self._handle_message(message_decoded)
+        self.latency.record_message(message_decoded, received_ns, parsed_ns, time.perf_counter_ns())
+
+    def _handle_message(self, message_decoded: dict) -> None:
+        """Dispatches a decoded message to the services that consume it.
+        This is shared by the live stream and the offline replay, so both
+        drive the same bar pipeline.
+        Arguments:
+        ----
+        message_decoded {dict} -- The decoded message from the stream.
+        """
+
+        if 'data' in message_decoded:
+            if self.recorder is not None:
+                self.recorder.record(message_decoded)
+            for data in message_decoded['data']:
+                service = data['service']
+                if service in ['TIMESALE_FUTURES', 'TIMESALE_EQUITY']:
+                    content = self.sequences.filter(service, data['content'])
+                    if content:
+                        self._handle_trades(service, content)
+                        if self.journal is not None:
+                            self.journal.append_content(content)
+                elif service in CHART_BAR_FIELDS:
+                    self._handle_chart_bars(service, data['content'])
+                elif service in QUOTE_SERVICES:
+                    self.quote_table(service).merge(data['content'])
+                    self.events.dispatch_content('quote', service, data['content'])
+                elif service in BOOK_SERVICES:
+                    self.books.apply_content(service, data['content'])
+                    self.events.dispatch_content('book', service, data['content'])
+
+    def _handle_chart_bars(self, service: str, content: List[dict]) -> None:
+        """Writes the bars of a CHART message into the bars and emits their updates.
+        Arguments:
+        ----
+        service {str} -- Either `CHART_EQUITY` or `CHART_FUTURES`.
+        content {List[dict]} -- The content of the message.
+        """
+
+        for symbol, appended in self.bars.add_chart_content(service, content).items():
+            self.events.dispatch_trades(service, symbol, None, None, None, self.bars[symbol], appended, ticks=False)
+
+    def chart_bars(self, symbols: List[str], service: str = 'CHART_EQUITY') -> None:
+        """Builds the bars of symbols from TD's streamed 1-minute bars instead of
+        their trades. This is the low CPU mode for symbols that don't need tick
+        detail: one message per symbol per minute instead of one per trade. The
+        bars only change when a minute completes.
+        Symbols that are also subscribed to TIMESALE get bars built from their
+        ticks, and each minute is overwritten with the server's bar once it arrives.
+        Arguments:
+        ----
+        symbols {List[str]} -- The symbols.
+        service {str} -- Either `CHART_EQUITY` or `CHART_FUTURES`. (default: {'CHART_EQUITY'})
+        """
+
+        if service not in CHART_BAR_FIELDS:
+            raise ValueError('Chart bars come from one of {}.'.format(list(CHART_BAR_FIELDS)))
+
+        fields = [0] + [int(field) for field in CHART_BAR_FIELDS[service]]
+        self.chart(service=service, symbols=symbols, fields=sorted(set(fields)))
+
+    def quote_table(self, service: str = 'QUOTE') -> QuoteTable:
+        """Returns the quote table of a level one service, creating it if needed.
+        Arguments:
+        ----
+        service {str} -- The level one service, e.g. 'QUOTE' or 'LEVELONE_FUTURES'. (default: {'QUOTE'})
+        Returns:
+        ----
+        QuoteTable -- The latest quote of every streamed symbol of the service.
+        """
+
+        table = self.quote_tables.get(service)
+        if table is None:
+            table = self.quote_tables[service] = QuoteTable(service)
+        return table
+
+    def _handle_trades(self, service: str, content: List[dict]) -> None:
+        """Adds the trades of a TIMESALE message to the bars and emits their events.
+        Arguments:
+        ----
+        service {str} -- The TIMESALE service the trades came from.
+        content {List[dict]} -- The content of the message.
+        """
+
+        for symbol, (times, prices, sizes) in split_timesale_content(content).items():
+            appended = self.bars.add_trades(symbol, times, prices, sizes)
+            self.events.dispatch_trades(service, symbol, times, prices, sizes, self.bars[symbol], appended)
+
+    def _parse_json_message(self, message: Union[str, bytes]) -> dict:
         """Parses incoming messages from the stream
         Arguments:
         ----
-        message {str} -- The JSON string needing to be parsed.
+        message {Union[str, bytes]} -- The JSON string needing to be parsed.
         Returns:
         ----
         dict -- A python dictionary containing the original values.
         """
 
-        try:
-            message_decoded = json.loads(message)
-        except:
-            message = message.encode('utf-8').replace(b'\xef\xbf\xbd', bytes('"None"','utf-8')).decode('utf-8')
-            message_decoded = json.loads(message)
-
-        return message_decoded
+        return self.decoder(message)
 
     async def heartbeat(self) -> None:
         """Sending heartbeat to server every 5 seconds."""
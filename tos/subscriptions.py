@@ -0,0 +1,283 @@
+import asyncio
+import json
+
+from typing import Dict
+from typing import List
+from typing import Set
+from typing import Union
+
+# Keys sent in one ADD or UNSUBS request, long key lists are split.
+MAX_KEYS_PER_REQUEST = 300
+
+
+class SubscriptionManager():
+
+    """Adds and removes symbols on a live streamer connection.
+
+    Subscriptions are reference counted per service and symbol, so several
+    consumers can share a symbol and it is only unsubscribed when the last one
+    lets go. Changes are not sent right away: they are collected for
+    `flush_interval` seconds and then sent together as one message, using ADD
+    and UNSUBS with just the changed keys. A symbol added and removed within
+    the window is never sent. The `data_requests` of the streamer are kept in
+    step, so a reconnect resubscribes to what is live now.
+
+    The subscriptions made with the builders (`timesale`, `level_one_quotes`, ...)
+    before the stream started are picked up on first use, each with one reference.
+    Call the methods from the thread running the stream's event loop.
+
+    Arguments:
+    ----
+    streamer {TDStreamerClient} -- The streamer whose connection is managed.
+    flush_interval {float} -- How long changes are collected before they are sent,
+        in seconds. (default: {0.05})
+
+    Usage:
+    ----
+        >>> manager = td_stream_session.subscriptions
+        >>> manager.subscribe('TIMESALE_EQUITY', ['AAPL', 'MSFT'], fields=[0, 1, 2, 3, 4])
+        >>> manager.unsubscribe('TIMESALE_EQUITY', ['MSFT'])
+        >>> manager.replace('QUOTE', old=yesterdays_universe, new=todays_universe, fields=[0, 1, 2, 3])
+    """
+
+    def __init__(self, streamer, flush_interval: float = 0.05) -> None:
+        self.streamer = streamer
+        self.flush_interval = flush_interval
+
+        self.refcounts: Dict[str, Dict[str, int]] = {}
+        self.fields: Dict[str, List[str]] = {}
+        self._pending_add: Dict[str, Set[str]] = {}
+        self._pending_remove: Dict[str, Set[str]] = {}
+        self._resubscribe: Set[str] = set()
+        self._flush_handle: asyncio.Handle = None
+        self._loaded = False
+
+        self.request_id = 1000
+        self.messages_sent = 0
+        self.requests_sent = 0
+
+    def _load(self) -> None:
+        """Takes over the subscriptions already in the streamer's `data_requests`."""
+        if self._loaded:
+            return
+        self._loaded = True
+        for request in self.streamer.data_requests['requests']:
+            if request.get('command') != 'SUBS':
+                continue
+            parameters = request.get('parameters') or {}
+            keys = [k for k in (parameters.get('keys') or '').split(',') if k]
+            if not keys:
+                continue
+            service = request['service']
+            counts = self.refcounts.setdefault(service, {})
+            for key in keys:
+                counts[key] = counts.get(key, 0) + 1
+            if parameters.get('fields'):
+                self._merge_fields(service, parameters['fields'].split(','))
+
+    def _merge_fields(self, service: str, fields: List[Union[str, int]]) -> bool:
+        """Adds fields to a service, returns True if there were new ones."""
+        current = self.fields.setdefault(service, [])
+        added = False
+        for field in fields:
+            field = str(field)
+            if field not in current:
+                current.append(field)
+                added = True
+        if added:
+            current.sort(key=int)
+        return added
+
+    def symbols(self, service: str) -> List[str]:
+        """The symbols currently subscribed to on a service."""
+        self._load()
+        return list(self.refcounts.get(service, {}))
+
+    def fields_of(self, service: str) -> List[str]:
+        """The field ids subscribed to on a service."""
+        self._load()
+        return list(self.fields.get(service, []))
+
+    def refcount(self, service: str, symbol: str) -> int:
+        self._load()
+        return self.refcounts.get(service, {}).get(symbol, 0)
+
+    def subscribe(self, service: str, symbols: List[str], fields: List[Union[str, int]] = None) -> List[str]:
+        """Takes a reference on symbols of a service, subscribing the ones that are new.
+
+        Arguments:
+        ----
+        service {str} -- The service, e.g. 'TIMESALE_EQUITY' or 'QUOTE'.
+        symbols {List[str]} -- The symbols.
+        fields {List[Union[str, int]]} -- The field ids wanted. Fields are shared by every
+            symbol of a service, asking for new ones resubscribes the service with all of
+            them. (default: {None})
+
+        Returns:
+        ----
+        List[str] -- The symbols that weren't subscribed before.
+        """
+        self._load()
+        if fields and self._merge_fields(service, fields) and self.refcounts.get(service):
+            self._resubscribe.add(service)
+        if not self.fields.get(service):
+            raise ValueError('No fields known for {}, pass the fields to subscribe with.'.format(service))
+
+        counts = self.refcounts.setdefault(service, {})
+        added = []
+        for symbol in symbols:
+            count = counts.get(symbol, 0)
+            counts[symbol] = count + 1
+            if count == 0:
+                added.append(symbol)
+                removing = self._pending_remove.get(service)
+                if removing and symbol in removing:
+                    removing.discard(symbol)
+                else:
+                    self._pending_add.setdefault(service, set()).add(symbol)
+        self._schedule_flush()
+        return added
+
+    def unsubscribe(self, service: str, symbols: List[str]) -> List[str]:
+        """Releases a reference on symbols of a service, unsubscribing the ones no
+        one else holds.
+
+        Returns:
+        ----
+        List[str] -- The symbols that are no longer subscribed.
+        """
+        self._load()
+        counts = self.refcounts.get(service, {})
+        removed = []
+        for symbol in symbols:
+            count = counts.get(symbol, 0)
+            if count == 0:
+                continue
+            if count > 1:
+                counts[symbol] = count - 1
+                continue
+            del counts[symbol]
+            removed.append(symbol)
+            adding = self._pending_add.get(service)
+            if adding and symbol in adding:
+                adding.discard(symbol)
+            else:
+                self._pending_remove.setdefault(service, set()).add(symbol)
+        self._schedule_flush()
+        return removed
+
+    def replace(self, service: str, old: List[str], new: List[str], fields: List[Union[str, int]] = None) -> None:
+        """Moves a consumer from one set of symbols to another, e.g. when a scanner
+        rotates its universe. Symbols in both keep their subscription and only the
+        difference is sent."""
+        self.subscribe(service, new, fields=fields)
+        self.unsubscribe(service, old)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is not None or not self._has_pending():
+            return
+        if self.streamer.connection is None or self.streamer.connection.closed:
+            # Not streaming, `stream`, `start` or a reconnect will send `data_requests`.
+            self._sync_data_requests()
+            return
+        loop = asyncio.get_event_loop()
+        self._flush_handle = loop.call_later(self.flush_interval, lambda: asyncio.ensure_future(self.flush()))
+
+    def _has_pending(self) -> bool:
+        return any(self._pending_add.values()) or any(self._pending_remove.values()) or bool(self._resubscribe)
+
+    def _next_request(self, service: str, command: str, keys: List[str] = None) -> dict:
+        self.request_id += 1
+        request = {
+            'service': service,
+            'requestid': self.request_id,
+            'command': command,
+            'account': self.streamer.user_principal_data['accounts'][0]['accountId'],
+            'source': self.streamer.user_principal_data['streamerInfo']['appId'],
+        }
+        if keys is not None:
+            request['parameters'] = {'keys': ','.join(keys)}
+            if command != 'UNSUBS':
+                request['parameters']['fields'] = ','.join(self.fields[service])
+        return request
+
+    def _build_requests(self) -> List[dict]:
+        requests = []
+        for service in sorted(set(self._pending_add) | set(self._pending_remove) | self._resubscribe):
+            active = list(self.refcounts.get(service, {}))
+            if service in self._resubscribe:
+                requests.append(self._next_request(service, 'SUBS', active))
+                continue
+
+            adding = sorted(self._pending_add.get(service, ()))
+            removing = sorted(self._pending_remove.get(service, ()))
+            if adding and len(adding) == len(active):
+                # Nothing was subscribed on this service, ADD needs an existing subscription.
+                requests.append(self._next_request(service, 'SUBS', adding[:MAX_KEYS_PER_REQUEST]))
+                adding = adding[MAX_KEYS_PER_REQUEST:]
+            for start in range(0, len(adding), MAX_KEYS_PER_REQUEST):
+                requests.append(self._next_request(service, 'ADD', adding[start:start + MAX_KEYS_PER_REQUEST]))
+            if removing and not active:
+                requests.append(self._next_request(service, 'UNSUBS'))
+                continue
+            for start in range(0, len(removing), MAX_KEYS_PER_REQUEST):
+                requests.append(self._next_request(service, 'UNSUBS', removing[start:start + MAX_KEYS_PER_REQUEST]))
+        return requests
+
+    async def flush(self) -> int:
+        """Sends the collected changes now.
+
+        Returns:
+        ----
+        int -- The number of service requests sent.
+        """
+        if self._flush_handle is not None:
+            # Sent early, e.g. by `TDStreamerClient.unsubscribe`.
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._has_pending():
+            return 0
+
+        requests = self._build_requests()
+        self._sync_data_requests()
+        if requests and self.streamer.connection is not None:
+            await self.streamer._send_message(json.dumps({'requests': requests}))
+            self.messages_sent += 1
+            self.requests_sent += len(requests)
+        return len(requests)
+
+    def _sync_data_requests(self) -> None:
+        """Rewrites the SUBS requests of the changed services in `data_requests`
+        to the symbols subscribed now, and clears the pending changes."""
+        requests = self.streamer.data_requests['requests']
+        for service in set(self._pending_add) | set(self._pending_remove) | self._resubscribe:
+            active = list(self.refcounts.get(service, {}))
+            existing = [r for r in requests if r['service'] == service and r['command'] == 'SUBS']
+            for request in existing[1:]:
+                requests.remove(request)
+            if not active:
+                if existing:
+                    requests.remove(existing[0])
+                continue
+            if existing:
+                request = existing[0]
+            else:
+                request = self.streamer._new_request_template()
+                request['service'] = service
+                request['command'] = 'SUBS'
+                requests.append(request)
+            request['parameters']['keys'] = ','.join(active)
+            request['parameters']['fields'] = ','.join(self.fields[service])
+
+        self._pending_add = {}
+        self._pending_remove = {}
+        self._resubscribe = set()
+
+    def metrics(self) -> dict:
+        return {
+            'services': {service: len(counts) for service, counts in self.refcounts.items() if counts},
+            'pending_add': sum(len(keys) for keys in self._pending_add.values()),
+            'pending_remove': sum(len(keys) for keys in self._pending_remove.values()),
+            'messages_sent': self.messages_sent,
+            'requests_sent': self.requests_sent,
+        }
@@ -0,0 +1,367 @@
+"""A compact, vectorized encoding of trades.
+
+Trade times and sequence numbers only move forward and prices move in whole
+ticks, so a trade is stored as the change from the one before it: the time
+and sequence as deltas, the price as a delta in ticks and the size as is, each
+as a zigzag varint (LEB128). Most trades then take one byte per field.
+
+Block layout:
+
+    flags       1 byte   FLAG_* bits in the low 4, the number of trades in the high 4 if 1 to 15
+    count       varint   the number of trades, absent if it is in the flags byte
+    ticks/unit  varint   1 / tick size, absent with FLAG_RAW_PRICES or FLAG_SAME_TICK_SIZE
+    times       count varints, zigzag deltas in ms
+    prices      count varints, zigzag deltas in ticks, or count float64 with FLAG_RAW_PRICES
+    sizes       count varints, or count float64 with FLAG_RAW_SIZES
+    sequences   count varints, zigzag deltas, only with FLAG_SEQUENCES
+
+The deltas of the first trade are taken from a `TickState`, the last trade
+of the previous block of the symbol, or from 0 without one. The state also
+carries the tick size, so a block priced in the same ticks as the previous
+one sets FLAG_SAME_TICK_SIZE instead of repeating it. With `codes` the
+trades of several symbols are encoded together, each delta taken from the
+previous trade of the same symbol, and the same codes decode them.
+"""
+from typing import Dict
+from typing import NamedTuple
+from typing import Tuple
+
+import numpy as np
+
+FLAG_RAW_PRICES = 1
+FLAG_RAW_SIZES = 2
+FLAG_SEQUENCES = 4
+FLAG_SAME_TICK_SIZE = 8
+FLAG_BITS = 0x0f
+
+# Blocks of up to this many trades keep the count in the flags byte, messages
+# mostly carry a handful of trades.
+MAX_INLINE_COUNT = 15
+COUNT_SHIFT = 4
+
+# The tick sizes tried when none is given, largest first.
+TICK_SIZES = (1.0, 0.25, 0.1, 0.05, 0.01, 0.005, 0.001, 0.0001)
+# How far from a whole tick, in ticks, a price may be from float rounding.
+TICK_TOLERANCE = 1e-4
+
+MAX_VARINT_BYTES = 10
+
+# times, prices, sizes, sequences
+TickArrays = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class TickState(NamedTuple):
+    """The last trade encoded or decoded for a symbol, what the next block's deltas start from."""
+    time: int
+    price: float
+    sequence: int
+    ticks_per_unit: int = 0
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    """Maps signed integers to unsigned ones with small magnitudes staying small."""
+    values = values.astype(np.int64, copy=False)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64, copy=False)
+    return ((values >> np.uint64(1)).view(np.int64)) ^ -((values & np.uint64(1)).view(np.int64))
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """Encodes unsigned integers as LEB128 varints, 7 bits per byte."""
+    values = values.astype(np.uint64, copy=False)
+    if len(values) == 0:
+        return b''
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= np.uint64(1 << shift)
+
+    owners = np.repeat(np.arange(len(values)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    positions = np.arange(len(owners)) - starts[owners]
+    encoded = (values[owners] >> (positions * 7).astype(np.uint64)) & np.uint64(0x7f)
+    encoded |= (positions < lengths[owners] - 1).astype(np.uint64) << np.uint64(7)
+    return encoded.astype(np.uint8).tobytes()
+
+
+def varint_decode(data, count: int, offset: int = 0) -> Tuple[np.ndarray, int]:
+    """Decodes `count` varints starting at `offset`.
+
+    Returns:
+    ----
+    Tuple[np.ndarray, int] -- The values as uint64 and the offset after the last one.
+    """
+    if count == 0:
+        return np.empty(0, dtype=np.uint64), offset
+    window = np.frombuffer(data, dtype=np.uint8, count=min(len(data) - offset, count * MAX_VARINT_BYTES), offset=offset)
+    ends = np.flatnonzero(window < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError('Truncated varints: expected {}, found {}.'.format(count, len(ends)))
+    size = int(ends[-1]) + 1
+    window = window[:size]
+
+    starts = np.empty(count, dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    if size == count:
+        # Every value fits in one byte, the common case for deltas.
+        return window.astype(np.uint64), offset + size
+
+    owners = np.repeat(np.arange(count), ends - starts + 1)
+    positions = np.arange(size) - starts[owners]
+    parts = (window & 0x7f).astype(np.uint64) << (positions * 7).astype(np.uint64)
+    return np.add.reduceat(parts, starts), offset + size
+
+
+def _whole_ticks(prices: np.ndarray, tick_size: float) -> bool:
+    ticks = prices / tick_size
+    return bool(np.all(np.abs(ticks - np.round(ticks)) < TICK_TOLERANCE))
+
+
+def infer_tick_size(prices: np.ndarray) -> float:
+    """The largest of `TICK_SIZES` every price is a whole multiple of, None if there is none."""
+    for tick_size in TICK_SIZES:
+        if _whole_ticks(prices, tick_size):
+            return tick_size
+    return None
+
+
+def _group_order(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """The order that groups the rows of each code together, and where each group starts in it."""
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    firsts = np.ones(len(codes), dtype=bool)
+    firsts[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    return order, firsts
+
+
+def _deltas(values: np.ndarray, reference: int = 0, codes: np.ndarray = None) -> np.ndarray:
+    values = values.astype(np.int64, copy=False)
+    if codes is None:
+        deltas = np.empty(len(values), dtype=np.int64)
+        deltas[0] = values[0] - reference
+        np.subtract(values[1:], values[:-1], out=deltas[1:])
+        return deltas
+
+    order, firsts = _group_order(codes)
+    grouped = values[order]
+    grouped_deltas = np.empty(len(values), dtype=np.int64)
+    grouped_deltas[0] = grouped[0]
+    np.subtract(grouped[1:], grouped[:-1], out=grouped_deltas[1:])
+    grouped_deltas[firsts] = grouped[firsts]
+    deltas = np.empty(len(values), dtype=np.int64)
+    deltas[order] = grouped_deltas
+    return deltas
+
+
+def _undeltas(deltas: np.ndarray, reference: int = 0, codes: np.ndarray = None) -> np.ndarray:
+    if codes is None:
+        values = np.cumsum(deltas)
+        values += reference
+        return values
+
+    order, firsts = _group_order(codes)
+    sums = np.cumsum(deltas[order])
+    starts = np.flatnonzero(firsts)
+    lengths = np.diff(np.append(starts, len(deltas)))
+    # Each group's running sum restarts at its first row.
+    sums -= np.repeat(sums[starts] - deltas[order][starts], lengths)
+    values = np.empty(len(deltas), dtype=np.int64)
+    values[order] = sums
+    return values
+
+
+def encode_deltas(values: np.ndarray) -> bytes:
+    """Encodes an integer column as zigzag varint deltas, for columns that mostly
+    move forward in small steps like timestamps and counters."""
+    if len(values) == 0:
+        return b''
+    return varint_encode(zigzag_encode(_deltas(values)))
+
+
+def decode_deltas(data, count: int, offset: int = 0) -> Tuple[np.ndarray, int]:
+    """Decodes `count` values made by `encode_deltas`, returns them and the offset after them."""
+    deltas, offset = varint_decode(data, count, offset)
+    return _undeltas(zigzag_decode(deltas)), offset
+
+
+def encode_ticks(times: np.ndarray, prices: np.ndarray, sizes: np.ndarray, sequences: np.ndarray = None,
+                 tick_size: float = None, previous: TickState = None, codes: np.ndarray = None) -> bytes:
+    """Encodes trades as one block.
+
+    Arguments:
+    ----
+    times {np.ndarray} -- The trade times in epoch milliseconds.
+    prices {np.ndarray} -- The prices.
+    sizes {np.ndarray} -- The sizes, stored as float64 if they aren't whole numbers.
+    sequences {np.ndarray} -- The exchange sequence numbers. (default: {None})
+    tick_size {float} -- The price increment, the one of `previous` if the prices are whole
+        ticks of it and inferred otherwise if None. Prices are stored as float64 if they
+        aren't whole ticks. (default: {None})
+    previous {TickState} -- The last trade of the symbol's previous block. (default: {None})
+    codes {np.ndarray} -- Symbol codes to encode several symbols' trades together. (default: {None})
+
+    Returns:
+    ----
+    bytes -- The block.
+    """
+    return _encode_ticks(times, prices, sizes, sequences, tick_size, previous, codes)[0]
+
+
+def _encode_ticks(times: np.ndarray, prices: np.ndarray, sizes: np.ndarray, sequences: np.ndarray = None,
+                  tick_size: float = None, previous: TickState = None, codes: np.ndarray = None) -> Tuple[bytes, int]:
+    """Encodes a block, returns it and the ticks per unit the next block of the symbol starts from."""
+    prices = np.asarray(prices, dtype=np.float64)
+    sizes = np.asarray(sizes, dtype=np.float64)
+    count = len(prices)
+    if codes is not None:
+        previous = None
+
+    flags = 0
+    previous_ticks = previous.ticks_per_unit if previous else 0
+    if tick_size is None and previous_ticks and _whole_ticks(prices, 1 / previous_ticks):
+        tick_size = 1 / previous_ticks
+    if tick_size is None:
+        tick_size = infer_tick_size(prices) if count else 1.0
+    ticks_per_unit = round(1 / tick_size) if tick_size and tick_size <= 1 else None
+    if ticks_per_unit is None or abs(ticks_per_unit * tick_size - 1) > TICK_TOLERANCE:
+        flags |= FLAG_RAW_PRICES
+    else:
+        ticks = np.round(prices * ticks_per_unit)
+        if np.any(np.abs(ticks - prices * ticks_per_unit) > TICK_TOLERANCE):
+            flags |= FLAG_RAW_PRICES
+    whole_sizes = np.round(sizes)
+    if np.any(whole_sizes != sizes) or np.any(sizes < 0):
+        flags |= FLAG_RAW_SIZES
+    if sequences is not None:
+        flags |= FLAG_SEQUENCES
+    if count and not flags & FLAG_RAW_PRICES and ticks_per_unit == previous_ticks:
+        flags |= FLAG_SAME_TICK_SIZE
+
+    if 0 < count <= MAX_INLINE_COUNT:
+        parts = [bytes((flags | count << COUNT_SHIFT,)), b'']
+    else:
+        parts = [bytes((flags,)), varint_encode(np.array([count], dtype=np.uint64))]
+    if count == 0:
+        return b''.join(parts), previous_ticks
+
+    parts.append(varint_encode(zigzag_encode(_deltas(times, previous.time if previous else 0, codes))))
+    if flags & FLAG_RAW_PRICES:
+        parts.append(prices.astype('<f8').tobytes())
+        ticks_per_unit = previous_ticks
+    else:
+        if not flags & FLAG_SAME_TICK_SIZE:
+            parts.insert(2, varint_encode(np.array([ticks_per_unit], dtype=np.uint64)))
+        reference = int(round(previous.price * ticks_per_unit)) if previous else 0
+        parts.append(varint_encode(zigzag_encode(_deltas(ticks.astype(np.int64), reference, codes))))
+    if flags & FLAG_RAW_SIZES:
+        parts.append(sizes.astype('<f8').tobytes())
+    else:
+        parts.append(varint_encode(whole_sizes.astype(np.uint64)))
+    if flags & FLAG_SEQUENCES:
+        parts.append(varint_encode(zigzag_encode(_deltas(sequences, previous.sequence if previous else 0, codes))))
+    return b''.join(parts), ticks_per_unit
+
+
+def decode_ticks(data, previous: TickState = None, codes: np.ndarray = None, offset: int = 0) -> Tuple[TickArrays, int]:
+    """Decodes a block made by `encode_ticks`, with the same `previous` or `codes`.
+
+    Returns:
+    ----
+    Tuple[TickArrays, int] -- The times, prices, sizes and sequences (None if the block has
+        none), and the offset after the block.
+    """
+    arrays, offset, _ = _decode_ticks(data, previous, codes, offset)
+    return arrays, offset
+
+
+def _decode_ticks(data, previous: TickState = None, codes: np.ndarray = None, offset: int = 0) -> Tuple[TickArrays, int, int]:
+    """Decodes a block, returns it, the offset after it and the ticks per unit the next block starts from."""
+    if codes is not None:
+        previous = None
+    flags = data[offset] & FLAG_BITS
+    count = data[offset] >> COUNT_SHIFT
+    offset += 1
+    if count == 0:
+        (count,), offset = varint_decode(data, 1, offset)
+        count = int(count)
+    ticks_per_unit = previous.ticks_per_unit if previous else 0
+    if count == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return (empty, empty.astype(np.float64), empty.astype(np.float64), empty if flags & FLAG_SEQUENCES else None), offset, ticks_per_unit
+
+    if not flags & (FLAG_RAW_PRICES | FLAG_SAME_TICK_SIZE):
+        (ticks_per_unit,), offset = varint_decode(data, 1, offset)
+        ticks_per_unit = int(ticks_per_unit)
+
+    deltas, offset = varint_decode(data, count, offset)
+    times = _undeltas(zigzag_decode(deltas), previous.time if previous else 0, codes)
+
+    if flags & FLAG_RAW_PRICES:
+        prices = np.frombuffer(data, dtype='<f8', count=count, offset=offset).astype(np.float64)
+        offset += 8 * count
+    else:
+        deltas, offset = varint_decode(data, count, offset)
+        reference = int(round(previous.price * ticks_per_unit)) if previous else 0
+        prices = _undeltas(zigzag_decode(deltas), reference, codes) / ticks_per_unit
+
+    if flags & FLAG_RAW_SIZES:
+        sizes = np.frombuffer(data, dtype='<f8', count=count, offset=offset).astype(np.float64)
+        offset += 8 * count
+    else:
+        sizes, offset = varint_decode(data, count, offset)
+        sizes = sizes.astype(np.float64)
+
+    sequences = None
+    if flags & FLAG_SEQUENCES:
+        deltas, offset = varint_decode(data, count, offset)
+        sequences = _undeltas(zigzag_decode(deltas), previous.sequence if previous else 0, codes)
+    return (times, prices, sizes, sequences), offset, ticks_per_unit
+
+
+class TickEncoder():
+
+    """Encodes each symbol's trades as deltas from the last trade sent for it,
+    so even a message with a single trade stays a few bytes. Blocks have to be
+    decoded in order by a `TickDecoder`.
+
+    Usage:
+    ----
+        >>> encoder, decoder = TickEncoder(), TickDecoder()
+        >>> block = encoder.encode('/ES', times, prices, sizes, sequences)
+        >>> times, prices, sizes, sequences = decoder.decode('/ES', block)
+    """
+
+    def __init__(self) -> None:
+        self.states: Dict[str, TickState] = {}
+        self.trades = 0
+        self.bytes = 0
+
+    def encode(self, symbol: str, times: np.ndarray, prices: np.ndarray, sizes: np.ndarray,
+               sequences: np.ndarray = None, tick_size: float = None) -> bytes:
+        block, ticks_per_unit = _encode_ticks(times, prices, sizes, sequences, tick_size, previous=self.states.get(symbol))
+        if len(times):
+            self.states[symbol] = TickState(int(times[-1]), float(prices[-1]), int(sequences[-1]) if sequences is not None else 0, ticks_per_unit)
+        self.trades += len(times)
+        self.bytes += len(block)
+        return block
+
+    @property
+    def bytes_per_trade(self) -> float:
+        return self.bytes / self.trades if self.trades else 0.0
+
+
+class TickDecoder():
+
+    """Decodes the blocks of a `TickEncoder`, in the order they were encoded."""
+
+    def __init__(self) -> None:
+        self.states: Dict[str, TickState] = {}
+
+    def decode(self, symbol: str, block: bytes) -> TickArrays:
+        (times, prices, sizes, sequences), _, ticks_per_unit = _decode_ticks(block, previous=self.states.get(symbol))
+        if len(times):
+            self.states[symbol] = TickState(int(times[-1]), float(prices[-1]), int(sequences[-1]) if sequences is not None else 0, ticks_per_unit)
+        return times, prices, sizes, sequences
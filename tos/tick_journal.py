@@ -0,0 +1,366 @@
+"""An append-only, memory-mapped store of trades, one file per symbol per day.
+
+Trades are fixed-size records, so a day file is an array on disk: reading it
+is `np.memmap` and a time range is a slice of that array, with no parsing and
+no copy. Every `INDEX_STRIDE` records the time and position are appended to a
+small index file next to it, a range query searches the index and then only
+the block it points at, so it touches a handful of pages however big the day is.
+
+Layout, under the journal's root directory:
+
+    <quoted symbol>/<YYYYMMDD>.ticks   HEADER_SIZE byte header, then TICK_DTYPE records
+    <quoted symbol>/<YYYYMMDD>.idx     (time, position) int64 pairs
+
+Days are UTC days of the trade time, shifted by `day_offset_ms` so a day can
+start at a session open instead. Range queries expect the trades of a day in
+time order, which is how they arrive; ones that don't are stored anyway and
+counted in `out_of_order`.
+"""
+import os
+import struct
+import time
+import urllib.parse
+
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+TICK_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('price', '<f8'),
+    ('size', '<f8'),
+    ('sequence', '<i8'),
+])
+
+MAGIC = b'TDTICK\x00\x01'
+HEADER = struct.Struct('<8sII16x')
+HEADER_SIZE = HEADER.size
+INDEX_STRIDE = 1024
+INDEX_DTYPE = np.dtype([('time', '<i8'), ('position', '<i8')])
+
+TICKS_SUFFIX = '.ticks'
+INDEX_SUFFIX = '.idx'
+ONE_DAY_MS = 86400000
+
+
+def symbol_directory(symbol: str) -> str:
+    """The directory name of a symbol, e.g. '%2FES' for '/ES'."""
+    return urllib.parse.quote(symbol, safe='')
+
+
+def day_name(day: int) -> str:
+    """The file name of a day number (days since the epoch)."""
+    return str(np.datetime64(int(day), 'D')).replace('-', '')
+
+
+class _DayWriter():
+
+    """The open files of one symbol's day."""
+
+    def __init__(self, ticks_path: str, stride: int) -> None:
+        self.stride = stride
+        exists = os.path.exists(ticks_path) and os.path.getsize(ticks_path) >= HEADER_SIZE
+        if exists:
+            # Drop a record cut off by a crash, so appends stay aligned.
+            count = (os.path.getsize(ticks_path) - HEADER_SIZE) // TICK_DTYPE.itemsize
+            with open(ticks_path, 'r+b') as ticks:
+                ticks.truncate(HEADER_SIZE + count * TICK_DTYPE.itemsize)
+        else:
+            count = 0
+            with open(ticks_path, 'wb') as ticks:
+                ticks.write(HEADER.pack(MAGIC, TICK_DTYPE.itemsize, stride))
+
+        index_path = ticks_path[:-len(TICKS_SUFFIX)] + INDEX_SUFFIX
+        if exists:
+            _rebuild_index(ticks_path, index_path, count, stride)
+        self.ticks = open(ticks_path, 'ab')
+        self.index = open(index_path, 'ab')
+        self.count = count
+        self.last_time = _last_time(ticks_path, count)
+
+    def append(self, records: np.ndarray) -> int:
+        """Appends records and their index entries, returns how many are out of order."""
+        times = records['time']
+        out_of_order = int(np.count_nonzero(np.diff(times) < 0))
+        if self.last_time is not None and times[0] < self.last_time:
+            out_of_order += 1
+
+        first = -self.count % self.stride
+        positions = np.arange(first, len(records), self.stride)
+        if len(positions):
+            entries = np.empty(len(positions), dtype=INDEX_DTYPE)
+            entries['time'] = times[positions]
+            entries['position'] = positions + self.count
+            self.index.write(entries.tobytes())
+
+        self.ticks.write(records.tobytes())
+        self.count += len(records)
+        self.last_time = int(times[-1])
+        return out_of_order
+
+    def flush(self) -> None:
+        self.ticks.flush()
+        self.index.flush()
+
+    def close(self) -> None:
+        self.ticks.close()
+        self.index.close()
+
+
+def _last_time(ticks_path: str, count: int) -> int:
+    if not count:
+        return None
+    with open(ticks_path, 'rb') as ticks:
+        ticks.seek(HEADER_SIZE + (count - 1) * TICK_DTYPE.itemsize)
+        return int(np.frombuffer(ticks.read(TICK_DTYPE.itemsize), dtype=TICK_DTYPE)['time'][0])
+
+
+def _rebuild_index(ticks_path: str, index_path: str, count: int, stride: int) -> None:
+    """Rewrites an index that doesn't cover the ticks, e.g. after a crash."""
+    expected = (count + stride - 1) // stride
+    if os.path.exists(index_path) and os.path.getsize(index_path) == expected * INDEX_DTYPE.itemsize:
+        return
+    entries = np.empty(expected, dtype=INDEX_DTYPE)
+    if expected:
+        records = np.memmap(ticks_path, dtype=TICK_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+        entries['time'] = records['time'][::stride]
+        entries['position'] = np.arange(0, count, stride)
+        del records
+    with open(index_path, 'wb') as index:
+        index.write(entries.tobytes())
+
+
+class TickJournal():
+
+    """Appends trades to, and reads time ranges from, per symbol per day files.
+
+    The live stream appends the trades it dispatches, see `write_behavior(write='journal')`,
+    and replays and backtests read them back with `range`, which returns a view of
+    the memory-mapped file: `ticks['price']` is an array without a copy.
+
+    Arguments:
+    ----
+    root {str} -- The directory holding the journal.
+    stride {int} -- Records per index entry. (default: {INDEX_STRIDE})
+    day_offset_ms {int} -- Where days start, in ms after midnight UTC. (default: {0})
+    max_open_files {int} -- Day files kept open for appending. (default: {256})
+    flush_interval {float} -- The longest appended trades wait before other processes
+        can read them, in seconds. (default: {1.0})
+
+    Usage:
+    ----
+        >>> journal = TickJournal('journal')
+        >>> ticks = journal.range('/ES', start_ms=1640187000000, end_ms=1640187300000)
+        >>> ticks['price'].max(), ticks['size'].sum()
+    """
+
+    def __init__(self, root: str, stride: int = INDEX_STRIDE, day_offset_ms: int = 0, max_open_files: int = 256,
+                 flush_interval: float = 1.0) -> None:
+        self.root = root
+        self.stride = stride
+        self.day_offset_ms = day_offset_ms
+        self.max_open_files = max_open_files
+        self.flush_interval = flush_interval
+        os.makedirs(root, exist_ok=True)
+
+        self._writers: Dict[Tuple[str, int], _DayWriter] = {}
+        self._unflushed: Dict[Tuple[str, int], _DayWriter] = {}
+        self._last_flush = time.monotonic()
+        self._maps: Dict[Tuple[str, int], Tuple[int, np.ndarray, np.ndarray]] = {}
+
+        self.ticks_written = 0
+        self.out_of_order = 0
+
+    def day_of(self, time_ms):
+        """The day number of a trade time, or an array of them."""
+        return (time_ms - self.day_offset_ms) // ONE_DAY_MS
+
+    def path(self, symbol: str, day: int, suffix: str = TICKS_SUFFIX) -> str:
+        return os.path.join(self.root, symbol_directory(symbol), day_name(day) + suffix)
+
+    def _writer(self, symbol: str, day: int) -> _DayWriter:
+        key = (symbol, day)
+        writer = self._writers.pop(key, None)
+        if writer is None:
+            if len(self._writers) >= self.max_open_files:
+                # The least recently used writer is the first one.
+                oldest = next(iter(self._writers))
+                self._unflushed.pop(oldest, None)
+                self._writers.pop(oldest).close()
+            os.makedirs(os.path.join(self.root, symbol_directory(symbol)), exist_ok=True)
+            writer = _DayWriter(self.path(symbol, day), self.stride)
+        self._writers[key] = writer
+        self._unflushed[key] = writer
+        return writer
+
+    def append(self, symbol: str, times: np.ndarray, prices: np.ndarray, sizes: np.ndarray,
+               sequences: np.ndarray = None) -> None:
+        """Appends trades of a symbol.
+
+        Arguments:
+        ----
+        symbol {str} -- The symbol.
+        times {np.ndarray} -- The trade times in epoch milliseconds.
+        prices {np.ndarray} -- The prices.
+        sizes {np.ndarray} -- The sizes.
+        sequences {np.ndarray} -- The exchange sequence numbers, -1 if not given. (default: {None})
+        """
+        if len(times) == 0:
+            return
+        records = np.empty(len(times), dtype=TICK_DTYPE)
+        records['time'] = times
+        records['price'] = prices
+        records['size'] = sizes
+        records['sequence'] = -1 if sequences is None else sequences
+
+        days = self.day_of(records['time'])
+        if days[0] == days[-1]:
+            self.out_of_order += self._writer(symbol, int(days[0])).append(records)
+        else:
+            for day in np.unique(days):
+                self.out_of_order += self._writer(symbol, int(day)).append(records[days == day])
+        self.ticks_written += len(records)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def append_content(self, content: List[dict]) -> None:
+        """Appends the trades in the `content` list of a TIMESALE message."""
+        by_symbol: Dict[str, List[dict]] = {}
+        for trade in content:
+            if '1' in trade and '2' in trade and '3' in trade:
+                by_symbol.setdefault(trade['key'], []).append(trade)
+        for symbol, trades in by_symbol.items():
+            self.append(
+                symbol,
+                np.array([t['1'] for t in trades], dtype=np.int64),
+                np.array([t['2'] for t in trades], dtype=np.float64),
+                np.array([t['3'] for t in trades], dtype=np.float64),
+                np.array([t.get('4', -1) for t in trades], dtype=np.int64),
+            )
+
+    def flush(self) -> None:
+        """Makes the appended trades visible to readers."""
+        for writer in self._unflushed.values():
+            writer.flush()
+        self._unflushed = {}
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        self._unflushed = {}
+        self._maps = {}
+
+    def symbols(self) -> List[str]:
+        return sorted(
+            urllib.parse.unquote(name) for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def days(self, symbol: str) -> List[int]:
+        directory = os.path.join(self.root, symbol_directory(symbol))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            int(np.datetime64('{}-{}-{}'.format(name[:4], name[4:6], name[6:8]), 'D').astype(np.int64))
+            for name in os.listdir(directory) if name.endswith(TICKS_SUFFIX)
+        )
+
+    def _mapped(self, symbol: str, day: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The records and index of a day, remapped when the file has grown."""
+        key = (symbol, day)
+        writer = self._writers.get(key)
+        if writer is not None:
+            writer.flush()
+
+        ticks_path = self.path(symbol, day)
+        if not os.path.exists(ticks_path):
+            return np.empty(0, dtype=TICK_DTYPE), np.empty(0, dtype=INDEX_DTYPE)
+        count = (os.path.getsize(ticks_path) - HEADER_SIZE) // TICK_DTYPE.itemsize
+        mapped = self._maps.get(key)
+        if mapped is not None and mapped[0] == count:
+            return mapped[1], mapped[2]
+
+        if count <= 0:
+            records = np.empty(0, dtype=TICK_DTYPE)
+        else:
+            records = np.memmap(ticks_path, dtype=TICK_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+        index_path = self.path(symbol, day, INDEX_SUFFIX)
+        if writer is None:
+            _rebuild_index(ticks_path, index_path, max(count, 0), self.stride)
+        index = np.fromfile(index_path, dtype=INDEX_DTYPE) if os.path.exists(index_path) else np.empty(0, dtype=INDEX_DTYPE)
+        self._maps[key] = (count, records, index)
+        return records, index
+
+    @staticmethod
+    def _bound(times: np.ndarray, index: np.ndarray, time_ms: int, side: str) -> int:
+        """The position of a time in a day, searching only the block the index points at."""
+        block = int(np.searchsorted(index['time'], time_ms, side))
+        low = int(index['position'][block - 1]) if block else 0
+        high = int(index['position'][block]) if block < len(index) else len(times)
+        return low + int(np.searchsorted(times[low:high], time_ms, side))
+
+    def day(self, symbol: str, day: int) -> np.ndarray:
+        """Every trade of a symbol on a day, as a read-only view."""
+        return self._mapped(symbol, day)[0]
+
+    def range(self, symbol: str, start_ms: int = None, end_ms: int = None) -> np.ndarray:
+        """The trades of a symbol with `start_ms <= time < end_ms`.
+
+        A range within one day is a view of the memory-mapped file, ranges that
+        span days are concatenated.
+
+        Arguments:
+        ----
+        symbol {str} -- The symbol.
+        start_ms {int} -- The first trade time, from the first day recorded if None. (default: {None})
+        end_ms {int} -- The time to stop before, to the last day recorded if None. (default: {None})
+
+        Returns:
+        ----
+        np.ndarray -- A structured array of `TICK_DTYPE` records.
+        """
+        days = self.days(symbol)
+        if start_ms is not None:
+            days = [day for day in days if day >= self.day_of(start_ms)]
+        if end_ms is not None:
+            days = [day for day in days if day <= self.day_of(end_ms - 1)]
+
+        parts = []
+        for day in days:
+            records, index = self._mapped(symbol, day)
+            times = records['time']
+            low = 0 if start_ms is None else self._bound(times, index, start_ms, 'left')
+            high = len(records) if end_ms is None else self._bound(times, index, end_ms, 'left')
+            if high > low:
+                parts.append(records[low:high])
+
+        if not parts:
+            return np.empty(0, dtype=TICK_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def iter_days(self, symbol: str, start_ms: int = None, end_ms: int = None) -> Iterator[np.ndarray]:
+        """Yields the trades of `range` one day at a time, each a view, for backtests
+        that shouldn't hold many days in memory."""
+        for day in self.days(symbol):
+            day_start = day * ONE_DAY_MS + self.day_offset_ms
+            if (end_ms is not None and day_start >= end_ms) or (start_ms is not None and day_start + ONE_DAY_MS <= start_ms):
+                continue
+            ticks = self.range(
+                symbol,
+                day_start if start_ms is None else max(start_ms, day_start),
+                day_start + ONE_DAY_MS if end_ms is None else min(end_ms, day_start + ONE_DAY_MS),
+            )
+            if len(ticks):
+                yield ticks
+
+    def metrics(self) -> dict:
+        return {
+            'ticks_written': self.ticks_written,
+            'out_of_order': self.out_of_order,
+            'open_files': len(self._writers),
+        }